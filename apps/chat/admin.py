@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.template.loader import render_to_string
 from django.utils.html import mark_safe , format_html
-from .models import ChatSession, Message, TranslationCache, DangerKeyword, EpidemicAlert, ImageAnalysisCache
+from .models import ChatSession, Message, TranslationCache, DangerKeyword, EpidemicAlert, ImageAnalysisCache, PendingTranslation
 from unfold.admin import ModelAdmin, TabularInline
 from .services.notification_service import NotificationService
 from import_export.admin import ImportExportModelAdmin
@@ -9,6 +9,9 @@ from unfold.contrib.import_export.forms import ExportForm, ImportForm
 from .resources import ChatSessionResource , SessionMessageResource
 from django.urls import path
 from django.http import HttpResponse
+from django.contrib import messages
+from django.shortcuts import redirect, render
+from .tasks import broadcast_announcement
 
 # =========================================================
 # 1. إعدادات الأوبئة
@@ -67,6 +70,10 @@ class MessageInline(TabularInline):
     
     fields = ('sender_display', 'smart_content_display', 'status_and_time', 'text_original', 'image')
     readonly_fields = ('sender_display', 'smart_content_display', 'status_and_time')
+
+    def get_queryset(self, request):
+        # فك تشفير كل رسائل الجلسة بشكل جماعي (الجلسات الطويلة فيها آلاف الرسائل)
+        return super().get_queryset(request).select_related('sender').decrypted()
     
 
     def smart_content_display(self, obj):
@@ -182,9 +189,35 @@ class ChatSessionAdmin(ModelAdmin, ImportExportModelAdmin):
                 self.admin_site.admin_view(self.export_chat_view),
                 name='chat_session_export',
             ),
+            path(
+                'broadcast/',
+                self.admin_site.admin_view(self.broadcast_view),
+                name='chat_broadcast',
+            ),
         ]
         return custom_urls + urls
 
+    # --- إعلان لكل الجلسات النشطة (يُترجم لكل لغات اللاجئين) ---
+    def broadcast_view(self, request):
+        if request.method == 'POST':
+            text = request.POST.get('text', '').strip()
+            if text:
+                broadcast_announcement.delay(request.user.id, text)
+                messages.success(request, "📢 Announcement queued for all active chats.")
+                return redirect('admin:chat_chatsession_changelist')
+            messages.error(request, "Announcement cannot be empty.")
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': "Broadcast Announcement",
+            'active_sessions': ChatSession.objects.broadcast_recipients().count(),
+            'languages': (
+                ChatSession.objects.broadcast_recipients()
+                .values_list('refugee__native_language', flat=True).distinct().count()
+            ),
+        }
+        return render(request, 'admin/chat/broadcast.html', context)
+
     def export_chat_view(self, request, object_id):
         session = self.get_object(request, object_id)
         if not session:
@@ -192,7 +225,7 @@ class ChatSessionAdmin(ModelAdmin, ImportExportModelAdmin):
 
         # 1. جلب البيانات
         dataset = SessionMessageResource().export(
-            queryset=Message.objects.filter(session=session).order_by('timestamp')
+            queryset=Message.objects.filter(session=session).select_related('sender').order_by('timestamp').decrypted()
         )
         
         # 2. تصحيح الخطأ: استخدام دالة export('xlsx') بدلاً من .xlsx
@@ -232,9 +265,10 @@ class ChatSessionAdmin(ModelAdmin, ImportExportModelAdmin):
 # =========================================================
 @admin.register(DangerKeyword)
 class DangerKeywordAdmin(ModelAdmin):
-    list_display = ('word', 'is_active')
+    list_display = ('word', 'language', 'is_active')
+    list_filter = ('language', 'is_active')
     search_fields = ('word',)
-    help_text = "Add dangerous Norwegian words."
+    help_text = "Add dangerous words (Norwegian for translations, other languages for original text)."
 
 
 
@@ -245,7 +279,8 @@ class ImageAnalysisCacheAdmin(ModelAdmin):
     # 1. القائمة الرئيسية
     list_display = ('image_list_preview', 'analysis_preview', 'created_at')
     
-    search_fields = ('analysis_result',) 
+    # النص مشفر فلا يمكن البحث فيه عبر SQL، نبحث بالبصمة بدلاً منه
+    search_fields = ('image_hash',) 
     list_filter = ('created_at',)
     
     # 2. التفاصيل (هنا التعديل الجذري)
@@ -304,6 +339,13 @@ class ImageAnalysisCacheAdmin(ModelAdmin):
 
     
 
+@admin.register(PendingTranslation)
+class PendingTranslationAdmin(ModelAdmin):
+    list_display = ('message', 'source_language', 'target_language', 'attempts', 'last_error', 'created_at')
+    list_filter = ('source_language', 'target_language')
+    readonly_fields = ('message', 'source_language', 'target_language', 'attempts', 'last_error', 'created_at')
+
+
 @admin.register(TranslationCache)
 class TranslationCacheAdmin(ModelAdmin):
-    list_display = ('source_text', 'translated_text', 'source_language', 'target_language')
\ No newline at end of file
+    list_display = ('source_text', 'translated_text', 'source_language', 'target_language', 'hit_count', 'last_used_at')
\ No newline at end of file
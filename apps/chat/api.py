@@ -3,6 +3,7 @@ from ninja import NinjaAPI, Schema, UploadedFile, File
 from django.contrib.auth import authenticate, login, get_user_model
 from django.shortcuts import get_object_or_404
 from .models import ChatSession, Message
+from .services.triage_service import TriageService
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from django.conf import settings
@@ -114,7 +115,8 @@ def user_login(request, data: LoginInput):
 def get_chat_history(request, session_id: str):
     """جلب الأرشيف"""
     session = get_object_or_404(ChatSession, id=session_id)
-    messages = session.messages.all().order_by('timestamp')
+    # فك تشفير الأرشيف كاملاً دفعة واحدة بدلاً من رسالة رسالة
+    messages = session.messages.select_related('sender').order_by('timestamp').decrypted()
     result = []
     current_user = request.user if request.user.is_authenticated else session.refugee
 
@@ -160,6 +162,10 @@ def send_message(request, data: SendMessageInput):
         text_original=data.text
     )
 
+    # الفرز الأولي على النص الأصلي (قبل وصول الترجمة)
+    if not user.is_staff:
+        TriageService.triage_original(msg)
+
     # 4. إشعار الويب سوكيت (ليظهر للممرض فوراً)
     channel_layer = get_channel_layer()
     async_to_sync(channel_layer.group_send)(
@@ -170,6 +176,7 @@ def send_message(request, data: SendMessageInput):
             'sender_id': user.id,
             'text_original': msg.text_original,
             'text_translated': "", # لم تترجم بعد
+            'is_urgent': msg.is_urgent,
             'timestamp': str(msg.timestamp.strftime("%H:%M")),
         }
     )
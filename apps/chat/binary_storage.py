@@ -0,0 +1,130 @@
+"""
+نقل الأعمدة المشفرة من نص (base64) إلى bytea على PostgreSQL دون إيقاف النظام.
+
+المراحل:
+1. prepare  : إضافة عمود ظل <col>_bin + Trigger يملؤه مع كل كتابة جديدة (فوري، بدون إعادة كتابة الجدول)
+2. backfill : تعبئة الصفوف القديمة على دفعات صغيرة (Keyset) مع إمكانية الاستئناف
+3. swap     : يتم داخل الترحيل 0003 (إعادة تسمية الأعمدة فقط، قفل لحظي)
+4. cleanup  : حذف الأعمدة النصية القديمة <col>_text_old
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+ENCRYPTED_COLUMNS = {
+    'chat_message': ['text_original', 'text_translated', 'ai_analysis'],
+    'chat_translationcache': ['source_text', 'translated_text'],
+    'chat_imageanalysiscache': ['analysis_result'],
+}
+
+
+
+def decode_sql(column_sql):
+    # رموز Fernet هي urlsafe base64 مع الحشو (=)، فيكفي تبديل الحرفين قبل decode
+    return f"decode(translate({column_sql}, '-_', '+/'), 'base64')"
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = %s",
+        [table, column]
+    )
+    return cursor.fetchone() is not None
+
+
+def _column_type(cursor, table, column):
+    cursor.execute(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = %s AND column_name = %s",
+        [table, column]
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def prepare(connection, table, column):
+    trigger = f"{table}_{column}_bin_sync"
+    decoded_new = decode_sql(f'NEW."{column}"')
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "{column}_bin" bytea NULL')
+        cursor.execute(f'''
+            CREATE OR REPLACE FUNCTION "{trigger}"() RETURNS trigger AS $$
+            BEGIN
+                NEW."{column}_bin" := CASE
+                    WHEN NEW."{column}" IS NULL THEN NULL
+                    ELSE {decoded_new}
+                END;
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute(f'DROP TRIGGER IF EXISTS "{trigger}" ON "{table}"')
+        cursor.execute(
+            f'CREATE TRIGGER "{trigger}" BEFORE INSERT OR UPDATE OF "{column}" ON "{table}" '
+            f'FOR EACH ROW EXECUTE FUNCTION "{trigger}"()'
+        )
+
+
+def backfill(connection, table, column, batch_size=1000, sleep=0.0, start_after=None, on_batch=None):
+    """تعبئة عمود الظل على دفعات بترتيب المفتاح الأساسي. تعيد آخر id تمت معالجته."""
+    decoded = decode_sql(f'"{column}"')
+    last_id = start_after
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT id FROM "{table}" WHERE (%s::uuid IS NULL OR id > %s::uuid) ORDER BY id LIMIT %s',
+                [last_id, last_id, batch_size]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                return last_id
+            cursor.execute(
+                f'UPDATE "{table}" SET "{column}_bin" = {decoded} '
+                f'WHERE id = ANY(%s) AND "{column}" IS NOT NULL AND "{column}_bin" IS NULL',
+                [ids]
+            )
+        last_id = ids[-1]
+        if on_batch:
+            on_batch(last_id, len(ids))
+        if sleep:
+            time.sleep(sleep)
+
+
+def swap(connection, table, column, null=True):
+    """
+    الخطوة الأخيرة (داخل الترحيل): إذا حُضّر عمود الظل مسبقاً فهي إعادة تسمية فقط.
+    وإلا نحوّل العمود مباشرة (يعيد كتابة الجدول - مقبول للقواعد الصغيرة فقط).
+    null: قيمة field.null في النموذج؛ عمود الظل أُضيف NULL-able فنعيد NOT NULL بعد التسمية.
+    """
+    trigger = f"{table}_{column}_bin_sync"
+    decoded = decode_sql(f'"{column}"')
+    with connection.cursor() as cursor:
+        if _column_type(cursor, table, column) == 'bytea':
+            return
+
+        if not _column_exists(cursor, table, f"{column}_bin"):
+            logger.warning(f"{table}.{column} was not prepared, converting in place (table rewrite).")
+            cursor.execute(
+                f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE bytea '
+                f'USING {decoded}'
+            )
+            return
+
+        cursor.execute(f'DROP TRIGGER IF EXISTS "{trigger}" ON "{table}"')
+        cursor.execute(f'DROP FUNCTION IF EXISTS "{trigger}"()')
+        # أي صفوف فاتتها التعبئة (يفترض أن تكون صفراً بفضل الـ Trigger)
+        cursor.execute(
+            f'UPDATE "{table}" SET "{column}_bin" = {decoded} '
+            f'WHERE "{column}" IS NOT NULL AND "{column}_bin" IS NULL'
+        )
+        cursor.execute(f'ALTER TABLE "{table}" RENAME COLUMN "{column}" TO "{column}_text_old"')
+        cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN "{column}_text_old" DROP NOT NULL')
+        cursor.execute(f'ALTER TABLE "{table}" RENAME COLUMN "{column}_bin" TO "{column}"')
+        if not null:
+            # فحص للجدول بدون إعادة كتابته (كل الصفوف ممتلئة بفضل الـ Trigger والتعبئة أعلاه)
+            cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" SET NOT NULL')
+
+
+def cleanup(connection, table, column):
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{table}" DROP COLUMN IF EXISTS "{column}_text_old"')
@@ -1,9 +1,14 @@
+import asyncio
 import json
 import traceback
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 from django.core.cache import cache
 from asgiref.sync import sync_to_async # نحتاجه فقط للكاش حالياً
 from .models import ChatSession, Message
+from .services.triage_service import TriageService
+from .tasks import process_message_ai
+from apps.core.services import AsyncAzureTranslator
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -80,34 +85,67 @@ class ChatConsumer(AsyncWebsocketConsumer):
             # --- الحفظ والإرسال (Django Modern Async ORM) ---
             
             # 1. جلب الجلسة باستخدام aget
-            session = await ChatSession.objects.aget(id=self.session_id)
-
-            # 2. إنشاء الرسالة باستخدام acreate
-            # هذا يستبدل الحاجة لدالة save_message المنفصلة
-            saved_message = await Message.objects.acreate(
-                session=session,
-                sender=user,
-                text_original=message_text
-            )
+            session = await ChatSession.objects.select_related('refugee').aget(id=self.session_id)
 
-            # ملاحظة هامة: acreate ستستدعي save() الخاصة بنا تلقائياً،
-            # وبما أن save() تحتوي على كود Celery، كل شيء سيعمل بتناغم.
+            # 2. إنشاء الرسالة وفرز النص الأصلي أولاً: الإنذار لا ينتظر Azure
+            # النصوص القصيرة تُترجم هنا مباشرة (async)، فلا نرسلها لـ Celery عند الحفظ
+            translate_inline = len(message_text) <= getattr(settings, 'ASYNC_TRANSLATION_MAX_CHARS', 0)
+            saved_message = Message(session=session, sender=user, text_original=message_text)
+            saved_message._translate_inline = translate_inline
+            await saved_message.asave()
+
+            if not user.is_staff:
+                await sync_to_async(TriageService.triage_original)(saved_message)
+
+            await self.broadcast(saved_message)
+
+            if not translate_inline:
+                return
+
+            # 3. الترجمة المباشرة ثم تحديث نفس الرسالة (الواجهة تستبدلها حسب id)
+            translation = await self.translate_now(message_text, session)
+            if not translation:
+                # مهلة أو خطأ: يكمل Celery الترجمة كالمعتاد
+                await sync_to_async(process_message_ai.delay)(str(saved_message.id))
+                return
+
+            saved_message.text_translated = translation
+            await saved_message.asave(update_fields=['text_translated'])
+            if not user.is_staff:
+                await sync_to_async(TriageService.triage_translation)(saved_message)
+
+            await self.broadcast(saved_message)
 
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'id': str(saved_message.id),
-                    'sender_id': user.id,
-                    'text_original': saved_message.text_original,
-                    'text_translated': saved_message.text_translated,
-                    'timestamp': str(saved_message.timestamp.strftime("%H:%M")),
-                }
-            )
-        
         except Exception as e:
             print("❌ Error in receive:")
             traceback.print_exc()
 
+    async def translate_now(self, text, session):
+        """يعيد الترجمة، أو None ليتولاها Celery (مهلة أو خطأ)."""
+        # نفس قاعدة process_message_ai: اللاجئ -> النرويجية، الممرض -> لغة اللاجئ
+        source_lang = self.user.native_language or 'en'
+        target_lang = 'no' if self.user.role == 'REFUGEE' else session.refugee.native_language
+        try:
+            return await asyncio.wait_for(
+                AsyncAzureTranslator().translate(text, source_lang, target_lang),
+                timeout=getattr(settings, 'ASYNC_TRANSLATION_TIMEOUT', 3.0)
+            )
+        except asyncio.TimeoutError:
+            return None
+
+    async def broadcast(self, message):
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'chat_message',
+                'id': str(message.id),
+                'sender_id': message.sender_id,
+                'text_original': message.text_original,
+                'text_translated': message.text_translated,
+                'is_urgent': message.is_urgent,
+                'timestamp': str(message.timestamp.strftime("%H:%M")),
+            }
+        )
+
     async def chat_message(self, event):
         await self.send(text_data=json.dumps(event))
\ No newline at end of file
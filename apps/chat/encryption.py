@@ -0,0 +1,308 @@
+import hashlib
+import hmac
+import logging
+import re
+import unicodedata
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db.models.query_utils import DeferredAttribute
+from django.dispatch import receiver
+from django.core.signals import setting_changed
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+from apps.core.lru import BoundedLRU
+
+logger = logging.getLogger(__name__)
+
+DECRYPTION_ERROR_TEXT = "[Encrypted Data - Error]"
+
+# ==============================================================================
+# 1. مفاتيح التشفير (نسخة واحدة لكل عملية)
+# ==============================================================================
+# أثناء فترة تدوير المفتاح: نشفر دائماً بالمفتاح الجديد (DB_ENCRYPTION_KEY)
+# ونقبل القراءة بأي مفتاح قديم مذكور في DB_ENCRYPTION_OLD_KEYS
+_fernet = None
+_primary_fernet = None
+
+
+def get_primary_fernet():
+    global _primary_fernet
+    if _primary_fernet is None:
+        _primary_fernet = Fernet(settings.DB_ENCRYPTION_KEY)
+    return _primary_fernet
+
+
+def get_fernet():
+    global _fernet
+    if _fernet is None:
+        old_keys = getattr(settings, 'DB_ENCRYPTION_OLD_KEYS', [])
+        _fernet = MultiFernet([get_primary_fernet()] + [Fernet(key) for key in old_keys])
+    return _fernet
+
+
+def reset_fernet():
+    global _fernet, _primary_fernet
+    _fernet = None
+    _primary_fernet = None
+
+
+@receiver(setting_changed)
+def _on_setting_changed(setting, **kwargs):
+    global _decrypt_cache
+    if setting.startswith('DB_ENCRYPTION_'):
+        reset_fernet()
+    if setting.startswith(('DB_ENCRYPTION_', 'DB_DECRYPT_CACHE_')):
+        _decrypt_cache = None
+
+
+def rotate_token(token):
+    """
+    إعادة تشفير رمز بالمفتاح الجديد دون المرور بالنص الصريح في بقية النظام.
+    يعيد None إذا كان الرمز مشفراً بالمفتاح الجديد أصلاً.
+    """
+    try:
+        get_primary_fernet().decrypt(token.encode('utf-8'))
+        return None
+    except InvalidToken:
+        pass
+    return get_fernet().rotate(token.encode('utf-8')).decode('utf-8')
+
+
+# ==============================================================================
+# 1.1 الضغط قبل التشفير (النص المشفر لا يمكن ضغطه لاحقاً في TOAST)
+# ==============================================================================
+# النصوص المضغوطة تبدأ بهذه العلامة. nh3 يحذف المحرف \x00 من أي نص،
+# فلا يمكن أن يبدأ نص قديم (غير مضغوط) بها.
+ZLIB_MARKER = b'\x00z1'
+
+
+def compress_payload(payload, threshold=None):
+    if threshold is None:
+        threshold = getattr(settings, 'DB_ENCRYPTION_COMPRESS_THRESHOLD', 0)
+    if not threshold or len(payload) < threshold:
+        return payload
+    compressed = ZLIB_MARKER + zlib.compress(payload, getattr(settings, 'DB_ENCRYPTION_COMPRESS_LEVEL', 6))
+    # نضغط فقط إذا كان هناك توفير فعلي
+    return compressed if len(compressed) < len(payload) else payload
+
+
+def decompress_payload(payload):
+    if payload.startswith(ZLIB_MARKER):
+        return zlib.decompress(payload[len(ZLIB_MARKER):])
+    return payload
+
+
+def encrypt_text(clean_value, compress_threshold=None):
+    """
+    تشفير نص (بعد تنظيفه وضغطه إن كان طويلاً) وإرجاع رمز Fernet كنص.
+    compress_threshold: None = DB_ENCRYPTION_COMPRESS_THRESHOLD، و 0 = بدون ضغط.
+    """
+    payload = compress_payload(clean_value.encode('utf-8'), compress_threshold)
+    return get_fernet().encrypt(payload).decode('utf-8')
+
+
+def decrypt_token(token, use_cache=True):
+    """
+    فك تشفير رمز Fernet. عند الفشل نعيد نصاً بديلاً بدلاً من رفع خطأ.
+    use_cache=False: تكلفة Fernet الحقيقية دون كاش النصوص المفكوكة (benchmark_encryption).
+    """
+    cache = get_decrypt_cache()
+    cache_key = None
+    if use_cache and cache.enabled:
+        cache_key = hashlib.blake2b(token.encode('utf-8'), digest_size=16).digest()
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    try:
+        plaintext = decompress_payload(get_fernet().decrypt(token.encode('utf-8'))).decode('utf-8')
+    except Exception as e:
+        logger.error(f"Decryption failed: {e}")
+        return DECRYPTION_ERROR_TEXT
+
+    if cache_key is not None:
+        # الحجم بالبايت (العربية والأمهرية أكثر من بايت للحرف)
+        cache.set(cache_key, plaintext, len(cache_key) + len(plaintext.encode('utf-8')))
+    return plaintext
+
+
+# ==============================================================================
+# 1.2 كاش النصوص المفكوكة (LRU لكل عملية)
+# ==============================================================================
+# المفتاح بصمة الرمز المشفر (وليس النص)، والنص لا يبقى أكثر من TTL ثانية
+_decrypt_cache = None
+
+
+def get_decrypt_cache():
+    global _decrypt_cache
+    if _decrypt_cache is None:
+        _decrypt_cache = BoundedLRU(
+            max_bytes=getattr(settings, 'DB_DECRYPT_CACHE_MAX_BYTES', 0),
+            ttl=getattr(settings, 'DB_DECRYPT_CACHE_TTL', 300),
+        )
+    return _decrypt_cache
+
+
+def get_decrypt_cache_stats():
+    return get_decrypt_cache().stats()
+
+
+# ==============================================================================
+# 2. فك التشفير الكسول (Lazy Decryption)
+# ==============================================================================
+class Ciphertext:
+    """
+    رمز Fernet كما جاء من قاعدة البيانات.
+    لا يُفك تشفيره إلا عند أول قراءة للحقل، فالصفحات التي تقرأ المعرفات
+    والتواريخ فقط لا تدفع أي تكلفة تشفير.
+    """
+    __slots__ = ('token',)
+
+    def __init__(self, token):
+        self.token = token
+
+    def decrypt(self):
+        return decrypt_token(self.token)
+
+    def __bool__(self):
+        return bool(self.token)
+
+    def __str__(self):
+        # values() / values_list() تفك القيم بنفسها (EncryptedQuerySet)؛ هذا احتياط للقوالب والاستعلامات من نماذج أخرى
+        return self.decrypt()
+
+    def __repr__(self):
+        return "<Ciphertext>"
+
+
+class EncryptedAttribute(DeferredAttribute):
+    """
+    واصف (Descriptor) للحقل المشفر: يفك الرمز عند أول قراءة
+    ثم يحفظ النص الصريح في instance.__dict__ (Memoization).
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, Ciphertext):
+            value = value.decrypt()
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+def is_lazy_enabled():
+    return getattr(settings, 'DB_ENCRYPTION_LAZY', True)
+
+
+# ==============================================================================
+# 3. فك التشفير الجماعي (Bulk / Parallel)
+# ==============================================================================
+# الدفعات الصغيرة تُفك مباشرة، فتكلفة توزيعها على المجمّع أكبر من فائدتها
+PARALLEL_MIN_BATCH = 64
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'DB_DECRYPT_WORKERS', 4)
+        if getattr(settings, 'DB_DECRYPT_USE_PROCESSES', False):
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='decrypt')
+    return _executor
+
+
+def reset_decrypt_executor(shutdown=True):
+    """
+    نسيان مجمّع فك التشفير ليُنشأ من جديد عند أول استخدام.
+    بعد fork لا نوقفه (shutdown=False): خيوط/عمليات المجمّع الموروث لا وجود لها
+    في الابن، وانتظارها قد يعلّق الـ Worker.
+    """
+    global _executor
+    executor, _executor = _executor, None
+    if shutdown and executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _decrypt_chunk(tokens):
+    return [decrypt_token(token) for token in tokens]
+
+
+def decrypt_many(tokens):
+    """فك مجموعة رموز دفعة واحدة مع الحفاظ على الترتيب."""
+    tokens = list(tokens)
+    workers = getattr(settings, 'DB_DECRYPT_WORKERS', 4)
+    if workers <= 1 or len(tokens) < PARALLEL_MIN_BATCH:
+        return _decrypt_chunk(tokens)
+
+    size = -(-len(tokens) // workers)
+    chunks = [tokens[i:i + size] for i in range(0, len(tokens), size)]
+    results = []
+    for chunk_result in _get_executor().map(_decrypt_chunk, chunks):
+        results.extend(chunk_result)
+    return results
+
+
+def decrypt_instances(instances, attnames):
+    """يفك كل الحقول الكسولة في مجموعة كائنات مرة واحدة ويحفظ النتائج عليها."""
+    pending = []
+    for obj in instances:
+        for attname in attnames:
+            value = obj.__dict__.get(attname)
+            if isinstance(value, Ciphertext):
+                pending.append((obj, attname, value.token))
+
+    if not pending:
+        return
+    plaintexts = decrypt_many(token for _, _, token in pending)
+    for (obj, attname, _), text in zip(pending, plaintexts):
+        obj.__dict__[attname] = text
+
+
+# ==============================================================================
+# 4. الفهرس الأعمى (Blind Index) للبحث دون فك التشفير
+# ==============================================================================
+# نخزن HMAC للمقاطع الثلاثية (Trigrams) لكل كلمة بعد التطبيع، فيمكن للـ SQL تضييق
+# الرسائل المرشحة قبل فك أي تشفير، دون أن يُخزن النص نفسه.
+# المقاطع (وليس الكلمات) تجعل التضييق مجموعة شاملة لبحث النص الجزئي:
+# "hostet" و "kvalmende" تحمل كل مقاطع "hoste" و "kvalme".
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+BLIND_INDEX_GRAM = 3
+# بصمة ثابتة لكل رسالة مفهرسة بهذا الشكل؛ الرسائل بدونها (قبل rebuild_search_index) لا تُستبعد
+BLIND_INDEX_VERSION_TERM = '#trigram-v1'
+
+
+def normalize_words(text):
+    if not text:
+        return []
+    return WORD_RE.findall(unicodedata.normalize('NFKC', text).casefold())
+
+
+def blind_index_grams(word):
+    """كل المقاطع الثلاثية في الكلمة (أو الكلمة كاملة إذا كانت أقصر)."""
+    if len(word) <= BLIND_INDEX_GRAM:
+        return {word}
+    return {word[i:i + BLIND_INDEX_GRAM] for i in range(len(word) - BLIND_INDEX_GRAM + 1)}
+
+
+def blind_index_terms(text):
+    """مقاطع كل كلمات النص."""
+    terms = set()
+    for word in normalize_words(text):
+        terms |= blind_index_grams(word)
+    return terms
+
+
+def blind_index_token(term):
+    key = settings.DB_BLIND_INDEX_KEY
+    digest = hmac.new(key.encode('utf-8'), term.encode('utf-8'), hashlib.sha256).hexdigest()
+    return digest[:32]
@@ -0,0 +1,154 @@
+import json
+import random
+import time
+
+import nh3
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import connection, transaction
+
+from apps.accounts.models import User
+from apps.chat.encryption import decrypt_token, encrypt_text, get_decrypt_cache, is_lazy_enabled
+from apps.chat.models import ChatSession, Message
+
+SIZES = [1, 100, 1024, 4096, 10240]
+ENCRYPTED_FIELDS = ['text_original', 'text_translated', 'ai_analysis']
+# مزيج من العربية والنرويجية والإنجليزية ليشبه الرسائل الحقيقية
+ALPHABET = "abcdefghijklmnopqrstuvwxyzæøå ابتثجحخدذرزسشصضطظعغفقكلمنهوي 0123456789.,"
+
+
+def make_text(rng, size):
+    return "".join(rng.choice(ALPHABET) for _ in range(size))
+
+
+def rate(count, seconds):
+    return round(count / seconds, 1) if seconds else None
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks EncryptedTextField (crypto, sanitizer, storage overhead, ORM rates) and prints JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Field-level operations per text size')
+        parser.add_argument('--rows', type=int, default=500, help='Rows per ORM insert/select run')
+        parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Text sizes in characters')
+        parser.add_argument('--compress-threshold', type=int,
+                            default=getattr(settings, 'DB_ENCRYPTION_COMPRESS_THRESHOLD', 0),
+                            help='Compress payloads of at least this many bytes before encryption (0 = off)')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        report = {
+            'database': connection.vendor,
+            'lazy_decryption': is_lazy_enabled(),
+            'compress_threshold': options['compress_threshold'],
+            'field': self.bench_field(rng, options['sizes'], options['iterations'], options['compress_threshold']),
+            'orm': self.bench_orm(rng, options['rows']),
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"✅ Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def bench_field(self, rng, sizes, iterations, compress_threshold):
+        field = Message._meta.get_field('text_original')
+        results = []
+
+        for size in sizes:
+            texts = [make_text(rng, size) for _ in range(iterations)]
+
+            # نفس خطوات get_prep_value (تنظيف + تشفير + bytea) مع حد ضغط صريح
+            start = time.perf_counter()
+            raws = [field.token_to_raw(encrypt_text(nh3.clean(t, tags=set()), compress_threshold)) for t in texts]
+            prep_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for t in texts:
+                nh3.clean(t, tags=set())
+            clean_seconds = time.perf_counter() - start
+
+            # from_db_value (كسول: bytea -> رمز) ثم فك التشفير الفعلي بدون كاش النصوص المفكوكة
+            start = time.perf_counter()
+            tokens = [field.raw_to_token(raw) for raw in raws]
+            load_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for token in tokens:
+                decrypt_token(token, use_cache=False)
+            decrypt_seconds = time.perf_counter() - start
+
+            plain_bytes = sum(len(t.encode('utf-8')) for t in texts)
+            raw_bytes = sum(len(raw) for raw in raws)
+            base64_bytes = sum(len(token) for token in tokens)
+
+            results.append({
+                'size_chars': size,
+                'iterations': iterations,
+                'get_prep_value_ops_per_sec': rate(iterations, prep_seconds),
+                'from_db_value_ops_per_sec': rate(iterations, load_seconds),
+                'decrypt_ops_per_sec': rate(iterations, decrypt_seconds),
+                'nh3_clean_ops_per_sec': rate(iterations, clean_seconds),
+                'nh3_share_of_get_prep_value': round(clean_seconds / prep_seconds, 3) if prep_seconds else None,
+                # حجم الرمز كنص base64 (EncryptedTextField) مقابل نفس الرمز كبايتات خام (bytea)
+                'base64_inflation_ratio': round(base64_bytes / raw_bytes, 3),
+                # الحجم المخزن فعلاً (bytea بعد الضغط والتشفير) مقابل النص الصريح
+                'stored_to_plaintext_ratio': round(raw_bytes / plain_bytes, 3),
+            })
+        return results
+
+    def bench_orm(self, rng, rows):
+        results = []
+        text = make_text(rng, 500)
+
+        # كل شيء داخل معاملة يتم التراجع عنها، فلا يبقى أثر في القاعدة
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username="__bench_user__", email="bench@example.com",
+                password=None, full_name="Benchmark", role="REFUGEE"
+            )
+            session = ChatSession.objects.create(refugee=user)
+
+            for populated in range(len(ENCRYPTED_FIELDS) + 1):
+                values = {name: text for name in ENCRYPTED_FIELDS[:populated]}
+                batch = [Message(session=session, sender=user, language_code='ar', **values) for _ in range(rows)]
+
+                # كل قياس يبدأ بكاش فارغ: نقيس Fernet لا الكاش
+                get_decrypt_cache().clear()
+                start = time.perf_counter()
+                Message.objects.bulk_create(batch)
+                insert_seconds = time.perf_counter() - start
+
+                queryset = Message.objects.filter(session=session)
+                start = time.perf_counter()
+                for msg in queryset:
+                    for name in ENCRYPTED_FIELDS:
+                        getattr(msg, name)
+                select_seconds = time.perf_counter() - start
+
+                get_decrypt_cache().clear()
+                start = time.perf_counter()
+                list(queryset.only('id', 'timestamp', 'is_urgent', *ENCRYPTED_FIELDS))
+                select_lazy_seconds = time.perf_counter() - start
+
+                get_decrypt_cache().clear()
+                start = time.perf_counter()
+                list(queryset.decrypted())
+                select_bulk_seconds = time.perf_counter() - start
+
+                results.append({
+                    'encrypted_fields_populated': populated,
+                    'rows': rows,
+                    'insert_rows_per_sec': rate(rows, insert_seconds),
+                    'select_and_read_rows_per_sec': rate(rows, select_seconds),
+                    'select_without_reading_rows_per_sec': rate(rows, select_lazy_seconds),
+                    'select_bulk_decrypted_rows_per_sec': rate(rows, select_bulk_seconds),
+                })
+                queryset.delete()
+
+            transaction.set_rollback(True)
+        return results
@@ -0,0 +1,176 @@
+import json
+import random
+import time
+from collections import Counter
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.chat.models import DangerKeyword
+from apps.chat.services.triage_service import TriageService, bump_keywords_version
+
+# نفس قوالب test_extreme_multilang.py (النص الأصلي بلغة اللاجئ)
+LANG_CONFIG = {
+    'ar': {
+        'safe': ["مرحبا، كيف حالك؟", "أحتاج لموعد", "شكرا لك", "هل العيادة مفتوحة؟"],
+        'danger': ["أشعر بنزيف حاد", "ألم شديد في الصدر", "لا أستطيع التنفس", "دم يخرج من فمي"],
+    },
+    'uk': {
+        'safe': ["Привіт", "Як справи?", "Мені потрібен лікар", "Дякую"],
+        'danger': ["У мене сильний біль у грудях", "Я стікаю кров'ю", "Я не можу дихати", "Втрата свідомості"],
+    },
+    'so': {
+        # "التنفس عند الطفل طبيعي": كلمة عامة لا يجب أن تجعل الرسالة عاجلة
+        'safe': ["Iska warran", "Waan fiicanahay", "Dhakhtar baan rabaa", "Mahadsanid", "Neefsashada ilmaha waa caadi"],
+        'danger': ["Xanuun laabta ah", "Dhiig baxaya", "Neefsashada oo dhib ah", "Suuxdin"],
+    },
+    'ti': {
+        'safe': ["ሰላም", "ከመይ አለኻ", "ትኬት ደልየ", "የቐንየለይ"],
+        'danger': ["ከቢድ ናይ ልቢ ቃንዛ", "ደም ይፈስስ", "ምትንፋስ አሸጊሩኒ", "ውኖ ምጥፋእ"],
+    },
+    'es': {
+        'safe': ["Hola", "Necesito una cita", "Gracias", "Quiero información sobre el aborto"],
+        'danger': ["Estoy sangrando mucho", "Dolor en el pecho", "No puedo respirar", "Tuve un aborto espontáneo"],
+    },
+    'en': {
+        'safe': ["Hello", "How are you", "I need an appointment", "Thanks"],
+        'danger': ["Severe chest pain", "Heavy bleeding", "Cannot breathe", "Fainting"],
+    },
+}
+
+# ما تعيده الترجمة إلى النرويجية (المرور الثاني)
+TRANSLATED_CONFIG = {
+    'safe': [
+        "Hei, hvordan går det?", "Jeg trenger en time", "Takk for hjelpen", "Er klinikken åpen?",
+        "Jeg har vondt i halsen", "Kan jeg få resept på nytt?", "Barnet mitt hoster litt",
+    ],
+    'danger': [
+        "Jeg har sterke brystsmerter", "Jeg blør kraftig", "Jeg har pustevansker",
+        "Jeg mistet bevisstheten", "Jeg har høy feber og kramper", "Jeg er gravid og har blødning",
+        "Jeg besvimte i dag",
+    ],
+}
+
+# حشو عشوائي حول القالب حتى لا تتكرر الرسائل حرفياً وتختلف أطوالها
+PREFIXES = ["", "", "Hei. ", "Please, ", "... ", "Doktor, "]
+SUFFIXES = ["", "", " !!", " 🙏", " (i dag)", " since yesterday"]
+
+
+def build_corpus(rng, size):
+    """
+    يعيد [(language, label, original, translated, original_template, translated_template)]،
+    نصفها تقريباً خطرة.
+    """
+    languages = list(LANG_CONFIG)
+    corpus = []
+    for _ in range(size):
+        language = rng.choice(languages)
+        label = 'danger' if rng.random() < 0.5 else 'safe'
+        wrap = rng.choice(PREFIXES), rng.choice(SUFFIXES)
+        original = rng.choice(LANG_CONFIG[language][label])
+        translated = rng.choice(TRANSLATED_CONFIG[label])
+        corpus.append((
+            language, label,
+            f"{wrap[0]}{original}{wrap[1]}", f"{wrap[0]}{translated}{wrap[1]}",
+            original, translated,
+        ))
+    return corpus
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks TriageService (speed, latency, precision/recall) on a synthetic multilingual corpus and prints JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=100_000, help='Synthetic messages to generate')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (same seed = same corpus)')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        corpus = build_corpus(random.Random(options['seed']), options['messages'])
+
+        # بدون كلمات في القاعدة نزرع القواميس الافتراضية داخل معاملة يتم التراجع عنها
+        with transaction.atomic():
+            seeded = not DangerKeyword.objects.filter(is_active=True).exists()
+            if seeded:
+                call_command('load_keywords', stdout=StringIO())
+            bump_keywords_version()
+            # بناء المطابقات قبل القياس
+            TriageService.check_for_danger("warmup")
+
+            report = {
+                'messages': len(corpus),
+                'seed': options['seed'],
+                'keywords_seeded_for_run': seeded,
+                'translated_pass': self.run_pass(
+                    corpus, lambda language, original, translated: TriageService.check_for_danger(translated),
+                    template_index=5,
+                ),
+                'original_pass': self.run_pass(
+                    corpus, lambda language, original, translated: TriageService.check_original_for_danger(original, language),
+                    template_index=4,
+                ),
+            }
+            transaction.set_rollback(True)
+        bump_keywords_version()
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"✅ Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run_pass(self, corpus, check, template_index):
+        latencies = []
+        counts = Counter()
+        per_language = {}
+        missed, false_alarms = Counter(), Counter()
+
+        start = time.perf_counter()
+        for item in corpus:
+            language, label, original, translated = item[:4]
+            t0 = time.perf_counter_ns()
+            flagged = check(language, original, translated)
+            latencies.append(time.perf_counter_ns() - t0)
+
+            expected = label == 'danger'
+            outcome = ('tp' if flagged else 'fn') if expected else ('fp' if flagged else 'tn')
+            counts[outcome] += 1
+            per_language.setdefault(language, Counter())[outcome] += 1
+            # نجمع الأخطاء حسب القالب (بدون الحشو) ليسهل إصلاح القاموس
+            if outcome == 'fn':
+                missed[item[template_index]] += 1
+            elif outcome == 'fp':
+                false_alarms[item[template_index]] += 1
+        seconds = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            'messages_per_sec': round(len(corpus) / seconds, 1) if seconds else None,
+            'p50_latency_us': round(percentile(latencies, 0.50) / 1000, 2),
+            'p99_latency_us': round(percentile(latencies, 0.99) / 1000, 2),
+            **self.scores(counts),
+            'recall_by_language': {lang: self.scores(c)['recall'] for lang, c in sorted(per_language.items())},
+            'top_missed': [text for text, _ in missed.most_common(10)],
+            'top_false_positives': [text for text, _ in false_alarms.most_common(10)],
+        }
+
+    @staticmethod
+    def scores(counts):
+        tp, fp, fn, tn = counts['tp'], counts['fp'], counts['fn'], counts['tn']
+        return {
+            'true_positives': tp,
+            'false_positives': fp,
+            'false_negatives': fn,
+            'true_negatives': tn,
+            'precision': round(tp / (tp + fp), 4) if tp + fp else None,
+            'recall': round(tp / (tp + fn), 4) if tp + fn else None,
+        }
@@ -26,7 +26,7 @@ class Command(BaseCommand):
                     
                     # حذف الرابط من قاعدة البيانات (أو ترك رسالة "تم الحذف")
                     msg.image = None 
-                    msg.save()
+                    msg.save(update_fields=['image'])
                     count += 1
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f'Error deleting image {msg.id}: {e}'))
@@ -0,0 +1,63 @@
+import json
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import BinaryField, ExpressionWrapper, F, TextField
+
+from apps.chat.encryption import ZLIB_MARKER, compress_payload, decompress_payload, get_fernet
+from apps.chat.models import EncryptedFieldMixin
+
+# الجدول -> حقل الترتيب لأخذ أحدث الصفوف
+ENCRYPTED_MODELS = {
+    'chat.Message': '-timestamp',
+    'chat.TranslationCache': '-created_at',
+    'chat.ImageAnalysisCache': '-created_at',
+}
+
+
+def fernet_raw_size(payload_len):
+    # version(1) + timestamp(8) + IV(16) + AES-CBC مع الحشو + HMAC(32)
+    return 57 + (payload_len // 16 + 1) * 16
+
+
+class Command(BaseCommand):
+    help = 'Reports storage savings of compress-then-encrypt per encrypted column (JSON)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=2000, help='Latest rows sampled per model')
+
+    def handle(self, *args, **options):
+        fernet = get_fernet()
+        report = []
+
+        for label, ordering in ENCRYPTED_MODELS.items():
+            model = apps.get_model(label)
+            fields = [f for f in model._meta.concrete_fields if isinstance(f, EncryptedFieldMixin)]
+            raw_columns = [
+                ExpressionWrapper(F(f.attname), output_field=BinaryField() if isinstance(f, BinaryField) else TextField())
+                for f in fields
+            ]
+            rows = model.objects.order_by(ordering).values_list(*raw_columns)[:options['sample']]
+
+            stats = {f.attname: {'rows': 0, 'compressed_rows': 0, 'plain_bytes': 0, 'with_compression_bytes': 0, 'without_compression_bytes': 0} for f in fields}
+            for values in rows:
+                for field, raw in zip(fields, values):
+                    if not raw:
+                        continue
+                    token = field.raw_to_token(raw)
+                    payload = fernet.decrypt(token.encode('utf-8'))
+                    plain = decompress_payload(payload)
+                    column = stats[field.attname]
+                    column['rows'] += 1
+                    column['compressed_rows'] += payload.startswith(ZLIB_MARKER)
+                    column['plain_bytes'] += len(plain)
+                    column['with_compression_bytes'] += fernet_raw_size(len(compress_payload(plain)))
+                    column['without_compression_bytes'] += fernet_raw_size(len(plain))
+
+            for name, column in stats.items():
+                saved = column['without_compression_bytes'] - column['with_compression_bytes']
+                column['saved_bytes'] = saved
+                column['saved_pct'] = round(100 * saved / column['without_compression_bytes'], 1) if column['without_compression_bytes'] else 0.0
+                report.append({'column': f'{model._meta.db_table}.{name}', **column})
+
+        self.stdout.write(json.dumps(report, indent=2))
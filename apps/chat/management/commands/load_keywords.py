@@ -1,6 +1,65 @@
 from django.core.management.base import BaseCommand
 from apps.chat.models import DangerKeyword
 
+# قواميس المرور الأول: تُفحص على النص الأصلي فور وصوله (قبل الترجمة)
+# لذلك نتجنب الكلمات القصيرة جداً التي تظهر داخل كلمات عادية (مثل "دم" داخل "عدم")
+ORIGINAL_LANGUAGE_KEYWORDS = {
+    'en': [
+        "bleeding", "chest pain", "can't breathe", "cannot breathe", "unconscious",
+        "fainted", "seizure", "suicide", "kill myself", "miscarriage",
+        "heart attack", "stroke", "high fever", "ambulance",
+    ],
+    'ar': [
+        "نزيف", "ينزف", "ألم في الصدر", "ألم شديد", "لا أستطيع التنفس", "ضيق تنفس",
+        "فقدان الوعي", "إغماء", "تشنج", "انتحار", "إجهاض", "نوبة قلبية", "جلطة",
+        "حمى شديدة", "إسعاف", "طوارئ",
+    ],
+    'uk': [
+        "кровотеча", "біль у грудях", "не можу дихати", "втрата свідомості", "знепритомні",
+        "судоми", "самогубство", "викидень", "інфаркт", "інсульт", "висока температура",
+        "швидку допомогу",
+    ],
+    'ru': [
+        "кровотечение", "боль в груди", "не могу дышать", "потеря сознания", "потерял сознание",
+        "судороги", "самоубийство", "выкидыш", "инфаркт", "инсульт", "высокая температура",
+        "скорую помощь",
+    ],
+    'es': [
+        "sangrado", "sangrando", "dolor en el pecho", "no puedo respirar", "inconsciente",
+        "desmayo", "convulsiones", "suicidio", "aborto espontáneo", "infarto", "fiebre alta", "ambulancia",
+    ],
+    'so': [
+        "dhiig baxaya", "xanuun laabta", "neefsashada oo dhib", "ma neefsan karo", "suuxdin",
+        "qandho culus", "gargaar degdeg",
+    ],
+    'ti': [
+        "ደም ይፈስስ", "ናይ ልቢ ቃንዛ", "ምትንፋስ አሸጊሩኒ", "ውኖ ምጥፋእ",
+    ],
+    'am': [
+        "ደም እየፈሰሰ", "የደረት ሕመም", "መተንፈስ አልችልም", "ራሴን ሳትኩ", "ድንገተኛ ሕክምና",
+    ],
+    'zh': [
+        "流血", "出血", "胸痛", "呼吸困难", "不能呼吸", "昏迷", "晕倒", "抽搐", "自杀",
+        "流产", "心脏病发作", "中风", "高烧", "急救",
+    ],
+    'fa': [
+        "خونریزی", "درد قفسه سینه", "نفس تنگی", "نمی‌توانم نفس", "بیهوش", "غش کرد", "تشنج",
+        "خودکشی", "سقط جنین", "سکته", "تب شدید", "اورژانس",
+    ],
+    'ps': [
+        "وینه بهیږي", "د سینې درد", "ساه نشم", "بې هوښه", "ځان وژنه", "سخته تبه",
+    ],
+    'ku': [
+        "xwînrijîn", "êşa sîngê", "bêhna min naçe", "bêhiş", "xwekuştin", "taya bilind", "ambulans",
+    ],
+}
+
+# كلمات عامة حُذفت من القواميس: مع المطابقة الجزئية كانت تجعل رسائل عادية عاجلة
+# ("neefsashada" = التنفس، "aborto" = إجهاض متعمد أو سؤال عنه، "心脏病" = مرض القلب عموماً)
+RETIRED_KEYWORDS = [
+    ("aborto", 'es'), ("neefsashada", 'so'), ("ድንገተኛ", 'am'), ("心脏病", 'zh'), ("سقط", 'fa'),
+]
+
 class Command(BaseCommand):
     help = 'Loads medical triage keywords into the database'
 
@@ -48,19 +107,29 @@ class Command(BaseCommand):
             "hjelp", "akutt", "nød", "ambulanse", "dø", "døende"
         ]
 
-        self.stdout.write(self.style.WARNING(f'Starting to import {len(DOCTOR_KEYWORDS)} keywords...'))
+        keywords = [(word, 'no') for word in DOCTOR_KEYWORDS]
+        for language, words in ORIGINAL_LANGUAGE_KEYWORDS.items():
+            keywords.extend((word, language) for word in words)
+
+        self.stdout.write(self.style.WARNING(f'Starting to import {len(keywords)} keywords...'))
 
         count = 0
-        for word in DOCTOR_KEYWORDS:
+        for word, language in keywords:
             # تنظيف الكلمة (أحرف صغيرة + إزالة مسافات)
             clean_word = word.lower().strip()
             
             # استخدام get_or_create لمنع التكرار إذا شغلت السكربت مرتين
-            obj, created = DangerKeyword.objects.get_or_create(word=clean_word)
+            obj, created = DangerKeyword.objects.get_or_create(word=clean_word, language=language)
             
             if created:
                 count += 1
-                # self.stdout.write(f'- Added: {clean_word}') # ألغِ التعليق لرؤية التفاصيل
+                # self.stdout.write(f'- Added: {clean_word} ({language})') # ألغِ التعليق لرؤية التفاصيل
+
+        retired = 0
+        for word, language in RETIRED_KEYWORDS:
+            retired += DangerKeyword.objects.filter(word=word, language=language).delete()[0]
 
         self.stdout.write(self.style.SUCCESS(f'Successfully added {count} new keywords!'))
-        self.stdout.write(self.style.SUCCESS(f'Total keywords in DB: {DangerKeyword.objects.count()}'))
\ No newline at end of file
+        if retired:
+            self.stdout.write(self.style.WARNING(f'Removed {retired} retired keywords.'))
+        self.stdout.write(self.style.SUCCESS(f'Total keywords in DB: {DangerKeyword.objects.count()}'))
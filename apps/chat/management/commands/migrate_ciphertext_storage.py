@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.chat import binary_storage
+
+CHECKPOINT_KEY = 'binary_storage_checkpoint:{table}.{column}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Online conversion of encrypted columns from base64 text to bytea (PostgreSQL). '
+        'Run "prepare" and "backfill" on the live system, then deploy and run migrate '
+        '(migration chat.0003 only renames the columns), then "cleanup".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('stage', choices=['prepare', 'backfill', 'cleanup'])
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.1, help='Pause between batches (seconds)')
+        parser.add_argument('--reset', action='store_true', help='Ignore saved backfill checkpoints')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Online conversion is only needed on PostgreSQL; run "migrate" directly.')
+
+        for table, columns in binary_storage.ENCRYPTED_COLUMNS.items():
+            for column in columns:
+                getattr(self, options['stage'])(table, column, options)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Stage '{options['stage']}' finished."))
+
+    def prepare(self, table, column, options):
+        binary_storage.prepare(connection, table, column)
+        self.stdout.write(f' - {table}.{column}: shadow column + sync trigger ready')
+
+    def backfill(self, table, column, options):
+        checkpoint_key = CHECKPOINT_KEY.format(table=table, column=column)
+        if options['reset']:
+            cache.delete(checkpoint_key)
+        progress = {'rows': 0}
+
+        def on_batch(last_id, count):
+            # حفظ نقطة الاستئناف بعد كل دفعة
+            cache.set(checkpoint_key, str(last_id), timeout=None)
+            progress['rows'] += count
+            self.stdout.write(f" - {table}.{column}: {progress['rows']} rows")
+
+        binary_storage.backfill(
+            connection, table, column,
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            start_after=cache.get(checkpoint_key),
+            on_batch=on_batch,
+        )
+
+    def cleanup(self, table, column, options):
+        binary_storage.cleanup(connection, table, column)
+        cache.delete(CHECKPOINT_KEY.format(table=table, column=column))
+        self.stdout.write(f' - {table}.{column}: old text column dropped')
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.core.rate_limit import RateLimited
+from apps.chat.services.prewarm_service import PrewarmService
+
+
+class Command(BaseCommand):
+    help = 'Pre-translates UI strings, canned nurse replies and frequent phrases into every language'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mined', type=int, default=getattr(settings, 'TRANSLATION_PREWARM_MINED_LIMIT', 200),
+                            help='Number of frequent phrases to mine from TranslationCache')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the current cold-start hit rate')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            groups = PrewarmService.plan(options['mined'])
+            pairs = sum(len(texts) for texts in groups.values())
+            self.stdout.write(f'📊 {pairs} phrase/language pairs, cold-start hit rate {PrewarmService.hit_rate(groups):.1%}')
+            return
+
+        try:
+            report = PrewarmService.warm(options['mined'])
+        except RateLimited as e:
+            self.stdout.write(self.style.ERROR(f'⏳ Azure quota reached, run again in {e.retry_after}s.'))
+            return
+
+        self.stdout.write(f" - Phrase/language pairs: {report['pairs']} (+{report['reverse_pairs']} refugee -> nurse)")
+        if report['failed']:
+            self.stdout.write(self.style.WARNING(f" - Not translated (Azure unavailable): {report['failed']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Cold-start hit rate: {report['before']:.1%} -> {report['after']:.1%}"
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from apps.chat.models import Message
+from apps.chat.services.search_service import SearchIndexService
+
+
+class Command(BaseCommand):
+    help = 'Builds the blind search index (HMAC tokens) for existing messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        messages = Message.objects.filter(
+            Q(text_translated__isnull=False) | Q(ai_analysis__isnull=False)
+        ).order_by('pk').decrypted(fields=['text_translated', 'ai_analysis'], chunk_size=options['batch_size'])
+
+        count = 0
+        for msg in messages.iterator(chunk_size=options['batch_size']):
+            SearchIndexService.index_message(msg)
+            count += 1
+            if count % options['batch_size'] == 0:
+                self.stdout.write(f' - Indexed {count} messages...')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Indexed {count} messages.'))
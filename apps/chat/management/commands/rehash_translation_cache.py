@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from apps.chat.models import TranslationCache
+
+
+class Command(BaseCommand):
+    help = 'Re-keys TranslationCache rows hashed with an older cache key scheme (legacy lowercase keys or another normalizer pipeline)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rows = (
+            TranslationCache.objects.order_by('pk')
+            .only('id', 'source_hash', 'source_language', 'target_language', 'source_text')
+            .decrypted(fields=['source_text'], chunk_size=batch_size)
+        )
+
+        scanned = rehashed = dropped = 0
+        pending = []
+
+        def flush():
+            nonlocal rehashed, dropped
+            # نفس (البصمة، المصدر، الهدف) موجود مسبقاً بالنظام الجديد: الصف القديم زائد
+            existing = set(
+                TranslationCache.objects.filter(source_hash__in=[row.source_hash for row in pending])
+                .values_list('source_hash', 'source_language', 'target_language')
+            )
+            keep, duplicates = [], []
+            for row in pending:
+                key = (row.source_hash, row.source_language, row.target_language)
+                if key in existing:
+                    duplicates.append(row.id)
+                else:
+                    existing.add(key)
+                    keep.append(row)
+            TranslationCache.objects.filter(id__in=duplicates).delete()
+            TranslationCache.objects.bulk_update(keep, ['source_hash'], batch_size=batch_size)
+            rehashed += len(keep)
+            dropped += len(duplicates)
+            pending.clear()
+
+        for row in rows.iterator(chunk_size=batch_size):
+            scanned += 1
+            source_hash = TranslationCache.make_hash(row.source_text)
+            if source_hash != row.source_hash:
+                row.source_hash = source_hash
+                pending.append(row)
+                if len(pending) >= batch_size:
+                    flush()
+        if pending:
+            flush()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Re-keyed {rehashed} translation cache rows ({scanned} scanned, {dropped} duplicates removed).'
+        ))
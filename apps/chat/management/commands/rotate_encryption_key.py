@@ -0,0 +1,102 @@
+import logging
+import time
+
+from cryptography.fernet import InvalidToken
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import BinaryField, ExpressionWrapper, F, TextField
+
+from apps.chat.encryption import Ciphertext, rotate_token
+from apps.chat.models import EncryptedFieldMixin
+
+# الجداول التي تحتوي على حقول مشفرة
+ENCRYPTED_MODELS = ['chat.Message', 'chat.TranslationCache', 'chat.ImageAnalysisCache']
+CHECKPOINT_KEY = 'key_rotation_checkpoint:{label}'
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Re-encrypts all encrypted columns with DB_ENCRYPTION_KEY in small resumable batches (online key rotation)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0.2, help='Pause between batches (seconds) to limit DB load')
+        parser.add_argument('--models', nargs='+', default=ENCRYPTED_MODELS)
+        parser.add_argument('--reset', action='store_true', help='Ignore saved checkpoints and start from the beginning')
+
+    def handle(self, *args, **options):
+        # خطوات التدوير:
+        # 1. المفتاح الجديد في DB_ENCRYPTION_KEY والقديم في DB_ENCRYPTION_OLD_KEYS (القراءة تعمل بالاثنين)
+        # 2. تشغيل هذا الأمر (يمكن إيقافه واستئنافه في أي وقت)
+        # 3. حذف المفتاح القديم من DB_ENCRYPTION_OLD_KEYS
+        skipped = 0
+        for label in options['models']:
+            skipped += self.rotate_model(apps.get_model(label), label, options)
+
+        if skipped:
+            # صفوف تالفة أو بمفتاح غير موجود: حذف المفاتيح القديمة الآن قد يفقد بيانات
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ Key rotation finished with {skipped} unreadable rows skipped. Check them before removing the old keys.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Key rotation finished. You can now remove the old keys.'))
+
+    def rotate_model(self, model, label, options):
+        fields = [f for f in model._meta.concrete_fields if isinstance(f, EncryptedFieldMixin)]
+        checkpoint_key = CHECKPOINT_KEY.format(label=label)
+        if options['reset']:
+            cache.delete(checkpoint_key)
+
+        last_pk = cache.get(checkpoint_key)
+        if last_pk:
+            self.stdout.write(self.style.WARNING(f'↪️  {label}: resuming after {last_pk}'))
+
+        # نقرأ الرموز الخام مباشرة (بدون فك تشفير) عبر ExpressionWrapper
+        raw_columns = [
+            ExpressionWrapper(F(f.attname), output_field=BinaryField() if isinstance(f, BinaryField) else TextField())
+            for f in fields
+        ]
+        scanned = rotated = skipped = 0
+
+        while True:
+            # Keyset pagination: لا OFFSET ولا أقفال طويلة
+            queryset = model.objects.order_by('pk')
+            if last_pk:
+                queryset = queryset.filter(pk__gt=last_pk)
+            rows = list(queryset.values_list('pk', *raw_columns)[:options['batch_size']])
+            if not rows:
+                break
+
+            with transaction.atomic():
+                for pk, *raw_values in rows:
+                    old_values, new_values = {}, {}
+                    try:
+                        for field, raw in zip(fields, raw_values):
+                            token = field.raw_to_token(raw) if raw else None
+                            new_token = rotate_token(token) if token else None
+                            if new_token:
+                                old_values[field.attname] = Ciphertext(token)
+                                new_values[field.attname] = Ciphertext(new_token)
+                    except InvalidToken:
+                        # صف تالف أو مشفر بمفتاح لم يعد موجوداً: نتجاوزه ونكمل
+                        logger.warning(f"🔑 {label} pk={pk}: unreadable with the configured keys, skipped.")
+                        skipped += 1
+                        continue
+                    if new_values:
+                        # المقارنة مع الرمز القديم تمنع الكتابة فوق تعديل متزامن
+                        rotated += model.objects.filter(pk=pk, **old_values).update(**new_values)
+
+            scanned += len(rows)
+            last_pk = rows[-1][0]
+            cache.set(checkpoint_key, last_pk, timeout=None)
+            self.stdout.write(f' - {label}: scanned {scanned}, re-encrypted {rotated}, skipped {skipped}')
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        cache.delete(checkpoint_key)
+        self.stdout.write(self.style.SUCCESS(f'✅ {label}: {rotated} rows re-encrypted ({scanned} scanned, {skipped} skipped).'))
+        return skipped
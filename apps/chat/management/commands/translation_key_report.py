@@ -0,0 +1,94 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.chat.models import Message
+from apps.chat.tasks import _translation_pair
+from apps.core.services import split_sentences
+from apps.core.text_normalization import DEFAULT_PIPELINE, NORMALIZERS, PRESETS, get_pipeline, normalize_key
+
+
+def replay(lookups, pipeline):
+    """
+    محاكاة كاش فارغ بنفس ترتيب الرسائل: كل مفتاح شوهد سابقاً لنفس زوج اللغات إصابة.
+    variant_hits: إصابات نصها الأصلي مختلف عن أول نص بنفس المفتاح (ربح التطبيع).
+    case_collisions: إصابات يختلف نصها عن الأول في الحالة فقط (ترجمة قد تكون خاطئة).
+    """
+    first_seen = {}
+    hits = variant_hits = case_collisions = 0
+    for text, source_lang, target_lang in lookups:
+        key = (normalize_key(text, pipeline), source_lang, target_lang)
+        if key not in first_seen:
+            first_seen[key] = text
+            continue
+        first = first_seen[key]
+        hits += 1
+        if first != text:
+            variant_hits += 1
+            canonical_first, canonical = normalize_key(first, DEFAULT_PIPELINE), normalize_key(text, DEFAULT_PIPELINE)
+            if canonical_first != canonical and canonical_first.casefold() == canonical.casefold():
+                case_collisions += 1
+    return {
+        'pipeline': list(pipeline),
+        'lookups': len(lookups),
+        'distinct_keys': len(first_seen),
+        'hits': hits,
+        'hit_rate': round(hits / len(lookups), 4) if lookups else 0.0,
+        'variant_hits': variant_hits,
+        'case_collisions': case_collisions,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Replays recent messages against alternative cache key normalizers and reports the hit rate of each'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Replay messages from the last N days')
+        parser.add_argument('--limit', type=int, default=50_000, help='Maximum number of messages to replay')
+        parser.add_argument('--sentences', action='store_true', help='Replay sentence-level lookups (translation memory)')
+        parser.add_argument('--pipeline', action='append', default=[], metavar='NAME=step,step',
+                            help=f"Extra pipeline to compare. Steps: {', '.join(NORMALIZERS)}")
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        pipelines = {**PRESETS, 'configured': get_pipeline()}
+        for spec in options['pipeline']:
+            name, _, steps = spec.partition('=')
+            steps = [step for step in steps.split(',') if step]
+            unknown = set(steps) - set(NORMALIZERS)
+            if not name or unknown:
+                raise CommandError(f"Invalid pipeline '{spec}' (unknown steps: {', '.join(sorted(unknown))})")
+            pipelines[name] = steps
+
+        messages = (
+            Message.objects.filter(timestamp__gte=timezone.now() - timedelta(days=options['days']))
+            .exclude(text_original__isnull=True)
+            .select_related('sender', 'session__refugee')
+            .order_by('timestamp')
+            .decrypted(fields=['text_original'])[:options['limit']]
+        )
+        lookups = []
+        for message in messages:
+            if not message.text_original:
+                continue
+            source_lang, target_lang = _translation_pair(message)
+            if source_lang == target_lang:
+                continue
+            texts = split_sentences(message.text_original)[0] if options['sentences'] else [message.text_original]
+            lookups.extend((text, source_lang, target_lang) for text in texts)
+
+        report = {name: replay(lookups, pipeline) for name, pipeline in pipelines.items()}
+
+        self.stdout.write(f"📊 {len(lookups)} lookups replayed ({'sentences' if options['sentences'] else 'messages'}, last {options['days']} days)")
+        self.stdout.write(f"{'pipeline':<20}{'hit rate':>10}{'hits':>8}{'variants':>10}{'case':>6}{'keys':>8}")
+        for name, result in sorted(report.items(), key=lambda item: -item[1]['hit_rate']):
+            self.stdout.write(
+                f"{name:<20}{result['hit_rate']:>10.1%}{result['hits']:>8}"
+                f"{result['variant_hits']:>10}{result['case_collisions']:>6}{result['distinct_keys']:>8}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(json.dumps(report, indent=2, ensure_ascii=False))
+            self.stdout.write(self.style.SUCCESS(f"✅ Report written to {options['output']}"))
@@ -0,0 +1,100 @@
+# Generated by Django 6.0 on 2026-10-18 01:24
+
+import apps.chat.models
+from django.db import migrations
+
+from apps.chat import binary_storage
+from apps.chat.models import EncryptedBinaryField, EncryptedTextField
+
+MODEL_NAMES = {
+    'chat_message': 'Message',
+    'chat_translationcache': 'TranslationCache',
+    'chat_imageanalysiscache': 'ImageAnalysisCache',
+}
+
+
+def _alter_columns(apps, schema_editor, to_binary):
+    # قواعد التطوير والاختبار (SQLite...): تعديل عادي للحقول
+    for table, columns in binary_storage.ENCRYPTED_COLUMNS.items():
+        model = apps.get_model('chat', MODEL_NAMES[table])
+        for name in columns:
+            old_field = model._meta.get_field(name)
+            field_class = EncryptedBinaryField if to_binary else EncryptedTextField
+            new_field = field_class(null=old_field.null, blank=old_field.blank)
+            new_field.set_attributes_from_name(name)
+            new_field.model = model
+            schema_editor.alter_field(model, old_field, new_field)
+
+
+def forwards(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return _alter_columns(apps, schema_editor, to_binary=True)
+
+    # إذا شُغّل الأمر migrate_ciphertext_storage (prepare + backfill) مسبقاً
+    # فهذه الخطوة مجرد إعادة تسمية للأعمدة (قفل لحظي)
+    for table, columns in binary_storage.ENCRYPTED_COLUMNS.items():
+        model = apps.get_model('chat', MODEL_NAMES[table])
+        for column in columns:
+            binary_storage.swap(connection, table, column, null=model._meta.get_field(column).null)
+
+
+def backwards(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return _alter_columns(apps, schema_editor, to_binary=False)
+
+    with connection.cursor() as cursor:
+        for table, columns in binary_storage.ENCRYPTED_COLUMNS.items():
+            for column in columns:
+                cursor.execute(
+                    f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE text '
+                    f"USING translate(replace(encode(\"{column}\", 'base64'), E'\\n', ''), '+/', '-_')"
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_messagesearchtoken'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(forwards, backwards),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='imageanalysiscache',
+                    name='analysis_result',
+                    field=apps.chat.models.EncryptedBinaryField(editable=True),
+                ),
+                migrations.AlterField(
+                    model_name='message',
+                    name='ai_analysis',
+                    field=apps.chat.models.EncryptedBinaryField(blank=True, editable=True, null=True, verbose_name='AI Medical Analysis'),
+                ),
+                migrations.AlterField(
+                    model_name='message',
+                    name='text_original',
+                    field=apps.chat.models.EncryptedBinaryField(blank=True, editable=True, null=True, verbose_name='Original Text'),
+                ),
+                migrations.AlterField(
+                    model_name='message',
+                    name='text_translated',
+                    field=apps.chat.models.EncryptedBinaryField(blank=True, editable=True, null=True, verbose_name='Translated Text'),
+                ),
+                migrations.AlterField(
+                    model_name='translationcache',
+                    name='source_text',
+                    field=apps.chat.models.EncryptedBinaryField(editable=True),
+                ),
+                migrations.AlterField(
+                    model_name='translationcache',
+                    name='translated_text',
+                    field=apps.chat.models.EncryptedBinaryField(editable=True),
+                ),
+            ],
+        ),
+    ]
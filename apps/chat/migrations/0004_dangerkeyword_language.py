@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_binary_ciphertext_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dangerkeyword',
+            name='language',
+            field=models.CharField(choices=[('en', 'English'), ('uk', 'Ukrainian'), ('ar', 'Arabic'), ('es', 'Spanish'), ('so', 'Somali'), ('ti', 'Tigrinya'), ('zh', 'Chinese'), ('ru', 'Russian'), ('ps', 'Pashto'), ('am', 'Amharic'), ('ps', 'Pashto'), ('ku', 'Kurdish'), ('fa', 'Farsi'), ('no', 'Norwegian')], db_index=True, default='no', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='dangerkeyword',
+            name='word',
+            field=models.CharField(max_length=100, verbose_name='Det farlige ordet'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dangerkeyword',
+            unique_together={('word', 'language')},
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_dangerkeyword_language'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_language', models.CharField(max_length=10)),
+                ('target_language', models.CharField(max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('message', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pending_translation', to='chat.message')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_pendingtranslation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='translationcache',
+            name='hit_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='translationcache',
+            name='last_used_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
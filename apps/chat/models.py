@@ -4,13 +4,23 @@ import logging
 import nh3
 import base64
 
+from django import forms
 from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.db.models.functions import Now
 from django.db import transaction 
+from django.db.models.query import (
+    FlatValuesListIterable, ModelIterable, NamedValuesListIterable, ValuesIterable, ValuesListIterable,
+)
 
-from cryptography.fernet import Fernet
+from .encryption import (
+    Ciphertext, EncryptedAttribute, get_fernet,
+    encrypt_text, decrypt_token, decrypt_instances, is_lazy_enabled,
+)
+
+from apps.accounts.models import User as UserModel
+from apps.core.text_normalization import key_scheme, normalize_key
 
 logger = logging.getLogger(__name__)
 User = settings.AUTH_USER_MODEL
@@ -18,40 +28,182 @@ User = settings.AUTH_USER_MODEL
 # ... (كود EncryptedTextField و DangerKeyword و ChatSession يبقى كما هو تماماً) ...
 # (انسخ الكلاسات الأولى من ملفك السابق وضعها هنا)
 
-class EncryptedTextField(models.TextField):
+class EncryptedFieldMixin:
+    # الواصف يؤجل فك التشفير حتى أول قراءة للحقل (انظر encryption.py)
+    descriptor_class = EncryptedAttribute
+
     def __init__(self, *args, **kwargs):
-        key = settings.DB_ENCRYPTION_KEY
-        self.fernet = Fernet(key)
+        self.fernet = get_fernet()
         super().__init__(*args, **kwargs)
 
+    def pre_save(self, model_instance, add):
+        # نأخذ القيمة الخام: الحقل الذي لم يُقرأ يبقى رمزاً ويُحفظ كما هو دون إعادة تشفير
+        return model_instance.__dict__.get(self.attname)
+
     def get_prep_value(self, value):
         if not value: return value
+        if isinstance(value, Ciphertext): return self.token_to_raw(value.token)
         clean_value = nh3.clean(value, tags=set())
-        encrypted_data = self.fernet.encrypt(clean_value.encode('utf-8'))
-        return encrypted_data.decode('utf-8')
+        return self.token_to_raw(encrypt_text(clean_value))
     
     def from_db_value(self, value, expression, connection):
-        if not value: return value
-        try:
-            decrypted_data = self.fernet.decrypt(value.encode('utf-8'))
-            return decrypted_data.decode('utf-8')
-        except Exception as e:
-            logger.error(f"Decryption failed: {e}")
-            return f"[Encrypted Data - Error]"
+        if value is None: return None
+        if not value: return ''
+        token = self.raw_to_token(value)
+        if is_lazy_enabled():
+            return Ciphertext(token)
+        return decrypt_token(token)
         
     def to_python(self, value):
         return value
 
+    # تحويل رمز Fernet (نص base64) إلى شكل التخزين في العمود والعكس
+    def token_to_raw(self, token):
+        return token
+
+    def raw_to_token(self, raw):
+        return raw
+
+
+class EncryptedTextField(EncryptedFieldMixin, models.TextField):
+    """رمز Fernet مخزن كنص (urlsafe base64)."""
+
+
+class EncryptedBinaryField(EncryptedFieldMixin, models.BinaryField):
+    """
+    رمز Fernet مخزن كبايتات خام (bytea) بدلاً من base64:
+    حجم أصغر بحوالي الثلث في الجدول والـ TOAST.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # BinaryField غير قابل للتعديل افتراضياً، لكن النص هنا يُحرر من لوحة التحكم
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def token_to_raw(self, token):
+        return base64.urlsafe_b64decode(token)
+
+    def raw_to_token(self, raw):
+        if isinstance(raw, str):
+            # قيمة نصية قديمة (قبل التحويل إلى bytea)
+            return raw
+        return base64.urlsafe_b64encode(bytes(raw)).decode('ascii')
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'widget': forms.Textarea, **kwargs})
+
+
+class DecryptingModelIterable(ModelIterable):
+    """يجمع الكائنات في دفعات ويفك حقولها المشفرة دفعة واحدة قبل إرجاعها."""
+
+    def __iter__(self):
+        queryset = self.queryset
+        attnames = queryset._decrypt_fields
+        chunk_size = queryset._decrypt_chunk_size
+        batch = []
+        for obj in super().__iter__():
+            batch.append(obj)
+            if len(batch) >= chunk_size:
+                decrypt_instances(batch, attnames)
+                yield from batch
+                batch = []
+        if batch:
+            decrypt_instances(batch, attnames)
+            yield from batch
+
+
+def _plain(value):
+    return value.decrypt() if isinstance(value, Ciphertext) else value
+
+
+def _decrypting(iterable_class):
+    """
+    values() / values_list() لا تبني كائنات، فلا يوجد واصف يفك Ciphertext عند القراءة:
+    نفك القيم هنا لتخرج نصوصاً عادية (قابلة للمقارنة و JSON).
+    """
+    class DecryptingIterable(iterable_class):
+        def __iter__(self):
+            for row in super().__iter__():
+                if isinstance(row, dict):
+                    yield {key: _plain(value) for key, value in row.items()}
+                elif isinstance(row, tuple):
+                    values = [_plain(value) for value in row]
+                    yield row._make(values) if hasattr(row, '_make') else tuple(values)
+                else:
+                    yield _plain(row)
+
+    DecryptingIterable.__name__ = f"Decrypting{iterable_class.__name__}"
+    return DecryptingIterable
+
+
+DECRYPTING_VALUES_ITERABLES = {
+    iterable_class: _decrypting(iterable_class)
+    for iterable_class in (ValuesIterable, ValuesListIterable, FlatValuesListIterable, NamedValuesListIterable)
+}
+
+
+class EncryptedQuerySet(models.QuerySet):
+    _decrypt_fields = None
+    _decrypt_chunk_size = None
+
+    def decrypted(self, fields=None, chunk_size=None):
+        """
+        فك تشفير الحقول المحددة (أو كل الحقول المشفرة) بشكل جماعي ومتوازٍ
+        بدلاً من فك كل صف على حدة داخل حلقة.
+        مثال: Message.objects.filter(...).decrypted(fields=['text_translated'])
+        """
+        if fields is None:
+            fields = [
+                f.attname for f in self.model._meta.concrete_fields
+                if isinstance(f, EncryptedFieldMixin)
+            ]
+        clone = self._chain()
+        clone._decrypt_fields = list(fields)
+        clone._decrypt_chunk_size = chunk_size or getattr(settings, 'DB_DECRYPT_CHUNK_SIZE', 500)
+        if clone._iterable_class is ModelIterable:
+            clone._iterable_class = DecryptingModelIterable
+        return clone
+
+    def values(self, *fields, **expressions):
+        return self._decrypting_values(super().values(*fields, **expressions))
+
+    def values_list(self, *fields, flat=False, named=False):
+        return self._decrypting_values(super().values_list(*fields, flat=flat, named=named))
+
+    @staticmethod
+    def _decrypting_values(clone):
+        clone._iterable_class = DECRYPTING_VALUES_ITERABLES.get(clone._iterable_class, clone._iterable_class)
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._decrypt_fields = self._decrypt_fields
+        clone._decrypt_chunk_size = self._decrypt_chunk_size
+        return clone
+
+
 class DangerKeyword(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    word = models.CharField(max_length=100, unique=True, verbose_name="Det farlige ordet (norsk)")
+    word = models.CharField(max_length=100, verbose_name="Det farlige ordet")
+    # لغة الكلمة: النرويجية تُفحص على الترجمة، وباقي اللغات على النص الأصلي فور وصوله
+    language = models.CharField(max_length=10, choices=UserModel.LANGUAGE_CHOICES, default='no', db_index=True)
     is_active = models.BooleanField(default=True)
+    class Meta: unique_together = ('word', 'language')
     def save(self, *args, **kwargs):
         self.word = self.word.lower().strip()
         super().save(*args, **kwargs)
     def __str__(self):
         return self.word
 
+class ChatSessionQuerySet(models.QuerySet):
+    def broadcast_recipients(self):
+        """الجلسات التي يصلها إعلان الممرض (نفس العدد في صفحة التأكيد وفي الإرسال)."""
+        return self.filter(is_active=True, refugee__is_active=True)
+
+
 class ChatSession(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     refugee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_sessions', limit_choices_to={'role': 'REFUGEE'})
@@ -61,6 +213,7 @@ class ChatSession(models.Model):
     last_activity = models.DateTimeField(auto_now=True)
     PRIORITY_CHOICES = [(1, 'Nurse (Normal)'), (2, 'Doctor (Urgent)')]
     priority = models.IntegerField(choices=PRIORITY_CHOICES, default=1, verbose_name="Priority Level")
+    objects = ChatSessionQuerySet.as_manager()
     class Meta: ordering = ['-priority', '-last_activity']
     def __str__(self): return f"Chat: {self.refugee.full_name} ({self.get_priority_display()})"
 
@@ -70,16 +223,18 @@ class Message(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
     
-    text_original = EncryptedTextField(verbose_name=_("Original Text"), blank=True, null=True)
+    text_original = EncryptedBinaryField(verbose_name=_("Original Text"), blank=True, null=True)
     language_code = models.CharField(max_length=10, blank=True)
-    text_translated = EncryptedTextField(blank=True, null=True, verbose_name=_("Translated Text"))
+    text_translated = EncryptedBinaryField(blank=True, null=True, verbose_name=_("Translated Text"))
     image = models.ImageField(upload_to='chat_images/%Y/%m/', blank=True, null=True, verbose_name="Medical Image")
-    ai_analysis = EncryptedTextField(blank=True, null=True, verbose_name="AI Medical Analysis")
+    ai_analysis = EncryptedBinaryField(blank=True, null=True, verbose_name="AI Medical Analysis")
 
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
     is_urgent = models.BooleanField(default=False, verbose_name="Urgent / Doctor")
 
+    objects = EncryptedQuerySet.as_manager()
+
     class Meta:
         ordering = ['timestamp']
 
@@ -91,6 +246,37 @@ class Message(models.Model):
         # حفظ نقي (المنطق كله انتقل إلى signals.py)
         super().save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_encrypted_values()
+        return instance
+
+    def remember_encrypted_values(self, fields=None):
+        """
+        الحقول المشفرة كما حُمّلت أو حُفظت (رموز Ciphertext أو نصوص):
+        منها تعرف الإشارات ما تغير فعلاً عند save() الكامل.
+        """
+        loaded = self.__dict__.setdefault('_encrypted_loaded', {})
+        for field in self._meta.concrete_fields:
+            if isinstance(field, EncryptedFieldMixin) and field.attname in self.__dict__:
+                if fields is None or field.attname in fields:
+                    loaded[field.attname] = self.__dict__[field.attname]
+
+    def encrypted_field_changed(self, attname):
+        """هل تغيرت قيمة الحقل منذ التحميل/آخر حفظ؟ (رسالة جديدة: نعم دائماً)"""
+        loaded = self.__dict__.get('_encrypted_loaded')
+        if loaded is None or attname not in loaded:
+            return loaded is None or attname in self.__dict__
+        before, current = loaded[attname], self.__dict__.get(attname)
+        if before is current:
+            return False
+        if isinstance(before, Ciphertext) and isinstance(current, Ciphertext):
+            return before.token != current.token
+        # قُرئ الحقل بعد التحميل: نفك الرمز القديم فقط للمقارنة
+        plain = lambda value: value.decrypt() if isinstance(value, Ciphertext) else value
+        return plain(before) != plain(current)
+
     def __str__(self):
         return f"{self.sender.username}: Message"
 
@@ -98,18 +284,57 @@ class Message(models.Model):
 
 
 
+class MessageSearchToken(models.Model):
+    """
+    فهرس أعمى (Blind Index): بصمات HMAC لكلمات النص المترجم وتحليل الذكاء الاصطناعي.
+    يسمح بالبحث في SQL دون فك تشفير الرسائل (انظر SearchIndexService).
+    """
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=32, db_index=True)
+
+    class Meta:
+        unique_together = ('message', 'token')
+
+    def __str__(self):
+        return f"{self.message_id}: {self.token[:8]}..."
+
+
+
+
+class PendingTranslation(models.Model):
+    """
+    طابور دائم للرسائل التي فشلت ترجمتها أثناء انقطاع Azure.
+    تعيد المهمة replay_pending_translations ترجمتها عند إغلاق الدائرة.
+    """
+    message = models.OneToOneField(Message, on_delete=models.CASCADE, related_name='pending_translation')
+    source_language = models.CharField(max_length=10)
+    target_language = models.CharField(max_length=10)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.message_id}: {self.source_language}->{self.target_language}"
+
 
 class TranslationCache(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     source_hash = models.CharField(max_length=64, db_index=True)
     source_language = models.CharField(max_length=10)
     target_language = models.CharField(max_length=10)
-    source_text = EncryptedTextField()
-    translated_text = EncryptedTextField()
+    source_text = EncryptedBinaryField()
+    translated_text = EncryptedBinaryField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # حساب الاستخدام (يُحدَّث دفعة واحدة من Redis، انظر apps.core.cache_usage) لسياسة الإخلاء
+    hit_count = models.PositiveIntegerField(default=0)
+    last_used_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    objects = EncryptedQuerySet.as_manager()
     class Meta: unique_together = ('source_hash', 'source_language', 'target_language')
     @staticmethod
-    def make_hash(text): return hashlib.sha256(text.strip().lower().encode('utf-8')).hexdigest()
+    def make_hash(text): return hashlib.sha256(f"{key_scheme()}\n{normalize_key(text)}".encode('utf-8')).hexdigest()
     def __str__(self): return f"{self.source_language}->{self.target_language}"
 
 
@@ -150,9 +375,11 @@ class ImageAnalysisCache(models.Model):
     cached_image = models.ImageField(upload_to='cache_snapshots/%Y/', blank=True, null=True, verbose_name="Snapshot")
     
     # التحليل (مشفر)
-    analysis_result = EncryptedTextField()
+    analysis_result = EncryptedBinaryField()
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = EncryptedQuerySet.as_manager()
+
     def __str__(self):
         return f"Image Hash: {self.image_hash[:10]}..."
\ No newline at end of file
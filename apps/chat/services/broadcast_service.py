@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.db.models.functions import Now
+from apps.chat.models import ChatSession, Message, PendingTranslation
+from apps.core.services import AzureTranslator, unavailable_text
+from .notification_service import NotificationService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastService:
+    @staticmethod
+    def broadcast(sender, text):
+        """
+        إعلان من الممرض لكل الجلسات النشطة (إغلاق العيادة، مواعيد التطعيم...):
+        ترجمة واحدة لكل لغات اللاجئين (طلب Azure واحد)، ثم bulk_create
+        لرسائل الجلسات، ثم إرسالها عبر الـ channel layer دفعة واحدة.
+        """
+        text = (text or "").strip()
+        if not text:
+            return []
+
+        sessions = list(
+            ChatSession.objects.broadcast_recipients()
+            .values_list('id', 'refugee__native_language')
+        )
+        if not sessions:
+            return []
+
+        source_lang = sender.native_language or 'no'
+        languages = {language for _, language in sessions}
+        translations = AzureTranslator().translate_to_many(text, source_lang, languages)
+
+        # الرسائل مترجمة مسبقاً، و bulk_create لا يطلق الإشارات:
+        # لا Celery لكل رسالة ولا خفض أولوية الجلسات العاجلة
+        messages = [
+            Message(
+                session_id=session_id,
+                sender=sender,
+                text_original=text,
+                text_translated=translations[language],
+                language_code=source_lang,
+            )
+            for session_id, language in sessions
+        ]
+        # لغات لم تُترجم (انقطاع Azure): النص البديل مؤقت، وتعيد replay_pending_translations ترجمتها
+        failed = {language for language in languages if translations[language] == unavailable_text(text)}
+        with transaction.atomic():
+            Message.objects.bulk_create(messages, batch_size=500)
+            ChatSession.objects.filter(id__in=[session_id for session_id, _ in sessions]).update(last_activity=Now())
+            PendingTranslation.objects.bulk_create(
+                [
+                    PendingTranslation(
+                        message=message, source_language=source_lang, target_language=language,
+                        last_error="Broadcast translation unavailable"
+                    )
+                    for message, (_, language) in zip(messages, sessions) if language in failed
+                ],
+                batch_size=500, ignore_conflicts=True
+            )
+        if failed:
+            logger.warning(f"⏸️ Broadcast translation deferred for {', '.join(sorted(failed))} until Azure recovers.")
+
+        NotificationService.broadcast_many(messages)
+        logger.info(f"📢 Broadcast sent to {len(messages)} sessions in {len(languages)} languages.")
+        return messages
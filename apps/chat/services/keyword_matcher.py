@@ -0,0 +1,69 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    مطابقة متعددة الأنماط (Aho-Corasick): كل الكلمات في مرور واحد على النص،
+    فتكلفة الفحص لا تعتمد على عدد الكلمات الخطرة.
+    المطابقة كـ substring تماماً مثل `word in text` السابقة.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = sorted({p for p in patterns if p})
+        # كل حالة: (انتقالات، رابط الفشل، الأنماط المنتهية عندها)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for pattern in self.patterns:
+            self._add(pattern)
+        self._build_failure_links()
+
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = nxt
+        self._output[state] = self._output[state] + (pattern,)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def _iter_matches(self, text):
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                yield output[state]
+
+    def search(self, text):
+        """هل يحتوي النص على أي نمط؟ (يتوقف عند أول تطابق)"""
+        for _ in self._iter_matches(text):
+            return True
+        return False
+
+    def findall(self, text):
+        found = set()
+        for patterns in self._iter_matches(text):
+            found.update(patterns)
+        return found
+
+    def __len__(self):
+        return len(self.patterns)
@@ -1,17 +1,11 @@
+import asyncio
+
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
 class NotificationService:
     @staticmethod
-    def broadcast_message_update(message):
-        """
-        إرسال تحديث للواجهة الأمامية (ممرض ولاجئ)
-        """
-        if not message.session_id:
-            return
-
-        channel_layer = get_channel_layer()
-        
+    def _payload(message):
         payload = {
             'type': 'chat_message',
             'id': str(message.id),
@@ -25,8 +19,41 @@ class NotificationService:
 
         if message.image:
             payload['image_url'] = message.image.url
+        return payload
+
+    @staticmethod
+    def broadcast_message_update(message):
+        """
+        إرسال تحديث للواجهة الأمامية (ممرض ولاجئ)
+        """
+        if not message.session_id:
+            return
+
+        channel_layer = get_channel_layer()
+        
+        payload = NotificationService._payload(message)
 
         async_to_sync(channel_layer.group_send)(
             f'chat_{message.session_id}',
             payload
-        )
\ No newline at end of file
+        )
+
+    @staticmethod
+    def broadcast_many(messages):
+        """
+        إرسال عدة رسائل (كل واحدة لجلستها) في دفعة واحدة:
+        حلقة أحداث واحدة وكل الإرسالات بالتوازي بدلاً من async_to_sync لكل رسالة.
+        """
+        messages = [m for m in messages if m.session_id]
+        if not messages:
+            return
+
+        channel_layer = get_channel_layer()
+
+        async def send_all():
+            await asyncio.gather(*(
+                channel_layer.group_send(f'chat_{m.session_id}', NotificationService._payload(m))
+                for m in messages
+            ))
+
+        async_to_sync(send_all)()
@@ -0,0 +1,173 @@
+from django.conf import settings
+from django.db.models import Sum
+from apps.accounts.models import User
+from apps.chat.models import TranslationCache
+from apps.core.services import AzureTranslator, TranslationUnavailable
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# 1. مجموعة العبارات المختارة (Curated Phrase Set)
+# ==============================================================================
+NURSE_LANGUAGE = 'no'
+
+# نصوص الواجهة التي تُترجم عند فتح الشات (views.chat_room)
+PRIVACY_WARNING = "🔒 For your privacy, do not write your name or health ID here. We identify you automatically."
+UI_STRINGS = [PRIVACY_WARNING]
+
+# ردود الممرض الجاهزة (بالنرويجية -> لغة كل لاجئ)
+NURSE_REPLIES = [
+    "Hei! Hvordan kan jeg hjelpe deg?",
+    "Takk for meldingen. En sykepleier svarer deg snart.",
+    "Kan du beskrive symptomene dine?",
+    "Hvor lenge har du hatt disse plagene?",
+    "Har du feber?",
+    "Tar du noen medisiner?",
+    "Kan du sende et bilde?",
+    "Kom til klinikken i dag.",
+    "Klinikken er åpen fra 08:00 til 16:00.",
+    "Ring 113 hvis det er akutt.",
+    "Drikk mye vann og hvil.",
+    "God bedring!",
+]
+
+# رسائل اللاجئين الأكثر شيوعاً (مكتوبة بالإنجليزية، تُترجم للغة كل لاجئ ثم للنرويجية)
+REFUGEE_PHRASES = [
+    "Hello",
+    "Good morning",
+    "Thank you",
+    "Yes",
+    "No",
+    "I need help",
+    "I need a doctor",
+    "I have a headache",
+    "I have a fever",
+    "My child is sick",
+    "I have pain",
+    "When is the clinic open?",
+    "I need my medicine",
+]
+
+
+def refugee_languages():
+    """كل لغات User.LANGUAGE_CHOICES ما عدا لغة الممرضين (بدون تكرار)."""
+    return [code for code in dict.fromkeys(code for code, _ in User.LANGUAGE_CHOICES) if code != NURSE_LANGUAGE]
+
+
+class PrewarmService:
+    """
+    تسخين كاش الترجمة: أول لاجئ بكل لغة لا يدفع زمن Azure الكامل
+    لرسالة الخصوصية والتحيات والردود الجاهزة.
+    """
+
+    @staticmethod
+    def mined_phrases(limit):
+        """
+        العبارات الأكثر إصابة في TranslationCache (مجموع hit_count لكل اللغات).
+        يعيد [(النص، لغة المصدر)].
+        """
+        if not limit:
+            return []
+        top = list(
+            TranslationCache.objects.values('source_hash', 'source_language')
+            .annotate(hits=Sum('hit_count'))
+            .filter(hits__gt=0)
+            .order_by('-hits')[:limit]
+        )
+        phrases = {}
+        rows = TranslationCache.objects.filter(
+            source_hash__in=[row['source_hash'] for row in top]
+        ).only('source_hash', 'source_language', 'source_text')
+        for row in rows:
+            phrases.setdefault((row.source_hash, row.source_language), row.source_text)
+        return [
+            (phrases[key], key[1])
+            for key in ((row['source_hash'], row['source_language']) for row in top)
+            if key in phrases
+        ]
+
+    @staticmethod
+    def plan(mined_limit=0):
+        """الأزواج المطلوبة {(المصدر، الهدف): [النصوص]} للمرحلة الأولى."""
+        languages = refugee_languages()
+        groups = {}
+
+        def add(texts, source_lang, target_langs):
+            for target_lang in target_langs:
+                if target_lang != source_lang:
+                    groups.setdefault((source_lang, target_lang), []).extend(texts)
+
+        add(UI_STRINGS + REFUGEE_PHRASES, 'en', languages + [NURSE_LANGUAGE])
+        add(NURSE_REPLIES, NURSE_LANGUAGE, languages)
+        for text, source_lang in PrewarmService.mined_phrases(mined_limit):
+            # رسائل الممرض تذهب لكل اللغات، ورسائل اللاجئ للنرويجية فقط
+            add([text], source_lang, languages if source_lang == NURSE_LANGUAGE else [NURSE_LANGUAGE])
+
+        return {pair: list(dict.fromkeys(texts)) for pair, texts in groups.items()}
+
+    @staticmethod
+    def hit_rate(groups):
+        """نسبة الأزواج (نص، مصدر، هدف) الموجودة في الكاش: ما يجده أول مستخدم جاهزاً."""
+        wanted = {
+            (TranslationCache.make_hash(text), source_lang, target_lang)
+            for (source_lang, target_lang), texts in groups.items()
+            for text in texts
+        }
+        if not wanted:
+            return 1.0
+        hashes = list({key[0] for key in wanted})
+        found = set()
+        for start in range(0, len(hashes), 500):
+            found.update(
+                TranslationCache.objects.filter(source_hash__in=hashes[start:start + 500])
+                .values_list('source_hash', 'source_language', 'target_language')
+            )
+        return len(wanted & found) / len(wanted)
+
+    @staticmethod
+    def warm(mined_limit=None):
+        """
+        يترجم المجموعة كاملة (طلب Azure لكل دفعة لكل زوج لغات، وحفظ bulk)،
+        ثم يترجم عبارات اللاجئين المترجمة عائدة للنرويجية (الاتجاه الثاني).
+        يعيد تقريراً بنسبة الإصابة قبل وبعد.
+        """
+        if mined_limit is None:
+            mined_limit = getattr(settings, 'TRANSLATION_PREWARM_MINED_LIMIT', 200)
+        translator = AzureTranslator()
+        groups = PrewarmService.plan(mined_limit)
+        report = {
+            'pairs': sum(len(texts) for texts in groups.values()),
+            'before': PrewarmService.hit_rate(groups),
+            'failed': 0,
+        }
+
+        # المرحلة الثانية: "I need help" بالعربية -> النرويجية، كما يكتبها اللاجئ
+        reverse = {}
+        for (source_lang, target_lang), texts in groups.items():
+            try:
+                translations = translator.translate_many(texts, source_lang, target_lang, raise_on_failure=True)
+            except TranslationUnavailable as e:
+                logger.warning(f"⚠️ Prewarm {source_lang}->{target_lang} failed: {e}")
+                report['failed'] += len(texts)
+                continue
+            if source_lang == 'en' and target_lang != NURSE_LANGUAGE:
+                phrases = [t for text, t in zip(texts, translations) if text in REFUGEE_PHRASES]
+                reverse[(target_lang, NURSE_LANGUAGE)] = phrases
+
+        for (source_lang, target_lang), texts in reverse.items():
+            try:
+                translator.translate_many(texts, source_lang, target_lang, raise_on_failure=True)
+            except TranslationUnavailable as e:
+                logger.warning(f"⚠️ Prewarm {source_lang}->{target_lang} failed: {e}")
+                report['failed'] += len(texts)
+
+        report['reverse_pairs'] = sum(len(texts) for texts in reverse.values())
+        # نسبة الإصابة تُقاس من الجدول: نكتب ما ينتظر في Write-behind أولاً
+        translator.cache.flush_writes()
+        report['after'] = PrewarmService.hit_rate(groups)
+        logger.info(
+            f"🔥 Translation cache prewarmed: {report['pairs']} pairs, "
+            f"hit rate {report['before']:.0%} -> {report['after']:.0%}."
+        )
+        return report
@@ -0,0 +1,67 @@
+from django.db.models import Count, Exists, OuterRef, Q
+from apps.chat.models import Message, MessageSearchToken
+from apps.chat.encryption import (
+    BLIND_INDEX_GRAM, BLIND_INDEX_VERSION_TERM,
+    blind_index_grams, blind_index_terms, blind_index_token, normalize_words,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# الحقول التي تدخل الفهرس (النص النرويجي + تحليل الصور)
+INDEXED_FIELDS = ('text_translated', 'ai_analysis')
+
+
+class SearchIndexService:
+    @staticmethod
+    def index_message(message):
+        """
+        إعادة بناء بصمات البحث لرسالة واحدة.
+        """
+        terms = {BLIND_INDEX_VERSION_TERM}
+        for field in INDEXED_FIELDS:
+            terms |= blind_index_terms(getattr(message, field))
+
+        MessageSearchToken.objects.filter(message_id=message.id).delete()
+        MessageSearchToken.objects.bulk_create(
+            [MessageSearchToken(message_id=message.id, token=blind_index_token(t)) for t in terms],
+            ignore_conflicts=True
+        )
+
+    @staticmethod
+    def phrase_tokens(phrase):
+        """
+        البصمات التي تحملها حتماً كل رسالة تحتوي العبارة كنص جزئي:
+        مقاطع كل كلمة فيها (الكلمة الأقصر من مقطع لا تضيف شرطاً).
+        النتيجة مرشحات فقط؛ يجب التأكد من التطابق بعد فك التشفير.
+        """
+        terms = set()
+        for word in normalize_words(phrase):
+            if len(word) >= BLIND_INDEX_GRAM:
+                terms |= blind_index_grams(word)
+        return {blind_index_token(t) for t in terms}
+
+    @staticmethod
+    def filter_messages(queryset, phrases):
+        """
+        تضييق QuerySet للرسائل التي قد تحتوي على أي من العبارات (بدون فك تشفير).
+        مجموعة شاملة لبحث `phrase in text`: الرسائل غير المفهرسة بعد تبقى ضمن النتائج.
+        """
+        not_indexed = ~Exists(MessageSearchToken.objects.filter(
+            message_id=OuterRef('pk'), token=blind_index_token(BLIND_INDEX_VERSION_TERM)
+        ))
+        condition = Q(not_indexed)
+        for phrase in phrases:
+            tokens = SearchIndexService.phrase_tokens(phrase)
+            if not tokens:
+                # عبارة قصيرة جداً لا يمكن تضييقها
+                return queryset
+            matching_ids = (
+                MessageSearchToken.objects.filter(token__in=tokens)
+                .values('message_id')
+                .annotate(found=Count('token', distinct=True))
+                .filter(found=len(tokens))
+                .values('message_id')
+            )
+            condition |= Q(id__in=matching_ids)
+        return queryset.filter(condition)
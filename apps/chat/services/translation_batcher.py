@@ -0,0 +1,75 @@
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# قائمة Redis لكل زوج لغات تحتوي معرفات الرسائل التي تنتظر الترجمة
+QUEUE_KEY = 'translation_batch:{src}:{dest}'
+# علامة "يوجد flush مجدول" حتى لا نجدول مهمة لكل رسالة
+SCHEDULED_SUFFIX = ':scheduled'
+
+
+def get_redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+class TranslationBatcher:
+    """
+    تجميع ترجمات process_message_ai (Micro-batching):
+    الرسائل لنفس زوج اللغات خلال AZURE_TRANSLATOR_BATCH_WINDOW_MS
+    (أو حتى AZURE_TRANSLATOR_BATCH_MAX_ITEMS رسالة) تُترجم في طلب Azure واحد
+    عبر المهمة flush_translation_batch.
+    """
+
+    @staticmethod
+    def is_enabled():
+        return getattr(settings, 'AZURE_TRANSLATOR_BATCH_WINDOW_MS', 0) > 0
+
+    @staticmethod
+    def enqueue(message_id, src, dest):
+        """
+        يضيف الرسالة للدفعة ويجدول التفريغ. يعيد False إذا كان التجميع معطلاً
+        أو Redis غير متاح، وعندها يترجم المستدعي الرسالة مباشرة (Fail-open).
+        """
+        if not TranslationBatcher.is_enabled():
+            return False
+
+        window_ms = settings.AZURE_TRANSLATOR_BATCH_WINDOW_MS
+        max_items = getattr(settings, 'AZURE_TRANSLATOR_BATCH_MAX_ITEMS', 25)
+        key = QUEUE_KEY.format(src=src, dest=dest)
+        try:
+            conn = get_redis()
+            size = conn.rpush(key, str(message_id))
+            # العلامة تنتهي تلقائياً إذا مات الـ Worker قبل التفريغ
+            first = conn.set(key + SCHEDULED_SUFFIX, 1, nx=True, px=window_ms * 10 + 5000)
+        except Exception as e:
+            logger.warning(f"⚠️ Translation batching unavailable, translating directly: {e}")
+            return False
+
+        from apps.chat.tasks import flush_translation_batch
+        if size >= max_items:
+            flush_translation_batch.delay(src, dest)
+        elif first:
+            flush_translation_batch.apply_async(args=[src, dest], countdown=window_ms / 1000)
+        return True
+
+    @staticmethod
+    def drain(src, dest):
+        """يسحب دفعة واحدة (حتى max_items) بشكل ذري، ويعيد الجدولة إذا بقيت رسائل."""
+        max_items = getattr(settings, 'AZURE_TRANSLATOR_BATCH_MAX_ITEMS', 25)
+        key = QUEUE_KEY.format(src=src, dest=dest)
+        conn = get_redis()
+
+        # نحذف العلامة أولاً: أي رسالة تصل بعد هذه اللحظة تجدول تفريغها بنفسها
+        conn.delete(key + SCHEDULED_SUFFIX)
+        pipe = conn.pipeline(transaction=True)
+        pipe.lrange(key, 0, max_items - 1)
+        pipe.ltrim(key, max_items, -1)
+        pipe.llen(key)
+        ids, _, remaining = pipe.execute()
+
+        if remaining:
+            from apps.chat.tasks import flush_translation_batch
+            flush_translation_batch.delay(src, dest)
+        return [i.decode() if isinstance(i, bytes) else i for i in ids]
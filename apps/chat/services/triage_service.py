@@ -1,8 +1,78 @@
+from django.conf import settings
+from django.core.cache import cache
 from apps.chat.models import DangerKeyword, ChatSession
+from .keyword_matcher import AhoCorasick
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# كلمات إنجليزية للطوارئ (احتياط لتحليل AI)
+EMERGENCY_EN = ["blood", "bleeding", "emergency", "urgent", "pain", "unconscious"]
+
+# رقم إصدار الكلمات في Redis: يزيد مع كل حفظ/حذف، وكل Worker يعيد بناء المطابق عند تغيّره
+KEYWORDS_VERSION_KEY = 'danger_keywords_version'
+
+# لغة النص المترجم (وتحليل AI) الذي يفحصه المرور الثاني
+TRANSLATION_LANGUAGE = 'no'
+
+_matchers = None
+_matcher_version = None
+_version_checked_at = 0.0
+
+
+def bump_keywords_version():
+    """يُستدعى من الإشارات عند تعديل DangerKeyword."""
+    global _matchers
+    try:
+        cache.add(KEYWORDS_VERSION_KEY, 0, timeout=None)
+        cache.incr(KEYWORDS_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Could not bump keywords version: {e}")
+    # العملية الحالية تعيد البناء فوراً دون انتظار فترة الفحص
+    _matchers = None
+
+
+def _build_matchers():
+    """مطابق Aho-Corasick لكل لغة من استعلام واحد."""
+    words_by_language = {}
+    for word, language in DangerKeyword.objects.filter(is_active=True).values_list('word', 'language'):
+        words_by_language.setdefault(language, []).append(word)
+
+    # كلمات الطوارئ الإنجليزية تبقى مع النرويجية (تحليل AI بالإنجليزية) ومع الإنجليزية
+    for language in (TRANSLATION_LANGUAGE, 'en'):
+        words_by_language.setdefault(language, []).extend(EMERGENCY_EN)
+    return {language: AhoCorasick(words) for language, words in words_by_language.items()}
+
+
+def get_danger_matcher(language=TRANSLATION_LANGUAGE):
+    """
+    المطابق المجمّع (Aho-Corasick) للكلمات الخطرة بلغة معينة، محفوظ لكل عملية.
+    لا استعلام لقاعدة البيانات إلا عند تغير الإصدار، وفحص الإصدار نفسه
+    (قراءة واحدة من Redis) لا يتم أكثر من مرة كل DANGER_KEYWORDS_VERSION_CHECK_SECONDS.
+    يعيد None إذا لم تكن هناك كلمات لهذه اللغة.
+    """
+    global _matchers, _matcher_version, _version_checked_at
+    now = time.monotonic()
+    interval = getattr(settings, 'DANGER_KEYWORDS_VERSION_CHECK_SECONDS', 5)
+    if _matchers is None or now - _version_checked_at >= interval:
+        _version_checked_at = now
+        try:
+            version = cache.get(KEYWORDS_VERSION_KEY, 0)
+        except Exception as e:
+            # Redis معطل: الفرز لا يتوقف. نبقي المطابق الحالي (أو نبنيه مرة من قاعدة البيانات)
+            logger.warning(f"⚠️ Could not read danger keywords version: {e}")
+            if _matchers is None:
+                _matchers = _build_matchers()
+            return _matchers.get(language)
+        if _matchers is None or version != _matcher_version:
+            _matchers = _build_matchers()
+            _matcher_version = version
+            total = sum(len(m) for m in _matchers.values())
+            logger.info(f"Danger keyword matchers rebuilt ({total} keywords, {len(_matchers)} languages, version {version}).")
+    return _matchers.get(language)
+
+
 class TriageService:
     @staticmethod
     def check_for_danger(text_content):
@@ -12,20 +82,47 @@ class TriageService:
         if not text_content:
             return False
 
-        # جلب الكلمات من الكاش أو القاعدة
-        danger_words = list(DangerKeyword.objects.filter(is_active=True).values_list('word', flat=True))
-        
-        # إضافة كلمات إنجليزية للطوارئ (احتياط لتحليل AI)
-        emergency_en = ["blood", "bleeding", "emergency", "urgent", "pain", "unconscious"]
-        
-        text_check = text_content.lower()
-        
-        # الفحص
-        if any(word in text_check for word in danger_words) or \
-           any(word in text_check for word in emergency_en):
-            return True
-            
-        return False
+        # الفحص (مرور واحد على النص لكل الكلمات)
+        return get_danger_matcher().search(text_content.lower())
+
+    @staticmethod
+    def check_original_for_danger(text_content, language_code):
+        """
+        المرور الأول: فحص النص الأصلي بلغة المريض قبل انتظار الترجمة.
+        اللغات التي ليس لها قاموس تعتمد على المرور الثاني (بعد الترجمة) فقط.
+        """
+        if not text_content or not language_code:
+            return False
+        matcher = get_danger_matcher(language_code)
+        return bool(matcher) and matcher.search(text_content.lower())
+
+    @staticmethod
+    def triage_original(message):
+        """
+        يُستدعى فور حفظ رسالة اللاجئ: إذا احتوى النص الأصلي على كلمة خطرة
+        تُعلَّم الرسالة عاجلة وتُحوَّل الجلسة للطبيب دون انتظار Azure.
+        """
+        if not TriageService.check_original_for_danger(message.text_original, message.language_code):
+            return False
+
+        TriageService._flag_urgent(message)
+        logger.info(f"🚨 Message {message.id} flagged urgent before translation ({message.language_code}).")
+        return True
+
+    @staticmethod
+    def triage_translation(message):
+        """المرور الثاني على الترجمة، عندما تصل الترجمة مع الرسالة نفسها (ChatConsumer)."""
+        if message.is_urgent or not TriageService.check_for_danger(message.text_translated):
+            return False
+
+        TriageService._flag_urgent(message)
+        return True
+
+    @staticmethod
+    def _flag_urgent(message):
+        type(message).objects.filter(id=message.id).update(is_urgent=True)
+        message.is_urgent = True
+        TriageService.escalate_session(message.session_id)
 
     @staticmethod
     def escalate_session(session_id):
@@ -1,13 +1,15 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.db import transaction
 from django.db.models.functions import Now
-from .models import Message, ChatSession
-from .tasks import process_message_ai
-from .services.triage_service import TriageService
+from .models import Message, ChatSession, DangerKeyword
+from .tasks import process_message_ai, replay_pending_translations
+from apps.core.circuit_breaker import circuit_closed
+from .services.triage_service import TriageService, bump_keywords_version
+from .services.search_service import SearchIndexService, INDEXED_FIELDS
 
 @receiver(post_save, sender=Message)
-def message_post_save(sender, instance, created, **kwargs):
+def message_post_save(sender, instance, created, update_fields=None, **kwargs):
     """
     مراقب الحفظ: يوزع المهام ويحدث الجلسة
     """
@@ -43,6 +45,36 @@ def message_post_save(sender, instance, created, **kwargs):
     )
 
     # 4. التنفيذ
-    if refugee_needs_processing or nurse_needs_translation:
+    # الرسائل القصيرة من WebSocket يترجمها ChatConsumer مباشرة (ويرسلها لـ Celery عند الفشل)
+    translate_inline = getattr(instance, '_translate_inline', False)
+
+    if (refugee_needs_processing or nurse_needs_translation) and not translate_inline:
         # نستخدم on_commit لضمان أن البيانات حُفظت قبل أن يبدأ الـ Worker
-        transaction.on_commit(lambda: process_message_ai.delay(str(instance.id)))
\ No newline at end of file
+        transaction.on_commit(lambda: process_message_ai.delay(str(instance.id)))
+
+    # 5. تحديث الفهرس الأعمى (للبحث دون فك التشفير) عند تغير النص المترجم أو التحليل فعلاً
+    # save() الكامل (لوحة التحكم، تحديث الحالة) لا يعيد بناء البصمات إذا لم يتغير الحقلان
+    if update_fields is None:
+        reindex = any(instance.encrypted_field_changed(field) for field in INDEXED_FIELDS)
+    else:
+        reindex = bool(set(INDEXED_FIELDS) & set(update_fields))
+    if reindex and (instance.text_translated or instance.ai_analysis):
+        SearchIndexService.index_message(instance)
+    instance.remember_encrypted_values(update_fields)
+
+
+@receiver(post_save, sender=DangerKeyword)
+@receiver(post_delete, sender=DangerKeyword)
+def danger_keyword_changed(sender, instance, **kwargs):
+    """إبلاغ كل العمليات بإعادة بناء مطابق الكلمات الخطرة"""
+    # بعد الـ commit فقط: وإلا قد تعيد عملية أخرى البناء من الصفوف القديمة
+    # وتحفظ المطابق القديم تحت الإصدار الجديد
+    transaction.on_commit(bump_keywords_version)
+
+
+@receiver(circuit_closed)
+def translator_recovered(sender, name, **kwargs):
+    """عودة Azure بعد انقطاع: إعادة ترجمة الرسائل المؤجلة فوراً"""
+    if name == 'azure-translator':
+        transaction.on_commit(lambda: replay_pending_translations.delay())
+
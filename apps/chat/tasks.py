@@ -1,17 +1,83 @@
 from celery import shared_task
-from .models import Message
+from .models import Message, PendingTranslation
 # استيراد الخدمات
-from apps.core.services import AzureTranslator
+from django.conf import settings
+from apps.core.rate_limit import RateLimited
+from apps.core.circuit_breaker import get_translator_breaker
+from apps.core.services import AzureTranslator, TranslationUnavailable, unavailable_text
 from apps.core.vision_analysis import MedicalImageAnalyzer
 from .services.image_service import ImageService
 from .services.triage_service import TriageService
 from .services.notification_service import NotificationService
+from .services.search_service import SearchIndexService
+from .services.translation_batcher import TranslationBatcher
 import logging
 
 logger = logging.getLogger(__name__)
 
-@shared_task
-def process_message_ai(message_id):
+def _translation_pair(message):
+    """
+    تحديد اللغة الهدف بذكاء:
+    - إذا المرسل لاجئ -> نترجم للنرويجية (no)
+    - إذا المرسل ممرض -> نترجم للغة اللاجئ (native_language)
+    """
+    if message.sender.role == 'REFUGEE':
+        target_lang = 'no'
+    else:
+        target_lang = message.session.refugee.native_language
+    return message.language_code or 'en', target_lang
+
+
+def _apply_translation(message, translation):
+    """
+    وضع الترجمة على الرسالة، ويعيد True إذا كانت خطرة.
+    فحص الخطر فقط إذا كان المرسل لاجئاً (الممرض لا يحتاج لفحص كلامه).
+    """
+    message.text_translated = translation
+    return message.sender.role == 'REFUGEE' and TriageService.check_for_danger(translation)
+
+
+def _defer_translation(messages, source_lang, target_lang, error):
+    """
+    تسجيل الرسائل في طابور إعادة الترجمة الدائم (أثناء انقطاع Azure)،
+    ويعيد النص البديل الذي يظهر مؤقتاً حتى تنجح إعادة الترجمة.
+    """
+    PendingTranslation.objects.bulk_create(
+        [
+            PendingTranslation(
+                message=m, source_language=source_lang, target_language=target_lang,
+                last_error=str(error)[:255]
+            )
+            for m in messages
+        ],
+        ignore_conflicts=True
+    )
+    logger.warning(f"⏸️ {len(messages)} translations deferred until Azure recovers: {error}")
+    return [unavailable_text(m.text_original) for m in messages]
+
+
+def _retries_exhausted(task):
+    """آخر محاولة لمهمة RateLimited: بعدها لا نعيد الجدولة بل نؤجل الترجمة (PendingTranslation)."""
+    return task.request.retries >= task.max_retries
+
+
+def _save_and_notify(message, fields_to_update, is_urgent_detected):
+    # تطبيق التحديثات (للأولوية)
+    if is_urgent_detected:
+        message.is_urgent = True
+        fields_to_update.append('is_urgent')
+        TriageService.escalate_session(message.session_id)
+
+    # الحفظ والإشعار
+    if fields_to_update:
+        message.save(update_fields=fields_to_update)
+        # إرسال التحديث للجميع (ليظهر النص المترجم في الشات)
+        NotificationService.broadcast_message_update(message)
+        logger.info(f"Message {message.id} processed successfully.")
+
+
+@shared_task(bind=True, max_retries=getattr(settings, 'AZURE_RATE_LIMIT_MAX_RETRIES', 20))
+def process_message_ai(self, message_id):
     try:
         # جلب الرسالة مع البيانات المرتبطة (لتسريع الاستعلام)
         message = Message.objects.select_related('session', 'sender', 'session__refugee').get(id=message_id)
@@ -24,31 +90,26 @@ def process_message_ai(message_id):
 
         # 2. الترجمة (التعديل هنا: السماح بالترجمة للطرفين)
         if message.text_original and not message.text_translated:
-            translator = AzureTranslator()
-            
-            # تحديد اللغة الهدف بذكاء:
-            # - إذا المرسل لاجئ -> نترجم للنرويجية (no)
-            # - إذا المرسل ممرض -> نترجم للغة اللاجئ (native_language)
-            if message.sender.role == 'REFUGEE':
-                target_lang = 'no'
-            else:
-                target_lang = message.session.refugee.native_language
+            source_lang, target_lang = _translation_pair(message)
+
+            # الرسائل النصية تنضم لدفعة زوج اللغات (flush_translation_batch يكمل معالجتها)
+            if not message.image and TranslationBatcher.enqueue(message.id, source_lang, target_lang):
+                return
 
             # الترجمة
-            translation = translator.translate(
-                message.text_original, 
-                message.language_code or 'en', 
-                target_lang
-            )
-            
-            message.text_translated = translation
+            try:
+                translation = AzureTranslator().translate(
+                    message.text_original, source_lang, target_lang, raise_on_failure=True
+                )
+            except TranslationUnavailable as e:
+                translation, = _defer_translation([message], source_lang, target_lang, e)
+            except RateLimited as e:
+                if not _retries_exhausted(self):
+                    raise
+                translation, = _defer_translation([message], source_lang, target_lang, e)
             fields_to_update.append('text_translated')
-
-            # فحص الخطر في الترجمة (فقط إذا كان المرسل لاجئاً)
-            # الممرض لا يحتاج لفحص كلامه بحثاً عن الخطر
-            if message.sender.role == 'REFUGEE':
-                if TriageService.check_for_danger(translation):
-                    is_urgent_detected = True
+            if _apply_translation(message, translation):
+                is_urgent_detected = True
 
         # 3. تحليل الصورة (AI Vision) - للاجئ فقط
         if message.image and not message.ai_analysis:
@@ -61,25 +122,185 @@ def process_message_ai(message_id):
             if TriageService.check_for_danger(analysis):
                 is_urgent_detected = True
 
-        # 4. تطبيق التحديثات (للأولوية)
-        if is_urgent_detected:
-            message.is_urgent = True
-            fields_to_update.append('is_urgent')
-            TriageService.escalate_session(message.session_id)
-
-        # 5. الحفظ والإشعار
-        if fields_to_update:
-            message.save(update_fields=fields_to_update)
-            # إرسال التحديث للجميع (ليظهر النص المترجم في الشات)
-            NotificationService.broadcast_message_update(message)
-            logger.info(f"Message {message_id} processed successfully.")
+        # 4. + 5. الأولوية، الحفظ والإشعار
+        _save_and_notify(message, fields_to_update, is_urgent_detected)
 
+    except RateLimited as e:
+        # حصة Azure مستنفدة: نعيد الجدولة بدلاً من حجز الـ Worker
+        raise self.retry(exc=e, countdown=e.retry_after)
     except Message.DoesNotExist:
         logger.error(f"Message {message_id} not found.")
     except Exception as e:
         logger.error(f"Task processing error: {e}")
 
 
+@shared_task(bind=True, max_retries=getattr(settings, 'AZURE_RATE_LIMIT_MAX_RETRIES', 20))
+def flush_translation_batch(self, source_lang, target_lang, message_ids=None):
+    """
+    تفريغ دفعة الترجمة لزوج لغات: طلب Azure واحد لكل الرسائل المنتظرة،
+    ثم توزيع النتائج على الرسائل (فحص الخطر + الحفظ + الإشعار لكل رسالة).
+    """
+    # عند إعادة الجدولة (RateLimited) تأتي المعرفات مع المهمة نفسها
+    if message_ids is None:
+        try:
+            message_ids = TranslationBatcher.drain(source_lang, target_lang)
+        except Exception as e:
+            logger.error(f"Translation batch drain failed ({source_lang}->{target_lang}): {e}")
+            return
+    if not message_ids:
+        return
+
+    messages = [
+        m for m in Message.objects.select_related('session', 'sender', 'session__refugee')
+        .filter(id__in=message_ids).decrypted(fields=['text_original', 'text_translated'])
+        if m.text_original and not m.text_translated
+    ]
+    try:
+        translations = AzureTranslator().translate_many(
+            [m.text_original for m in messages], source_lang, target_lang, raise_on_failure=True
+        )
+    except TranslationUnavailable as e:
+        translations = _defer_translation(messages, source_lang, target_lang, e)
+    except RateLimited as e:
+        if not _retries_exhausted(self):
+            raise self.retry(exc=e, countdown=e.retry_after, kwargs={'message_ids': [str(m.id) for m in messages]})
+        translations = _defer_translation(messages, source_lang, target_lang, e)
+    logger.info(f"📦 Translated batch of {len(messages)} messages ({source_lang}->{target_lang}).")
+
+    for message, translation in zip(messages, translations):
+        try:
+            is_urgent_detected = _apply_translation(message, translation)
+            _save_and_notify(message, ['text_translated'], is_urgent_detected)
+        except Exception as e:
+            logger.error(f"Task processing error: {e}")
+
+
+
+
+@shared_task
+def replay_pending_translations():
+    """
+    إعادة ترجمة الرسائل المؤجلة بعد عودة Azure (عند إغلاق الدائرة + كل دقيقة كاحتياط):
+    طلب Azure لكل زوج لغات، ثم تحديث الرسائل وإرسالها للواجهة دفعة واحدة.
+    """
+    from itertools import groupby
+    from django.core.cache import cache
+    from django.db.models import F
+
+    if get_translator_breaker().is_open():
+        return 0
+    # مهمة واحدة في كل مرة (الإشارة و Beat قد يطلقانها معاً)
+    lock_key = 'replay_pending_translations_lock'
+    if not cache.add(lock_key, 1, timeout=300):
+        return 0
+
+    batch_size = getattr(settings, 'PENDING_TRANSLATION_REPLAY_BATCH', 200)
+    replayed = []
+    try:
+        pending = list(
+            PendingTranslation.objects.select_related(
+                'message', 'message__session', 'message__sender', 'message__session__refugee'
+            ).order_by('source_language', 'target_language', 'created_at')[:batch_size]
+        )
+        translator = AzureTranslator()
+        for (source_lang, target_lang), group in groupby(pending, key=lambda p: (p.source_language, p.target_language)):
+            group = list(group)
+            try:
+                translations = translator.translate_many(
+                    [p.message.text_original for p in group], source_lang, target_lang, raise_on_failure=True
+                )
+            except (TranslationUnavailable, RateLimited) as e:
+                # ما زالت الخدمة معطلة أو الحصة مستنفدة: نحاول في الدورة القادمة
+                PendingTranslation.objects.filter(id__in=[p.id for p in group]).update(
+                    attempts=F('attempts') + 1, last_error=str(e)[:255]
+                )
+                break
+
+            for item, translation in zip(group, translations):
+                message = item.message
+                fields_to_update = ['text_translated']
+                if _apply_translation(message, translation):
+                    message.is_urgent = True
+                    fields_to_update.append('is_urgent')
+                    TriageService.escalate_session(message.session_id)
+                message.save(update_fields=fields_to_update)
+                replayed.append(message)
+            PendingTranslation.objects.filter(id__in=[p.id for p in group]).delete()
+    finally:
+        cache.delete(lock_key)
+
+    if replayed:
+        NotificationService.broadcast_many(replayed)
+        logger.info(f"🔁 Replayed {len(replayed)} deferred translations.")
+    if len(replayed) == batch_size:
+        replay_pending_translations.delay()
+    return len(replayed)
+
+
+@shared_task(bind=True, max_retries=getattr(settings, 'AZURE_RATE_LIMIT_MAX_RETRIES', 20))
+def broadcast_announcement(self, sender_id, text):
+    """إعلان الممرض لكل المخيم (يُرسل من صفحة Broadcast في لوحة الإدارة)."""
+    from django.contrib.auth import get_user_model
+    from .services.broadcast_service import BroadcastService
+
+    try:
+        sender = get_user_model().objects.get(id=sender_id, is_staff=True)
+    except get_user_model().DoesNotExist:
+        logger.error(f"Broadcast sender {sender_id} not found.")
+        return 0
+    try:
+        return len(BroadcastService.broadcast(sender, text))
+    except RateLimited as e:
+        raise self.retry(exc=e, countdown=e.retry_after)
+
+
+@shared_task
+def flush_translation_cache_writes():
+    """Write-behind: كتابة ترجمات الكاش الجديدة المنتظرة في Redis إلى الجدول دفعة واحدة."""
+    from apps.core.services import CacheRepository
+    return CacheRepository().flush_writes()
+
+
+@shared_task
+def flush_translation_cache_hits():
+    """نقل عدادات الإصابة المتراكمة في Redis إلى TranslationCache (bulk_update)."""
+    from django.core.cache import cache
+    from apps.core.cache_usage import flush_hits
+    from .models import TranslationCache
+
+    lock_key = 'flush_translation_cache_hits_lock'
+    if not cache.add(lock_key, 1, timeout=300):
+        return 0
+    try:
+        # الصفوف المنتظرة أولاً، حتى لا تضيع إصاباتها
+        flush_translation_cache_writes()
+        return flush_hits(TranslationCache)
+    finally:
+        cache.delete(lock_key)
+
+
+@shared_task
+def evict_translation_cache():
+    """إخلاء LRU/LFU عند تجاوز حد الصفوف أو البايتات."""
+    from apps.core.cache_usage import evict
+    from .models import TranslationCache
+
+    # العدادات أولاً، حتى لا نحذف ترجمات مستخدمة حديثاً
+    flush_translation_cache_hits()
+    return evict(TranslationCache)
+
+
+@shared_task(bind=True, max_retries=getattr(settings, 'AZURE_RATE_LIMIT_MAX_RETRIES', 20))
+def prewarm_translation_cache(self):
+    """تسخين كاش الترجمة يومياً (رسالة الخصوصية، التحيات، الردود الجاهزة، العبارات المتكررة)."""
+    from .services.prewarm_service import PrewarmService
+
+    try:
+        return PrewarmService.warm()
+    except RateLimited as e:
+        raise self.retry(exc=e, countdown=e.retry_after)
+
+
 
 
 # ... (الكود السابق في الملف process_message_ai ... اترك كل شيء فوق كما هو)
@@ -109,11 +330,12 @@ def check_epidemic_outbreak():
     # حد الخطر (عدد الأشخاص)
     DANGER_THRESHOLD = 5
 
-    # 2. جلب الرسائل (يجب جلبها لفك تشفيرها في الذاكرة)
-    recent_messages = Message.objects.filter(
-        timestamp__gte=time_threshold,
-        sender__role='REFUGEE'
-    ).select_related('session')
+    # 2. جلب الرسائل المرشحة فقط: الفهرس الأعمى يضيق النتائج في SQL قبل فك التشفير
+    all_keywords = [word for words in epidemic_signatures.values() for word in words]
+    recent_messages = SearchIndexService.filter_messages(
+        Message.objects.filter(timestamp__gte=time_threshold, sender__role='REFUGEE'),
+        all_keywords
+    ).select_related('session').decrypted(fields=['text_translated', 'ai_analysis'])
 
     # 3. الفحص اليدوي (لأن النصوص مشفرة)
     detected_cases = {k: set() for k in epidemic_signatures.keys()}
@@ -126,7 +348,7 @@ def check_epidemic_outbreak():
         for category, keywords in epidemic_signatures.items():
             for word in keywords:
                 if word in text_content:
-                    detected_cases[category].add(msg.session.refugee.id)
+                    detected_cases[category].add(msg.session.refugee_id)
                     break 
 
     # 4. تسجيل التنبيهات
@@ -1,8 +1,21 @@
-from django.test import TestCase
+import base64
+import json
+from io import StringIO
+
+from cryptography.fernet import Fernet
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import BinaryField, ExpressionWrapper, F
+from django.test import TestCase, override_settings
+from django.urls import reverse
 from django.contrib.auth import get_user_model
-from unittest.mock import patch  # أداة المحاكاة (Mocking)
-from .models import ChatSession, Message, DangerKeyword
-from .tasks import process_message_ai  # نستورد المهمة لتشغيلها يدوياً
+from unittest.mock import MagicMock, patch  # أداة المحاكاة (Mocking)
+from .models import ChatSession, Message, DangerKeyword, EpidemicAlert, PendingTranslation
+from .tasks import process_message_ai, check_epidemic_outbreak, flush_translation_batch, replay_pending_translations  # نستورد المهمة لتشغيلها يدوياً
+from .services.search_service import SearchIndexService
+from .services.triage_service import TriageService
+from .encryption import Ciphertext, ZLIB_MARKER, get_fernet
+from apps.core.lru import BoundedLRU
 
 User = get_user_model()
 
@@ -100,4 +113,712 @@ class TriageSystemTest(TestCase):
         
         # ثالثاً: التحقق
         self.session.refresh_from_db()
-        self.assertEqual(self.session.priority, 1) # يجب أن تعود خضراء
\ No newline at end of file
+        self.assertEqual(self.session.priority, 1) # يجب أن تعود خضراء
+
+class EncryptedFieldTest(TestCase):
+    def setUp(self):
+        self.refugee = User.objects.create_user(
+            username="enc_refugee",
+            email="enc_refugee@example.com",
+            password="123",
+            role="REFUGEE",
+            native_language="ar",
+            full_name="Encrypted User"
+        )
+        self.session = ChatSession.objects.create(refugee=self.refugee)
+
+    def test_lazy_decryption_on_first_access(self):
+        """الحقل يبقى رمزاً مشفراً حتى أول قراءة، ثم يُحفظ النص الصريح"""
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="مرحبا")
+        loaded = Message.objects.get(id=msg.id)
+
+        self.assertIsInstance(loaded.__dict__['text_original'], Ciphertext)
+        self.assertEqual(loaded.text_original, "مرحبا")
+        self.assertEqual(loaded.__dict__['text_original'], "مرحبا")
+
+    def test_untouched_field_is_saved_without_reencryption(self):
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="Hei")
+        loaded = Message.objects.get(id=msg.id)
+        token = loaded.__dict__['text_original'].token
+
+        with patch('apps.chat.models.encrypt_text') as mock_encrypt:
+            loaded.is_read = True
+            loaded.save()
+            mock_encrypt.assert_not_called()
+
+        reloaded = Message.objects.get(id=msg.id)
+        self.assertEqual(reloaded.__dict__['text_original'].token, token)
+        self.assertEqual(reloaded.text_original, "Hei")
+
+    def test_binary_storage_roundtrip(self):
+        """الرمز يُخزن كبايتات خام (بدون base64) ويُقرأ كنص عادي"""
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="Binær lagring")
+        raw = Message.objects.filter(id=msg.id).values_list(
+            ExpressionWrapper(F('text_original'), output_field=BinaryField()), flat=True
+        ).get()
+
+        token = Message.objects.get(id=msg.id).__dict__['text_original'].token
+        # العمود يحمل الرمز بعد فك base64، لا نص الرمز نفسه
+        self.assertEqual(bytes(raw), base64.urlsafe_b64decode(token))
+        self.assertLess(len(bytes(raw)), len(token))
+        self.assertEqual(Message.objects.get(id=msg.id).text_original, "Binær lagring")
+
+    def test_swap_restores_not_null_on_prepared_columns(self):
+        """PostgreSQL: عمود الظل أُضيف NULL-able، وبعد التسمية يعود NOT NULL كما في النموذج"""
+        from . import binary_storage
+
+        def swapped_sql(null):
+            connection = MagicMock()
+            cursor = connection.cursor.return_value.__enter__.return_value
+            with patch.object(binary_storage, '_column_type', return_value='text'), \
+                    patch.object(binary_storage, '_column_exists', return_value=True):
+                binary_storage.swap(connection, 'chat_translationcache', 'source_text', null=null)
+            return [c.args[0] for c in cursor.execute.call_args_list]
+
+        self.assertEqual(
+            swapped_sql(null=False)[-1],
+            'ALTER TABLE "chat_translationcache" ALTER COLUMN "source_text" SET NOT NULL'
+        )
+        self.assertFalse(any('SET NOT NULL' in sql for sql in swapped_sql(null=True)))
+
+    def test_long_text_is_compressed_before_encryption(self):
+        long_text = "Jeg har vondt i magen og kaster opp. " * 50
+        with self.settings(DB_ENCRYPTION_COMPRESS_THRESHOLD=256):
+            msg = Message.objects.create(session=self.session, sender=self.refugee, text_original=long_text)
+            token = Message.objects.get(id=msg.id).__dict__['text_original'].token
+            self.assertTrue(get_fernet().decrypt(token.encode()).startswith(ZLIB_MARKER))
+            self.assertLess(len(token), len(long_text))
+
+        # الصفوف القديمة (غير المضغوطة) تُقرأ كما هي
+        with self.settings(DB_ENCRYPTION_COMPRESS_THRESHOLD=0):
+            old = Message.objects.create(session=self.session, sender=self.refugee, text_original=long_text)
+        self.assertEqual(Message.objects.get(id=msg.id).text_original, long_text)
+        self.assertEqual(Message.objects.get(id=old.id).text_original, long_text)
+
+    def test_bulk_decrypted_queryset(self):
+        """decrypted() يفك كل الحقول دفعة واحدة (بما فيها المسار المتوازي)"""
+        Message.objects.bulk_create([
+            Message(session=self.session, sender=self.refugee, text_original=f"رسالة {i}", text_translated=f"Melding {i}")
+            for i in range(80)
+        ])
+
+        messages = list(self.session.messages.order_by('text_translated').decrypted(chunk_size=50))
+
+        self.assertEqual(len(messages), 80)
+        for msg in messages:
+            self.assertIsInstance(msg.__dict__['text_original'], str)
+            self.assertIsInstance(msg.__dict__['text_translated'], str)
+        self.assertIn("Melding 0", [m.text_translated for m in messages])
+
+    def test_decrypted_only_requested_fields(self):
+        Message.objects.create(session=self.session, sender=self.refugee, text_original="A", text_translated="B")
+        msg = Message.objects.decrypted(fields=['text_translated']).get()
+
+        self.assertEqual(msg.__dict__['text_translated'], "B")
+        self.assertIsInstance(msg.__dict__['text_original'], Ciphertext)
+
+    def test_decrypt_cache_counts_repeat_reads(self):
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="Hei igjen")
+        cache = BoundedLRU(max_bytes=1024)
+
+        with patch('apps.chat.encryption.get_decrypt_cache', return_value=cache):
+            for _ in range(3):
+                self.assertEqual(Message.objects.get(id=msg.id).text_original, "Hei igjen")
+
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_decrypt_cache_is_opt_in_and_sized_in_bytes(self):
+        from .encryption import get_decrypt_cache
+        self.assertFalse(get_decrypt_cache().enabled)
+
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="مرحبا")
+        cache = BoundedLRU(max_bytes=1024)
+        with patch('apps.chat.encryption.get_decrypt_cache', return_value=cache):
+            Message.objects.get(id=msg.id).text_original
+        # 16 بايت للبصمة + 10 بايت UTF-8 (وليس 5 أحرف)
+        self.assertEqual(cache.stats()['bytes'], 16 + len("مرحبا".encode('utf-8')))
+
+    def test_forked_worker_gets_fresh_decrypt_pool(self):
+        from config.celery import reset_http_clients_after_fork
+        from . import encryption
+        inherited = encryption._get_executor()
+        reset_http_clients_after_fork()
+        fresh = encryption._get_executor()
+        self.assertIsNot(fresh, inherited)
+        self.assertEqual(encryption.decrypt_many([encryption.encrypt_text("x")] * 80), ["x"] * 80)
+        inherited.shutdown(wait=False)
+
+    def test_values_queries_return_plain_text(self):
+        from .models import TranslationCache
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="Hei", text_translated="مرحبا")
+        TranslationCache.objects.create(source_hash="h", source_language="no", target_language="ar", source_text="Hei", translated_text="مرحبا")
+
+        self.assertEqual(list(Message.objects.filter(id=msg.id).values_list('text_translated', flat=True)), ["مرحبا"])
+        self.assertEqual(Message.objects.values('text_original').get(id=msg.id), {'text_original': "Hei"})
+        self.assertEqual(Message.objects.values_list('id', 'text_original', named=True).get(id=msg.id).text_original, "Hei")
+        self.assertEqual(list(TranslationCache.objects.values_list('source_text', 'translated_text')), [("Hei", "مرحبا")])
+        json.dumps(list(Message.objects.values('text_original', 'text_translated')))
+
+    def test_rotate_encryption_key_command(self):
+        """بعد التدوير تُقرأ الرسائل بالمفتاح الجديد وحده"""
+        old_key = settings.DB_ENCRYPTION_KEY
+        new_key = Fernet.generate_key().decode()
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="Gammel nøkkel")
+
+        with self.settings(DB_ENCRYPTION_KEY=new_key, DB_ENCRYPTION_OLD_KEYS=[old_key]):
+            # أثناء فترة التدوير: القراءة تعمل بالمفتاحين
+            self.assertEqual(Message.objects.get(id=msg.id).text_original, "Gammel nøkkel")
+            call_command('rotate_encryption_key', models=['chat.Message'], sleep=0, reset=True, stdout=StringIO())
+
+        with self.settings(DB_ENCRYPTION_KEY=new_key, DB_ENCRYPTION_OLD_KEYS=[]):
+            self.assertEqual(Message.objects.get(id=msg.id).text_original, "Gammel nøkkel")
+
+    def test_blind_index_survives_key_rotation(self):
+        """مفتاح الفهرس مستقل: تدوير مفتاح Fernet لا يُبطل البصمات"""
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="x", text_translated="Jeg har diaré")
+        Message.objects.create(session=self.session, sender=self.refugee, text_original="y", text_translated="Takk")
+        with self.settings(DB_ENCRYPTION_KEY=Fernet.generate_key().decode(), DB_ENCRYPTION_OLD_KEYS=[settings.DB_ENCRYPTION_KEY]):
+            found = SearchIndexService.filter_messages(Message.objects.all(), ["diaré"])
+            self.assertEqual(list(found.values_list('id', flat=True)), [msg.id])
+
+    def test_rotate_skips_unreadable_rows(self):
+        """صف بمفتاح مفقود لا يوقف التدوير"""
+        old_key = settings.DB_ENCRYPTION_KEY
+        new_key = Fernet.generate_key().decode()
+        with self.settings(DB_ENCRYPTION_KEY=Fernet.generate_key().decode()):
+            lost = Message.objects.create(session=self.session, sender=self.refugee, text_original="Tapt nøkkel")
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="Gammel nøkkel")
+
+        out = StringIO()
+        with self.settings(DB_ENCRYPTION_KEY=new_key, DB_ENCRYPTION_OLD_KEYS=[old_key]):
+            call_command('rotate_encryption_key', models=['chat.Message'], sleep=0, reset=True, stdout=out)
+
+        self.assertIn("1 skipped", out.getvalue())
+        self.assertIn("unreadable rows skipped", out.getvalue())
+        with self.settings(DB_ENCRYPTION_KEY=new_key, DB_ENCRYPTION_OLD_KEYS=[]):
+            self.assertEqual(Message.objects.get(id=msg.id).text_original, "Gammel nøkkel")
+        self.assertTrue(Message.objects.filter(id=lost.id).exists())
+
+
+class SearchIndexTest(TestCase):
+    def setUp(self):
+        self.refugees = []
+        for i in range(5):
+            user = User.objects.create_user(
+                username=f"search_refugee_{i}",
+                email=f"search_refugee_{i}@example.com",
+                password="123",
+                role="REFUGEE",
+                full_name=f"Search {i}"
+            )
+            self.refugees.append((user, ChatSession.objects.create(refugee=user)))
+
+    def test_filter_messages_uses_blind_index(self):
+        user, session = self.refugees[0]
+        hit = Message.objects.create(session=session, sender=user, text_original="x", text_translated="Jeg har HØY feber i dag")
+        Message.objects.create(session=session, sender=user, text_original="y", text_translated="Hei, takk")
+
+        found = SearchIndexService.filter_messages(Message.objects.all(), ["høy feber"])
+        self.assertEqual(list(found.values_list('id', flat=True)), [hit.id])
+
+    def test_prefilter_is_superset_of_substring_match(self):
+        """الصيغ المصرفة والمركبة لا تُستبعد قبل الفحص الجزئي"""
+        user, session = self.refugees[0]
+        texts = ["Han har hostet hele natten", "Diaréen er verre", "Utslettet klør", "Det er kvalmende",
+                 "Barnet har morgenhoste", "Veldig høy feberen"]
+        inflected = [
+            Message.objects.create(session=session, sender=user, text_original="x", text_translated=text)
+            for text in texts
+        ]
+        Message.objects.create(session=session, sender=user, text_original="y", text_translated="Hei, takk")
+
+        keywords = ["hoste", "diaré", "utslett", "kvalme", "høy feber"]
+        found = set(SearchIndexService.filter_messages(Message.objects.all(), keywords).values_list('id', flat=True))
+        self.assertEqual(found, {m.id for m in inflected})
+
+        # نفس نتيجة الفحص الجزئي بعد فك التشفير
+        for msg in Message.objects.filter(id__in=found).decrypted():
+            self.assertTrue(any(word in msg.text_translated.lower() for word in keywords))
+
+    def test_unindexed_messages_are_not_dropped(self):
+        from .models import MessageSearchToken
+        user, session = self.refugees[0]
+        msg = Message.objects.create(session=session, sender=user, text_original="x", text_translated="Jeg har diaré")
+        MessageSearchToken.objects.filter(message=msg).delete()  # قبل rebuild_search_index
+
+        found = SearchIndexService.filter_messages(Message.objects.all(), ["diaré"])
+        self.assertIn(msg.id, set(found.values_list('id', flat=True)))
+
+    def test_plain_save_reindexes_only_changed_fields(self):
+        user, session = self.refugees[0]
+        msg = Message.objects.create(session=session, sender=user, text_original="x", text_translated="Jeg har diaré")
+
+        with patch('apps.chat.signals.SearchIndexService.index_message') as mock_index:
+            loaded = Message.objects.get(id=msg.id)
+            loaded.is_read = True
+            loaded.save()
+            # قُرئ الحقل لكنه لم يتغير
+            self.assertEqual(loaded.text_translated, "Jeg har diaré")
+            loaded.save()
+            mock_index.assert_not_called()
+
+            loaded.text_translated = "Jeg har feber"
+            loaded.save()
+            mock_index.assert_called_once()
+
+    def test_epidemic_check_finds_indexed_cases(self):
+        for user, session in self.refugees:
+            Message.objects.create(session=session, sender=user, text_original="...", text_translated="Jeg har hostet hele natten")
+
+        check_epidemic_outbreak()
+        self.assertTrue(EpidemicAlert.objects.filter(symptom_category__startswith="Respiratory").exists())
+
+
+class DangerMatcherTest(TestCase):
+    def test_matcher_rebuilds_when_keywords_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            keyword = DangerKeyword.objects.create(word="Skabb")
+        self.assertTrue(TriageService.check_for_danger("Jeg tror jeg har SKABB"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            keyword.delete()
+        self.assertFalse(TriageService.check_for_danger("Jeg tror jeg har skabb"))
+
+    def test_version_bumps_only_after_commit(self):
+        from django.core.cache import cache
+        from .services.triage_service import KEYWORDS_VERSION_KEY
+        before = cache.get(KEYWORDS_VERSION_KEY)
+        with self.captureOnCommitCallbacks() as callbacks:
+            DangerKeyword.objects.create(word="kolera")
+            self.assertEqual(cache.get(KEYWORDS_VERSION_KEY), before)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_triage_survives_cache_outage(self):
+        from .services import triage_service
+        with self.captureOnCommitCallbacks(execute=True):
+            DangerKeyword.objects.create(word="brystsmerter")
+
+        with patch('apps.chat.services.triage_service.cache.get', side_effect=ConnectionError("redis down")):
+            # بدون مطابق مبني: يُبنى مرة من قاعدة البيانات
+            triage_service._matchers = None
+            self.assertTrue(TriageService.check_for_danger("Sterke brystsmerter"))
+            # مع مطابق مبني: يبقى كما هو عند كل فحص
+            triage_service._version_checked_at = 0.0
+            with self.assertNumQueries(0):
+                self.assertTrue(TriageService.check_for_danger("Sterke brystsmerter"))
+
+    def test_hot_path_does_not_query_database(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            DangerKeyword.objects.create(word="brystsmerter")
+        TriageService.check_for_danger("hei")  # بناء المطابق
+
+        with self.assertNumQueries(0):
+            self.assertTrue(TriageService.check_for_danger("Sterke brystsmerter"))
+            self.assertTrue(TriageService.check_for_danger("heavy bleeding"))
+            self.assertFalse(TriageService.check_for_danger("Takk for hjelpen"))
+
+    def test_original_language_lexicons_are_separate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            DangerKeyword.objects.create(word="نزيف", language="ar")
+        self.assertTrue(TriageService.check_original_for_danger("عندي نزيف شديد", "ar"))
+        self.assertFalse(TriageService.check_original_for_danger("عندي نزيف شديد", "fa"))
+        # الترجمة النرويجية لا تُفحص بقاموس العربية
+        self.assertFalse(TriageService.check_for_danger("نزيف"))
+
+    def test_original_text_escalates_before_translation(self):
+        refugee = User.objects.create_user(
+            username="refugee_ar", email="refugee_ar@example.com", password="123",
+            role="REFUGEE", native_language="ar", full_name="Refugee"
+        )
+        session = ChatSession.objects.create(refugee=refugee)
+        with self.captureOnCommitCallbacks(execute=True):
+            DangerKeyword.objects.create(word="ألم في الصدر", language="ar")
+
+        msg = Message.objects.create(session=session, sender=refugee, text_original="لدي ألم في الصدر منذ ساعة")
+        self.assertTrue(TriageService.triage_original(msg))
+
+        session.refresh_from_db()
+        self.assertEqual(session.priority, 2)
+        self.assertTrue(Message.objects.get(id=msg.id).is_urgent)
+
+    def test_benchmark_triage_reports_accuracy(self):
+        out = StringIO()
+        call_command('benchmark_triage', '--messages', '500', stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report['messages'], 500)
+        self.assertGreater(report['translated_pass']['recall'], 0.5)
+        self.assertEqual(report['original_pass']['false_positives'], 0)
+        # القواميس المزروعة للقياس لا تبقى في القاعدة
+        self.assertFalse(DangerKeyword.objects.exists())
+
+
+class TranslationBatchTest(TestCase):
+    def setUp(self):
+        import fakeredis
+        self.redis = fakeredis.FakeRedis()
+        patcher = patch('apps.chat.services.translation_batcher.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.refugee = User.objects.create_user(
+            username="refugee_batch", email="refugee_batch@example.com", password="123",
+            role="REFUGEE", native_language="ar", full_name="Refugee"
+        )
+        self.session = ChatSession.objects.create(refugee=self.refugee)
+        DangerKeyword.objects.create(word="blod")
+
+    @override_settings(AZURE_TRANSLATOR_BATCH_WINDOW_MS=50)
+    @patch('apps.chat.tasks.flush_translation_batch.apply_async')
+    @patch('apps.core.services.AzureClient.fetch_batch')
+    def test_messages_share_one_azure_request(self, mock_fetch_batch, mock_schedule):
+        translations = {"لدي دم كثير": "Jeg har mye blod", "مرحبا": "Hei"}
+        mock_fetch_batch.side_effect = lambda texts, src, dest: [translations[t] for t in texts]
+
+        urgent = Message.objects.create(session=self.session, sender=self.refugee, text_original="لدي دم كثير")
+        normal = Message.objects.create(session=self.session, sender=self.refugee, text_original="مرحبا")
+        process_message_ai(str(urgent.id))
+        process_message_ai(str(normal.id))
+
+        # تفريغ واحد مجدول لكل النافذة، ولا ترجمة قبل التفريغ
+        mock_schedule.assert_called_once()
+        self.assertFalse(Message.objects.get(id=urgent.id).text_translated)
+
+        flush_translation_batch("ar", "no")
+
+        mock_fetch_batch.assert_called_once()
+        self.assertEqual(Message.objects.get(id=normal.id).text_translated, "Hei")
+        self.assertTrue(Message.objects.get(id=urgent.id).is_urgent)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.priority, 2)
+
+    @patch('apps.core.services.AzureTranslator.translate')
+    def test_rate_limited_translation_is_rescheduled(self, mock_translate):
+        from celery.exceptions import Retry
+        from apps.core.rate_limit import RateLimited
+
+        mock_translate.side_effect = RateLimited(7)
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="مرحبا")
+
+        with patch.object(process_message_ai, 'retry', side_effect=Retry()) as mock_retry:
+            with self.assertRaises(Retry):
+                process_message_ai(str(msg.id))
+        self.assertEqual(mock_retry.call_args.kwargs['countdown'], 7)
+
+    @patch('apps.core.services.AzureTranslator.translate')
+    def test_rate_limited_translation_is_deferred_after_last_retry(self, mock_translate):
+        from apps.core.rate_limit import RateLimited
+
+        mock_translate.side_effect = RateLimited(7)
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="مرحبا")
+
+        with patch.object(process_message_ai, 'max_retries', 0):
+            process_message_ai(str(msg.id))
+
+        # نفس مسار انقطاع Azure: نص بديل الآن، وإعادة الترجمة من الطابور لاحقاً
+        self.assertEqual(Message.objects.get(id=msg.id).text_translated, "مرحبا (Translation Unavailable)")
+        self.assertTrue(PendingTranslation.objects.filter(message=msg, target_language="no").exists())
+
+    @patch('apps.core.services.AzureTranslator.translate_many')
+    @patch('apps.core.services.AzureTranslator.translate')
+    def test_outage_defers_and_replays_translation(self, mock_translate, mock_translate_many):
+        from apps.core.services import TranslationUnavailable
+
+        mock_translate.side_effect = TranslationUnavailable("circuit open")
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="لدي دم كثير")
+        process_message_ai(str(msg.id))
+
+        self.assertEqual(Message.objects.get(id=msg.id).text_translated, "لدي دم كثير (Translation Unavailable)")
+        self.assertTrue(PendingTranslation.objects.filter(message=msg, target_language="no").exists())
+
+        # عودة الخدمة: إعادة الترجمة تستبدل النص البديل وتفحص الخطر
+        mock_translate_many.return_value = ["Jeg har mye blod"]
+        self.assertEqual(replay_pending_translations(), 1)
+
+        msg = Message.objects.get(id=msg.id)
+        self.assertEqual(msg.text_translated, "Jeg har mye blod")
+        self.assertTrue(msg.is_urgent)
+        self.assertFalse(PendingTranslation.objects.exists())
+
+    @patch('apps.core.services.AzureTranslator.translate', return_value="Hei")
+    def test_disabled_batching_translates_directly(self, mock_translate):
+        msg = Message.objects.create(session=self.session, sender=self.refugee, text_original="مرحبا")
+        process_message_ai(str(msg.id))
+        self.assertEqual(Message.objects.get(id=msg.id).text_translated, "Hei")
+
+
+class BroadcastTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from apps.core.services import reset_translation_cache
+        cache.clear()
+        reset_translation_cache()
+
+        self.nurse = User.objects.create_user(
+            username="nurse_broadcast", email="nurse_broadcast@example.com", password="123",
+            role="NURSE", is_staff=True, native_language="no", full_name="Nurse"
+        )
+        self.sessions = []
+        for i, language in enumerate(["ar", "uk", "ar"]):
+            refugee = User.objects.create_user(
+                username=f"refugee_bc_{i}", email=f"refugee_bc_{i}@example.com", password="123",
+                role="REFUGEE", native_language=language, full_name="Refugee"
+            )
+            self.sessions.append(ChatSession.objects.create(refugee=refugee, priority=2))
+
+    @patch('apps.core.services.AzureClient.fetch_multi')
+    def test_one_translation_call_for_all_sessions(self, mock_fetch_multi):
+        mock_fetch_multi.return_value = {"ar": "العيادة مغلقة", "uk": "Клініка закрита"}
+        from .services.broadcast_service import BroadcastService
+
+        sent = BroadcastService.broadcast(self.nurse, "Klinikken er stengt")
+
+        mock_fetch_multi.assert_called_once()
+        self.assertEqual(sorted(mock_fetch_multi.call_args.args[2]), ["ar", "uk"])
+        self.assertEqual(len(sent), 3)
+        translated = {
+            m.session_id: m.text_translated
+            for m in Message.objects.filter(sender=self.nurse).decrypted()
+        }
+        self.assertEqual(translated[self.sessions[1].id], "Клініка закрита")
+        self.assertEqual(translated[self.sessions[2].id], "العيادة مغلقة")
+
+        # الإعلان لا يخفض أولوية الجلسات العاجلة
+        self.sessions[0].refresh_from_db()
+        self.assertEqual(self.sessions[0].priority, 2)
+
+    @patch('apps.core.services.AzureClient.fetch_batch')
+    @patch('apps.core.services.AzureClient.fetch_multi', side_effect=ConnectionError("Azure down"))
+    def test_outage_defers_broadcast_translations(self, mock_fetch_multi, mock_fetch_batch):
+        from .services.broadcast_service import BroadcastService
+        from .tasks import replay_pending_translations
+
+        sent = BroadcastService.broadcast(self.nurse, "Klinikken er stengt")
+
+        self.assertEqual(PendingTranslation.objects.filter(message__in=sent).count(), 3)
+        mock_fetch_batch.side_effect = lambda texts, src, dest: [f"[{dest}] {t}" for t in texts]
+        replay_pending_translations()
+        translated = Message.objects.get(session=self.sessions[1], sender=self.nurse).text_translated
+        self.assertEqual(translated, "[uk] Klinikken er stengt")
+
+    @override_settings(STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    })
+    def test_confirmation_count_matches_recipients(self):
+        self.sessions[2].refugee.is_active = False
+        self.sessions[2].refugee.save()
+        self.client.force_login(self.nurse)
+
+        response = self.client.get(reverse('admin:chat_broadcast'))
+
+        self.assertEqual(response.context['active_sessions'], 2)
+        self.assertEqual(response.context['active_sessions'], ChatSession.objects.broadcast_recipients().count())
+
+
+class AsyncTranslationTest(TestCase):
+    def setUp(self):
+        from apps.core.services import reset_translation_cache
+        from django.core.cache import cache
+        cache.clear()
+        reset_translation_cache()
+
+        self.refugee = User.objects.create_user(
+            username="refugee_async", email="refugee_async@example.com", password="123",
+            role="REFUGEE", native_language="ar", full_name="Refugee"
+        )
+        self.session = ChatSession.objects.create(refugee=self.refugee)
+        DangerKeyword.objects.create(word="blod")
+        DangerKeyword.objects.create(word="نزيف", language="ar")
+
+    async def send_over_websocket(self, text, events=1):
+        from channels.testing import WebsocketCommunicator
+        from .consumers import ChatConsumer
+
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f"/ws/chat/{self.session.id}/")
+        communicator.scope['url_route'] = {'kwargs': {'session_id': self.session.id}}
+        communicator.scope['user'] = self.refugee
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.send_to(text_data=json.dumps({'message': text}))
+        received = [await communicator.receive_json_from(timeout=5) for _ in range(events)]
+        await communicator.disconnect()
+        return received
+
+    @override_settings(AZURE_TRANSLATOR_KEY='key', AZURE_TRANSLATOR_ENDPOINT='https://translator.test')
+    @patch('apps.chat.signals.process_message_ai.delay')
+    async def test_short_message_arrives_translated_without_celery(self, mock_delay):
+        import httpx
+
+        def handler(request):
+            return httpx.Response(200, json=[{'translations': [{'to': 'no', 'text': 'Jeg har mye blod'}]}])
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch('apps.core.services.get_async_http_client', return_value=client):
+            # الرسالة تُحفظ وتُفرز أولاً، ثم يصل تحديثها بعد الترجمة المباشرة
+            stored, translated = await self.send_over_websocket("لدي دم كثير", events=2)
+
+        # الحدث الأول لا ينتظر Azure، والثاني نفس الرسالة مترجمة ومفروزة
+        self.assertFalse(stored['text_translated'])
+        self.assertEqual(translated['id'], stored['id'])
+        self.assertEqual(translated['text_translated'], "Jeg har mye blod")
+        self.assertTrue(translated['is_urgent'])
+        mock_delay.assert_not_called()
+
+    @patch('apps.chat.consumers.process_message_ai.delay')
+    @patch('apps.chat.consumers.ChatConsumer.translate_now', return_value=None)
+    async def test_original_is_triaged_before_translation(self, mock_translate, mock_delay):
+        stored, = await self.send_over_websocket("عندي نزيف")
+
+        self.assertTrue(stored['is_urgent'])
+        self.assertFalse(stored['text_translated'])
+        # فشلت الترجمة المباشرة: يكملها Celery
+        mock_delay.assert_called_once_with(stored['id'])
+
+    @override_settings(ASYNC_TRANSLATION_MAX_CHARS=5)
+    async def test_long_message_falls_back_to_celery(self):
+        event, = await self.send_over_websocket("رسالة طويلة جداً")
+
+        self.assertFalse(event['text_translated'])
+        # on_commit داخل TestCase لا يُنفذ، لذلك نتحقق من أن الرسالة ما زالت تنتظر الترجمة
+        message = await Message.objects.aget(id=event['id'])
+        self.assertFalse(message.text_translated)
+
+
+class PrewarmTranslationsTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from apps.core.services import reset_translation_cache
+        cache.clear()
+        reset_translation_cache()
+
+    @patch('apps.core.services.AzureClient.fetch_batch')
+    def test_prewarm_fills_cold_start_cache_in_both_directions(self, mock_fetch_batch):
+        from .models import TranslationCache
+        from .services.prewarm_service import PRIVACY_WARNING, PrewarmService, refugee_languages
+
+        mock_fetch_batch.side_effect = lambda texts, src, dest: [f"[{dest}] {t}" for t in texts]
+        TranslationCache.objects.create(
+            source_hash=TranslationCache.make_hash("Vent litt"), source_language="no", target_language="ar",
+            source_text="Vent litt", translated_text="انتظر قليلاً", hit_count=3
+        )
+
+        out = StringIO()
+        call_command('prewarm_translations', '--mined', '5', stdout=out)
+
+        self.assertIn("-> 100.0%", out.getvalue())
+        # طلب Azure واحد لكل زوج لغات (كل نصوص الزوج في دفعة)
+        pairs = [(c.args[1], c.args[2]) for c in mock_fetch_batch.call_args_list]
+        self.assertEqual(len(pairs), len(set(pairs)))
+        # الاتجاه الثاني: عبارة اللاجئ بلغته -> النرويجية
+        self.assertIn(("ar", "no"), pairs)
+        # العبارة المستخرجة من الكاش تُرسل لكل اللغات
+        self.assertTrue(TranslationCache.objects.filter(
+            source_hash=TranslationCache.make_hash("Vent litt"), target_language="uk").exists())
+        self.assertEqual(TranslationCache.objects.filter(
+            source_hash=TranslationCache.make_hash(PRIVACY_WARNING)).count(), len(refugee_languages()))
+
+        # التشغيل الثاني لا يستدعي Azure
+        mock_fetch_batch.reset_mock()
+        self.assertEqual(PrewarmService.warm(5)['before'], 1.0)
+        mock_fetch_batch.assert_not_called()
+
+
+class TranslationCacheUsageTest(TestCase):
+    def setUp(self):
+        import fakeredis
+        from django.core.cache import cache
+        from apps.core.services import reset_translation_cache
+        cache.clear()
+        reset_translation_cache()
+        patcher = patch('apps.core.cache_usage.get_redis', return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_rows(self, count):
+        from django.utils import timezone
+        from datetime import timedelta
+        from .models import TranslationCache
+        now = timezone.now()
+        for i in range(count):
+            TranslationCache.objects.create(
+                source_hash=TranslationCache.make_hash(f"text {i}"), source_language="no", target_language="ar",
+                source_text=f"text {i}", translated_text="x" * 10,
+                hit_count=count - i, last_used_at=now - timedelta(minutes=i)
+            )
+
+    def remaining(self):
+        from .models import TranslationCache
+        return sorted(str(row.source_text) for row in TranslationCache.objects.all())
+
+    @override_settings(TRANSLATION_HIT_PUSH_SECONDS=3600)
+    def test_hits_are_buffered_then_flushed_in_bulk(self):
+        from apps.core.services import CacheRepository
+        from .models import TranslationCache
+        from .tasks import flush_translation_cache_hits
+
+        repo = CacheRepository()
+        repo.save("Hei", "مرحبا", "no", "ar")
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                self.assertEqual(repo.get("Hei", "no", "ar"), "مرحبا")
+
+        self.assertEqual(flush_translation_cache_hits(), 1)
+        row = TranslationCache.objects.get(source_hash=TranslationCache.make_hash("Hei"))
+        self.assertEqual(row.hit_count, 3)
+        self.assertIsNotNone(row.last_used_at)
+        self.assertEqual(flush_translation_cache_hits(), 0)
+
+    @override_settings(TRANSLATION_CACHE_MAX_ROWS=3, TRANSLATION_CACHE_EVICTION_TARGET=1.0)
+    def test_lru_evicts_least_recently_used_rows(self):
+        from .tasks import evict_translation_cache
+        self.make_rows(5)
+        self.assertEqual(evict_translation_cache(), 2)
+        self.assertEqual(self.remaining(), ["text 0", "text 1", "text 2"])
+
+    @override_settings(TRANSLATION_CACHE_MAX_ROWS=0, TRANSLATION_CACHE_EVICTION_POLICY='lfu',
+                       TRANSLATION_CACHE_EVICTION_TARGET=1.0)
+    def test_byte_cap_with_lfu_policy(self):
+        from django.db.models import Sum
+        from django.db.models.functions import Length
+        from apps.core.cache_usage import evict
+        from .models import TranslationCache
+        self.make_rows(3)  # hit_count: text 0 = 3, text 1 = 2, text 2 = 1
+        total = TranslationCache.objects.aggregate(total=Sum(Length('source_text') + Length('translated_text')))['total']
+
+        with override_settings(TRANSLATION_CACHE_MAX_BYTES=total):
+            self.assertEqual(evict(TranslationCache), 0)
+        with override_settings(TRANSLATION_CACHE_MAX_BYTES=total * 2 // 3):
+            self.assertEqual(evict(TranslationCache), 1)
+        self.assertEqual(self.remaining(), ["text 0", "text 1"])
+
+
+class TranslationKeyReportTest(TestCase):
+    @patch('apps.chat.signals.process_message_ai.delay')
+    def test_replays_traffic_against_each_normalizer(self, mock_delay):
+        import os
+        import tempfile
+        refugee = User.objects.create_user(
+            username="refugee_keys", email="refugee_keys@example.com", password="123",
+            role="REFUGEE", native_language="en", full_name="Refugee"
+        )
+        session = ChatSession.objects.create(refugee=refugee)
+        for text in ["I need help", "I  need help ", "i need help", "I need help!!", "I need help. Thanks"]:
+            Message.objects.create(session=session, sender=refugee, text_original=text)
+
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        call_command('translation_key_report', '--sentences', '--pipeline', 'caseless=strip,casefold',
+                     '--output', path, stdout=StringIO())
+        with open(path) as f:
+            report = json.load(f)
+
+        self.assertEqual(report['exact']['lookups'], 6)
+        self.assertEqual(report['exact']['hits'], 0)
+        self.assertEqual(report['default']['hits'], 1)   # المسافات فقط
+        self.assertEqual(report['default']['case_collisions'], 0)
+        self.assertEqual(report['legacy']['hits'], 1)    # الحالة فقط: ترجمة نص مختلف
+        self.assertEqual(report['legacy']['case_collisions'], 1)
+        self.assertEqual(report['caseless']['hits'], 1)
@@ -8,6 +8,7 @@ from asgiref.sync import async_to_sync
 from .models import ChatSession, Message
 # استيراد خدمة الترجمة (التي تحتوي على الكاش)
 from apps.core.services import AzureTranslator 
+from .services.prewarm_service import PRIVACY_WARNING
 
 @login_required
 def chat_room(request):
@@ -19,7 +20,8 @@ def chat_room(request):
     
     # === منطق ترجمة رسالة الخصوصية (Dynamic GDPR Warning) ===
     # 1. النص الأساسي (الإنجليزية)
-    base_warning = "🔒 For your privacy, do not write your name or health ID here. We identify you automatically."
+    # (نفس النص في prewarm_translations، فيجده أول لاجئ بكل لغة في الكاش)
+    base_warning = PRIVACY_WARNING
     privacy_warning = base_warning 
 
     # 2. الترجمة الذكية (تعتمد على الكاش أولاً ثم Azure)
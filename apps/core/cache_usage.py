@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.db.models.functions import Length
+
+from apps.core.rate_limit import get_redis
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# حساب الاستخدام والإخلاء لجدول TranslationCache
+# ==============================================================================
+# الإصابات لا تُكتب في قاعدة البيانات مع كل ترجمة:
+# 1. عداد داخل العملية (Counter) يُدفع إلى Redis كل بضع ثوانٍ (HINCRBY بـ pipeline)
+# 2. مهمة Celery تنقل الـ Hash من Redis إلى الجدول دفعة واحدة (bulk_update)
+# العدادات تقريبية: ما لم يُدفع عند إيقاف العملية يضيع، وهذا مقبول لسياسة إخلاء.
+HITS_KEY = 'translation:hits'
+LAST_USED_KEY = 'translation:last_used'
+FLUSHING_SUFFIX = ':flushing'
+# لا نترك العداد المحلي يكبر بلا حد بين دفعتين
+MAX_PENDING_KEYS = 10000
+
+_pending = Counter()
+_last_push = time.monotonic()
+_lock = threading.Lock()
+
+
+def _field(key):
+    return ':'.join(key)
+
+
+def record_hit(key):
+    """يسجل إصابة للمفتاح (hash, src, dest) ويعيد True إذا حان وقت push_hits."""
+    with _lock:
+        _pending[_field(key)] += 1
+        return (
+            len(_pending) >= MAX_PENDING_KEYS
+            or time.monotonic() - _last_push >= getattr(settings, 'TRANSLATION_HIT_PUSH_SECONDS', 5)
+        )
+
+
+def push_hits():
+    """دفع العدادات المحلية إلى Redis. عند تعطل Redis نتخلى عنها (Fail-open)."""
+    global _pending, _last_push
+    with _lock:
+        pending, _pending, _last_push = _pending, Counter(), time.monotonic()
+    if not pending:
+        return 0
+    try:
+        now = time.time()
+        with get_redis().pipeline() as pipe:
+            for field, count in pending.items():
+                pipe.hincrby(HITS_KEY, field, count)
+            pipe.hset(LAST_USED_KEY, mapping={field: now for field in pending})
+            pipe.execute()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not push translation cache hits: {e}")
+        return 0
+    return len(pending)
+
+
+def _drain():
+    """نقل الـ Hash إلى مفتاح مؤقت (RENAME ذري) ثم قراءته. المفتاح المؤقت من تشغيل فاشل يُعاد استخدامه."""
+    redis = get_redis()
+    flushing_hits, flushing_last = HITS_KEY + FLUSHING_SUFFIX, LAST_USED_KEY + FLUSHING_SUFFIX
+    if not redis.exists(flushing_hits):
+        if not redis.exists(HITS_KEY):
+            return redis, {}, {}
+        with redis.pipeline() as pipe:
+            pipe.rename(HITS_KEY, flushing_hits)
+            pipe.rename(LAST_USED_KEY, flushing_last)
+            pipe.execute()
+    hits = {k.decode(): int(v) for k, v in redis.hgetall(flushing_hits).items()}
+    last_used = {k.decode(): float(v) for k, v in redis.hgetall(flushing_last).items()}
+    return redis, hits, last_used
+
+
+def flush_hits(model, batch_size=500):
+    """
+    إضافة العدادات المتراكمة في Redis إلى hit_count و last_used_at.
+    يجب ألا تعمل نسختان معاً (المهمة تأخذ قفلاً).
+    """
+    push_hits()
+    redis, hits, last_used = _drain()
+    if not hits:
+        return 0
+
+    by_hash = {}
+    for field, count in hits.items():
+        source_hash, src, dest = field.split(':')
+        by_hash.setdefault(source_hash, {})[(src, dest)] = field
+
+    hashes = list(by_hash)
+    updated = []
+    for start in range(0, len(hashes), batch_size):
+        rows = model.objects.filter(source_hash__in=hashes[start:start + batch_size]).values_list(
+            'id', 'source_hash', 'source_language', 'target_language', 'hit_count'
+        )
+        for pk, source_hash, src, dest, hit_count in rows:
+            field = by_hash[source_hash].get((src, dest))
+            if field is None:
+                continue
+            updated.append(model(
+                id=pk,
+                hit_count=hit_count + hits[field],
+                last_used_at=datetime.fromtimestamp(last_used.get(field, time.time()), tz=dt_timezone.utc),
+            ))
+    # الحقول المشفرة لا تُقرأ ولا تُكتب هنا
+    model.objects.bulk_update(updated, ['hit_count', 'last_used_at'], batch_size=batch_size)
+    redis.delete(HITS_KEY + FLUSHING_SUFFIX, LAST_USED_KEY + FLUSHING_SUFFIX)
+    logger.info(f"📈 Flushed {sum(hits.values())} translation cache hits to {len(updated)} rows.")
+    return len(updated)
+
+
+def _eviction_order():
+    # LRU: الأقدم استخداماً أولاً. LFU: الأقل إصابات أولاً (والأقدم عند التساوي).
+    last_used = F('last_used_at').asc(nulls_first=True)
+    if getattr(settings, 'TRANSLATION_CACHE_EVICTION_POLICY', 'lru') == 'lfu':
+        return ['hit_count', last_used, 'created_at']
+    return [last_used, 'created_at']
+
+
+def evict(model, batch_size=1000):
+    """
+    إخلاء الصفوف الأقل استخداماً عند تجاوز TRANSLATION_CACHE_MAX_ROWS أو
+    TRANSLATION_CACHE_MAX_BYTES، حتى نزول الجدول إلى EVICTION_TARGET من الحد
+    (هامش يمنع الإخلاء مع كل تشغيل). الطبقات الأسرع تنتهي وحدها (TTL / LRU).
+    """
+    max_rows = getattr(settings, 'TRANSLATION_CACHE_MAX_ROWS', 0)
+    max_bytes = getattr(settings, 'TRANSLATION_CACHE_MAX_BYTES', 0)
+    target = getattr(settings, 'TRANSLATION_CACHE_EVICTION_TARGET', 0.9)
+    size = Length('source_text') + Length('translated_text')
+
+    excess_rows = excess_bytes = 0
+    if max_rows:
+        total_rows = model.objects.count()
+        if total_rows > max_rows:
+            excess_rows = total_rows - int(max_rows * target)
+    if max_bytes:
+        total_bytes = model.objects.aggregate(total=Sum(size))['total'] or 0
+        if total_bytes > max_bytes:
+            excess_bytes = total_bytes - int(max_bytes * target)
+    if not excess_rows and not excess_bytes:
+        return 0
+
+    victims, freed = [], 0
+    candidates = model.objects.order_by(*_eviction_order()).annotate(size=size).values_list('id', 'size')
+    for pk, row_size in candidates.iterator(chunk_size=batch_size):
+        if len(victims) >= excess_rows and freed >= excess_bytes:
+            break
+        victims.append(pk)
+        freed += row_size or 0
+
+    for start in range(0, len(victims), batch_size):
+        model.objects.filter(id__in=victims[start:start + batch_size]).delete()
+    logger.info(f"🧹 Evicted {len(victims)} translation cache rows ({freed} bytes).")
+    return len(victims)
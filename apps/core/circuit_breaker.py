@@ -0,0 +1,87 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# قاطع الدائرة (Circuit Breaker) المشترك بين العمليات
+# ==============================================================================
+# مغلق: الطلبات تمر ونعد الأخطاء في نافذة زمنية.
+# مفتوح: إذا تجاوزت نسبة الأخطاء الحد نرفض فوراً (بدون انتظار timeout) لمدة OPEN_SECONDS.
+# نصف مفتوح: بعد انتهاء المدة يمر طلب تجريبي واحد؛ نجاحه يغلق الدائرة وفشله يعيد فتحها.
+
+# يُرسل عند إغلاق الدائرة بعد انقطاع (لإعادة تشغيل الترجمات المؤجلة)
+circuit_closed = Signal()
+
+
+class CircuitOpen(Exception):
+    """الخدمة معطلة حالياً: لا نرسل الطلب أصلاً."""
+
+
+class CircuitBreaker:
+    def __init__(self, name):
+        self.name = name
+        self.prefix = f"circuit:{name}"
+        self.error_rate = getattr(settings, 'AZURE_CIRCUIT_ERROR_RATE', 0.5)
+        self.min_calls = getattr(settings, 'AZURE_CIRCUIT_MIN_CALLS', 5)
+        self.window = getattr(settings, 'AZURE_CIRCUIT_WINDOW_SECONDS', 60)
+        self.open_seconds = getattr(settings, 'AZURE_CIRCUIT_OPEN_SECONDS', 30)
+
+    def _key(self, suffix):
+        return f"{self.prefix}:{suffix}"
+
+    def _incr(self, key):
+        cache.add(key, 0, timeout=self.window * 2)
+        return cache.incr(key)
+
+    def is_open(self):
+        return bool(cache.get(self._key('open')))
+
+    def before_call(self):
+        """يرفع CircuitOpen إذا كانت الدائرة مفتوحة (أو يوجد طلب تجريبي جارٍ)."""
+        try:
+            if cache.get(self._key('open')):
+                raise CircuitOpen(f"{self.name} circuit is open")
+            # بعد الانقطاع: طلب تجريبي واحد فقط في كل مرة
+            if cache.get(self._key('tripped')) and not cache.add(self._key('probe'), 1, timeout=self.open_seconds):
+                raise CircuitOpen(f"{self.name} circuit is half-open")
+        except CircuitOpen:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Circuit breaker state unavailable: {e}")
+
+    def record_success(self):
+        try:
+            self._incr(self._key(f"calls:{int(time.time() // self.window)}"))
+            if cache.get(self._key('tripped')):
+                cache.delete_many([self._key('tripped'), self._key('probe')])
+                logger.info(f"✅ Circuit '{self.name}' closed.")
+                circuit_closed.send(sender=self.__class__, name=self.name)
+        except Exception as e:
+            logger.warning(f"⚠️ Circuit breaker state unavailable: {e}")
+
+    def record_failure(self):
+        try:
+            bucket = int(time.time() // self.window)
+            calls = self._incr(self._key(f"calls:{bucket}"))
+            failures = self._incr(self._key(f"failures:{bucket}"))
+
+            half_open = cache.get(self._key('tripped'))
+            if half_open or (calls >= self.min_calls and failures / calls >= self.error_rate):
+                self.trip()
+        except Exception as e:
+            logger.warning(f"⚠️ Circuit breaker state unavailable: {e}")
+
+    def trip(self):
+        cache.set(self._key('open'), 1, timeout=self.open_seconds)
+        cache.set(self._key('tripped'), 1, timeout=None)
+        cache.delete(self._key('probe'))
+        logger.error(f"🔌 Circuit '{self.name}' opened for {self.open_seconds}s.")
+
+
+def get_translator_breaker():
+    return CircuitBreaker('azure-translator')
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import threading
+import weakref
+
+import httpx
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# سجل العملاء المشتركين (Process-wide Client Registry)
+# ==============================================================================
+# عميل واحد لكل خدمة خارجية في كل عملية، يحتفظ باتصالات Keep-alive مفتوحة،
+# فلا تدفع كل ترجمة أو تحليل صورة ثمن مصافحة TLS جديدة.
+# كل عميل يتصل بمضيف واحد، لذلك حدود المجمّع (Pool) هي عملياً حدود لكل مضيف.
+DEFAULT_POOL = {'max_connections': 20, 'max_keepalive_connections': 10}
+
+_clients = {}
+# العملاء غير المتزامنين: حلقة الأحداث -> {الاسم: AsyncClient}
+_async_clients = weakref.WeakKeyDictionary()
+# RLock: مصنع عميل قد يطلب عميلاً آخر (AzureOpenAI فوق مجمّع httpx)
+_lock = threading.RLock()
+
+
+def get_client(name, factory):
+    """يعيد الكائن المحفوظ بهذا الاسم، أو ينشئه مرة واحدة عبر factory."""
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def _pool_options(name):
+    pool = {**DEFAULT_POOL, **getattr(settings, 'HTTP_CLIENT_POOLS', {}).get(name, {})}
+    limits = httpx.Limits(
+        max_connections=pool['max_connections'],
+        max_keepalive_connections=pool['max_keepalive_connections'],
+        keepalive_expiry=getattr(settings, 'HTTP_POOL_KEEPALIVE_EXPIRY', 30),
+    )
+    return {'limits': limits, 'timeout': pool.get('timeout', 10)}
+
+
+def _build_http_client(name):
+    options = _pool_options(name)
+    logger.info(f"🔌 HTTP pool '{name}' created ({options['limits'].max_connections} connections).")
+    return httpx.Client(**options)
+
+
+def get_http_client(name):
+    """عميل httpx مشترك (Keep-alive) لخدمة معينة: 'azure-translator' أو 'azure-openai'."""
+    return get_client(f"http:{name}", lambda: _build_http_client(name))
+
+
+def get_async_http_client(name):
+    """
+    نسخة httpx.AsyncClient لنفس المجمّع، واحدة لكل حلقة أحداث (Event loop):
+    العميل غير المتزامن مرتبط بالحلقة التي أنشأته (ASGI له حلقة واحدة،
+    لكن async_to_sync ينشئ حلقات مؤقتة).
+    """
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    client = clients.get(name)
+    if client is None:
+        client = clients[name] = httpx.AsyncClient(**_pool_options(name))
+    return client
+
+
+def reset_http_clients(close=True):
+    """
+    نسيان كل العملاء المحفوظين.
+    بعد fork لا نغلقها (close=False): المقابس مشتركة مع العملية الأم،
+    وإغلاق TLS من الابن قد يفسد اتصالات الأب.
+    """
+    global _clients, _lock
+    clients, _clients, _lock = _clients, {}, threading.RLock()
+    # العملاء غير المتزامنين يُغلقون مع حلقاتهم، هنا ننساهم فقط
+    _async_clients.clear()
+    if close:
+        for client in clients.values():
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not close HTTP client: {e}")
+
+
+@receiver(setting_changed)
+def _on_setting_changed(setting, **kwargs):
+    if setting.startswith('HTTP_'):
+        reset_http_clients()
@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class BoundedLRU:
+    """
+    كاش LRU داخل العملية (Per-process) بحد أقصى للذاكرة وعمر اختياري لكل عنصر.
+    آمن للاستخدام من عدة خيوط، ويحتفظ بعدادات hit/miss للمراقبة.
+    """
+
+    def __init__(self, max_bytes, ttl=None, max_items=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size):
+        if not self.enabled or size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, expires_at)
+            self._size += size
+            while self._size > self.max_bytes or (self.max_items and len(self._data) > self.max_items):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._size -= size
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'items': len(self._data),
+            'bytes': self._size,
+            'max_bytes': self.max_bytes,
+        }
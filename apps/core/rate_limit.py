@@ -0,0 +1,101 @@
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# محدد المعدل الموزع (Token Bucket في Redis)
+# ==============================================================================
+# دلو واحد مشترك بين كل Workers وعمليات ASGI، سعته وسرعة امتلائه من حصة Azure
+# (عدد الأحرف في الدقيقة). العمل الذي لا يجد رصيداً يُعاد جدولته بـ countdown
+# بدلاً من time.sleep داخل الـ Worker.
+KEY_PREFIX = 'ratelimit'
+# عدد محاولات المعاملة المتفائلة (WATCH) قبل السماح بالطلب تحت التنافس الشديد
+MAX_ATTEMPTS = 5
+
+
+class RateLimited(Exception):
+    """الحصة مستنفدة: أعد المحاولة بعد retry_after ثانية."""
+
+    def __init__(self, retry_after, message="Rate limit reached"):
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f"{message} (retry after {self.retry_after}s)")
+
+
+def get_redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+class TokenBucketLimiter:
+    def __init__(self, name, rate_per_minute, capacity=None):
+        self.key = f"{KEY_PREFIX}:{name}"
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _reserve(self, cost):
+        """يخصم cost من الدلو ويعيد 0، أو يعيد عدد الثواني حتى يتوفر الرصيد."""
+        from redis.exceptions import WatchError
+
+        cost = min(cost, self.capacity)
+        with get_redis().pipeline() as pipe:
+            for _ in range(MAX_ATTEMPTS):
+                try:
+                    pipe.watch(self.key)
+                    state = {k.decode(): float(v) for k, v in pipe.hgetall(self.key).items()}
+                    now = time.time()
+
+                    blocked_until = state.get('blocked_until', 0)
+                    if blocked_until > now:
+                        pipe.unwatch()
+                        return blocked_until - now
+
+                    elapsed = max(0.0, now - state.get('ts', now))
+                    tokens = min(self.capacity, state.get('tokens', self.capacity) + elapsed * self.rate)
+                    wait = 0.0 if tokens >= cost else (cost - tokens) / self.rate
+                    if not wait:
+                        tokens -= cost
+
+                    pipe.multi()
+                    pipe.hset(self.key, mapping={'tokens': tokens, 'ts': now})
+                    pipe.expire(self.key, int(self.capacity / self.rate) + 60)
+                    pipe.execute()
+                    return wait
+                except WatchError:
+                    continue
+        return 0.0
+
+    def acquire(self, cost):
+        """يرفع RateLimited إذا لم يكفِ الرصيد. عند تعطل Redis نسمح بالطلب (Fail-open)."""
+        if not self.enabled:
+            return
+        try:
+            wait = self._reserve(cost)
+        except Exception as e:
+            logger.warning(f"⚠️ Rate limiter unavailable, allowing request: {e}")
+            return
+        if wait > 0:
+            raise RateLimited(wait)
+
+    def block(self, seconds):
+        """عند 429 من Azure: إيقاف كل العمليات حتى انتهاء Retry-After."""
+        if not self.enabled:
+            return
+        try:
+            get_redis().hset(self.key, 'blocked_until', time.time() + seconds)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not record rate limit block: {e}")
+
+
+def get_translator_limiter():
+    return TokenBucketLimiter(
+        'azure-translator',
+        rate_per_minute=getattr(settings, 'AZURE_TRANSLATOR_CHARS_PER_MINUTE', 0),
+        capacity=getattr(settings, 'AZURE_TRANSLATOR_BURST_CHARS', None),
+    )
@@ -1,52 +1,430 @@
-import requests
+import asyncio
+import httpx
+import json
 import logging
+import re
 import uuid
 import time
+from datetime import datetime, timezone as dt_timezone
 from django.conf import settings
 from django.apps import apps
+from django.utils.module_loading import import_string
+from django.core.cache import cache
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from cryptography.fernet import InvalidToken
+
+from apps.chat.encryption import Ciphertext, get_fernet
+from apps.core.http import get_async_http_client, get_http_client
+from apps.core.lru import BoundedLRU
+from apps.core.cache_usage import push_hits, record_hit
+from apps.core.circuit_breaker import get_translator_breaker
+from apps.core.rate_limit import RateLimited, get_redis, get_translator_limiter
 
 logger = logging.getLogger(__name__)
 
 # ==============================================================================
-# 1. Cache Repository (مسؤول عن قاعدة البيانات فقط)
+# 1. Cache Repository (كاش متعدد الطبقات أمام قاعدة البيانات)
 # ==============================================================================
+# الطبقة 1: LRU داخل العملية (نص صريح، عمر قصير)
+# الطبقة 2: Redis مشترك بين العمليات (القيمة مشفرة بـ Fernet)
+# الطبقة 3: جدول TranslationCache (المصدر الدائم)
+# نفس المفتاح في كل الطبقات: (source_hash, src, dest)
+CACHE_TIERS = ('local', 'redis', 'db')
+REDIS_KEY_PREFIX = 'translation'
+# Write-behind: الصفوف الجديدة تنتظر هنا (مشفرة) حتى تُكتب في الجدول دفعة واحدة
+WRITE_BUFFER_KEY = f'{REDIS_KEY_PREFIX}:write_buffer'
+
+_local_cache = None
+_tier_counters = {tier: {'hits': 0, 'misses': 0} for tier in CACHE_TIERS}
+
+
+def get_local_translation_cache():
+    global _local_cache
+    if _local_cache is None:
+        _local_cache = BoundedLRU(
+            max_bytes=getattr(settings, 'TRANSLATION_CACHE_LOCAL_MAX_BYTES', 0),
+            ttl=getattr(settings, 'TRANSLATION_CACHE_LOCAL_TTL', 300),
+        )
+    return _local_cache
+
+
+def reset_translation_cache():
+    """تفريغ الطبقة المحلية والعدادات (للاختبارات أو بعد تعديل الإعدادات)."""
+    global _local_cache
+    _local_cache = None
+    for counters in _tier_counters.values():
+        counters['hits'] = counters['misses'] = 0
+
+
+def get_translation_cache_stats():
+    stats = {}
+    for tier, counters in _tier_counters.items():
+        total = counters['hits'] + counters['misses']
+        stats[tier] = {
+            **counters,
+            'hit_ratio': round(counters['hits'] / total, 4) if total else 0.0,
+        }
+    local = get_local_translation_cache().stats()
+    stats['local'].update(items=local['items'], bytes=local['bytes'])
+    return stats
+
+
+@receiver(setting_changed)
+def _on_setting_changed(setting, **kwargs):
+    if setting.startswith('TRANSLATION_CACHE_'):
+        reset_translation_cache()
+
+
+def _record(tier, hit):
+    _tier_counters[tier]['hits' if hit else 'misses'] += 1
+
+
 class CacheRepository:
     def __init__(self):
         # نجلبه ديناميكياً لتجنب مشاكل الاستيراد الدائري
         self.model = apps.get_model('chat', 'TranslationCache')
 
+    def _redis_key(self, key):
+        return f"{REDIS_KEY_PREFIX}:{key[0]}:{key[1]}:{key[2]}"
+
+    def _remember(self, key, translated_text, redis=True):
+        """نسخ القيمة إلى الطبقات الأسرع."""
+        get_local_translation_cache().set(key, translated_text, len(translated_text.encode('utf-8')) + 96)
+        if redis:
+            try:
+                cache.set(self._redis_key(key), self._redis_token(translated_text), timeout=getattr(settings, 'TRANSLATION_CACHE_REDIS_TTL', None))
+            except Exception as e:
+                logger.warning(f"⚠️ Redis cache write error: {e}")
+
+    def _redis_token(self, translated_text):
+        return get_fernet().encrypt(translated_text.encode('utf-8'))
+
+    def _get_from_redis(self, key):
+        try:
+            token = cache.get(self._redis_key(key))
+            if token is not None:
+                return get_fernet().decrypt(token).decode('utf-8')
+        except InvalidToken:
+            # مفتاح قديم أُزيل من DB_ENCRYPTION_OLD_KEYS: نعامله كـ miss
+            cache.delete(self._redis_key(key))
+        except Exception as e:
+            logger.warning(f"⚠️ Redis cache read error: {e}")
+        return None
+
     def get(self, text, src, dest):
         try:
-            text_hash = self.model.make_hash(text)
+            key = (self.model.make_hash(text), src, dest)
+
+            # 1. ذاكرة العملية (ميكروثوانٍ)
+            local = get_local_translation_cache()
+            if local.enabled:
+                translated = local.get(key)
+                _record('local', translated is not None)
+                if translated is not None:
+                    self._hit(key)
+                    return translated
+
+            # 2. Redis المشترك
+            translated = self._get_from_redis(key)
+            _record('redis', translated is not None)
+            if translated is not None:
+                self._remember(key, translated, redis=False)
+                self._hit(key)
+                return translated
+
+            # 3. قاعدة البيانات
             cached = self.model.objects.filter(
-                source_hash=text_hash,
+                source_hash=key[0],
                 source_language=src,
                 target_language=dest
             ).first()
+            _record('db', cached is not None)
             if cached:
                 logger.info("✅ Cache HIT")
+                self._remember(key, cached.translated_text)
+                self._hit(key)
                 return cached.translated_text
         except Exception as e:
             logger.warning(f"⚠️ Cache read error: {e}")
         return None
 
+    @staticmethod
+    def _hit(key):
+        # عداد في الذاكرة فقط؛ الدفع إلى Redis كل بضع ثوانٍ
+        if record_hit(key):
+            push_hits()
+
+    @staticmethod
+    async def _ahit(key):
+        if record_hit(key):
+            await sync_to_async(push_hits)()
+
     def save(self, text, translated_text, src, dest):
+        self.save_many([(text, translated_text, src, dest)])
+
+    def save_many(self, items):
+        """
+        حفظ عدة ترجمات [(النص، الترجمة، المصدر، الهدف)].
+        الطبقات الأسرع فوراً، والجدول عبر Write-behind (أو مباشرة إذا كان معطلاً).
+        Upsert متساوي الأثر: إذا سبقنا Worker آخر لنفس المفتاح لا نرفع IntegrityError.
+        """
+        try:
+            rows = {}
+            for text, translated_text, src, dest in items:
+                rows[(self.model.make_hash(text), src, dest)] = (text, translated_text)
+            for key, (_, translated_text) in rows.items():
+                self._remember(key, translated_text)
+            if rows and not self._buffer_writes(rows):
+                now = timezone.now()
+                self.model.objects.bulk_create([
+                    self._row(key, text, translated_text, now)
+                    for key, (text, translated_text) in rows.items()
+                ], ignore_conflicts=True, batch_size=500)
+        except Exception as e:
+            logger.error(f"❌ Cache write error: {e}")
+
+    def _row(self, key, source_text, translated_text, last_used_at):
+        return self.model(
+            source_hash=key[0],
+            source_language=key[1],
+            target_language=key[2],
+            source_text=source_text,
+            translated_text=translated_text,
+            last_used_at=last_used_at
+        )
+
+    def _buffer_writes(self, rows):
+        """
+        يضيف الصفوف لقائمة Redis (مشفرة بنفس منطق الحقل) ويعيد True.
+        يعيد False إذا كان Write-behind معطلاً أو Redis غير متاح، فيكتب المستدعي مباشرة.
+        """
+        if not getattr(settings, 'TRANSLATION_CACHE_WRITE_BEHIND', True):
+            return False
+        source_field = self.model._meta.get_field('source_text')
+        translated_field = self.model._meta.get_field('translated_text')
+        now = time.time()
+        entries = [
+            json.dumps({
+                'key': list(key),
+                'source': source_field.raw_to_token(source_field.get_prep_value(text)),
+                'translated': translated_field.raw_to_token(translated_field.get_prep_value(translated_text)),
+                'at': now,
+            })
+            for key, (text, translated_text) in rows.items()
+        ]
+        try:
+            conn = get_redis()
+            size = conn.rpush(WRITE_BUFFER_KEY, *entries)
+            # حد الحجم: تفريغ فوري (مرة واحدة)، وإلا ينتظر مهمة Beat الدورية
+            due = size >= getattr(settings, 'TRANSLATION_CACHE_WRITE_BATCH', 200) and \
+                conn.set(WRITE_BUFFER_KEY + ':scheduled', 1, nx=True, ex=60)
+        except Exception as e:
+            logger.warning(f"⚠️ Write-behind unavailable, writing directly: {e}")
+            return False
+
+        if due:
+            from apps.chat.tasks import flush_translation_cache_writes
+            flush_translation_cache_writes.delay()
+        return True
+
+    def flush_writes(self):
+        """نقل الصفوف المنتظرة إلى الجدول (bulk_create بدون إعادة تشفير). يعيد عدد الصفوف."""
+        batch_size = getattr(settings, 'TRANSLATION_CACHE_WRITE_BATCH', 200)
+        written = 0
         try:
-            text_hash = self.model.make_hash(text)
-            self.model.objects.create(
-                source_hash=text_hash,
+            conn = get_redis()
+            conn.delete(WRITE_BUFFER_KEY + ':scheduled')
+            while True:
+                pipe = conn.pipeline(transaction=True)
+                pipe.lrange(WRITE_BUFFER_KEY, 0, batch_size - 1)
+                pipe.ltrim(WRITE_BUFFER_KEY, batch_size, -1)
+                entries, _ = pipe.execute()
+                if not entries:
+                    break
+
+                objs = []
+                for entry in map(json.loads, entries):
+                    objs.append(self._row(
+                        tuple(entry['key']),
+                        Ciphertext(entry['source']),
+                        Ciphertext(entry['translated']),
+                        datetime.fromtimestamp(entry['at'], tz=dt_timezone.utc),
+                    ))
+                try:
+                    self.model.objects.bulk_create(objs, ignore_conflicts=True, batch_size=500)
+                except Exception:
+                    # نعيدها للقائمة حتى لا تضيع مع فشل قاعدة البيانات
+                    conn.rpush(WRITE_BUFFER_KEY, *entries)
+                    raise
+                written += len(objs)
+                if len(entries) < batch_size:
+                    break
+        except Exception as e:
+            logger.error(f"❌ Write-behind flush error: {e}")
+        if written:
+            logger.info(f"💾 Flushed {written} translation cache rows.")
+        return written
+
+    # --- نسخ غير متزامنة (لـ ChatConsumer) بنفس الطبقات والمفتاح ---
+    async def aget(self, text, src, dest):
+        try:
+            key = (self.model.make_hash(text), src, dest)
+
+            local = get_local_translation_cache()
+            if local.enabled:
+                translated = local.get(key)
+                _record('local', translated is not None)
+                if translated is not None:
+                    await self._ahit(key)
+                    return translated
+
+            translated = None
+            try:
+                token = await cache.aget(self._redis_key(key))
+                if token is not None:
+                    translated = get_fernet().decrypt(token).decode('utf-8')
+            except InvalidToken:
+                await cache.adelete(self._redis_key(key))
+            _record('redis', translated is not None)
+            if translated is not None:
+                self._remember(key, translated, redis=False)
+                await self._ahit(key)
+                return translated
+
+            cached = await self.model.objects.filter(
+                source_hash=key[0],
                 source_language=src,
-                target_language=dest,
-                source_text=text,
-                translated_text=translated_text
+                target_language=dest
+            ).afirst()
+            _record('db', cached is not None)
+            if cached:
+                self._remember(key, cached.translated_text, redis=False)
+                await cache.aset(
+                    self._redis_key(key), self._redis_token(cached.translated_text),
+                    timeout=getattr(settings, 'TRANSLATION_CACHE_REDIS_TTL', None)
+                )
+                await self._ahit(key)
+                return cached.translated_text
+        except Exception as e:
+            logger.warning(f"⚠️ Cache read error: {e}")
+        return None
+
+    async def asave(self, text, translated_text, src, dest):
+        try:
+            key = (self.model.make_hash(text), src, dest)
+            self._remember(key, translated_text, redis=False)
+            await cache.aset(
+                self._redis_key(key), self._redis_token(translated_text),
+                timeout=getattr(settings, 'TRANSLATION_CACHE_REDIS_TTL', None)
+            )
+            if await sync_to_async(self._buffer_writes)({key: (text, translated_text)}):
+                return
+            await self.model.objects.abulk_create(
+                [self._row(key, text, translated_text, timezone.now())], ignore_conflicts=True
             )
         except Exception as e:
             logger.error(f"❌ Cache write error: {e}")
 
 
+# ==============================================================================
+# 1.1 Single-flight (طلب Azure واحد لكل نص عبر كل العمليات)
+# ==============================================================================
+class SingleFlight:
+    """
+    عندما يرسل كثيرون نفس العبارة في نفس اللحظة: أول عملية تأخذ القفل (Redis)
+    وتستدعي Azure، والبقية تنتظر ظهور النتيجة في طبقة Redis من الكاش
+    (نفس مفتاح CacheRepository). إذا اختفى القفل بلا نتيجة يأخذه أحد المنتظرين،
+    وإذا انتهت مهلة الانتظار يترجم المنتظر بنفسه.
+    """
+    POLL_SECONDS = 0.05
+
+    def __init__(self, repository, text, src, dest):
+        self.repository = repository
+        self.key = (repository.model.make_hash(text), src, dest)
+        self.lock_key = f"{REDIS_KEY_PREFIX}:lock:{self.key[0]}:{src}:{dest}"
+        self.lock_seconds = getattr(settings, 'TRANSLATION_SINGLE_FLIGHT_LOCK_SECONDS', 15)
+        self.wait_seconds = getattr(settings, 'TRANSLATION_SINGLE_FLIGHT_WAIT_SECONDS', 2.0)
+        self.acquired = False
+
+    def _try_acquire(self):
+        try:
+            self.acquired = cache.add(self.lock_key, 1, timeout=self.lock_seconds)
+        except Exception as e:
+            logger.warning(f"⚠️ Single-flight lock unavailable: {e}")
+            self.acquired = True  # Fail-open: نترجم بأنفسنا
+        return self.acquired
+
+    def _wait(self):
+        """ينتظر نتيجة القائد. يعيد None إذا أصبحنا القائد أو انتهت المهلة."""
+        deadline = time.monotonic() + self.wait_seconds
+        while time.monotonic() < deadline:
+            time.sleep(self.POLL_SECONDS)
+            result = self.repository._get_from_redis(self.key)
+            if result is not None:
+                return result
+            if cache.get(self.lock_key) is None and self._try_acquire():
+                return None
+        logger.warning("⏳ Single-flight wait timed out, translating directly.")
+        return None
+
+    def run(self, fetch):
+        if not self._try_acquire():
+            shared = self._wait()
+            if shared is not None:
+                logger.info("🤝 Single-flight: reused in-flight translation")
+                self.repository._remember(self.key, shared, redis=False)
+                return shared
+        try:
+            return fetch()
+        finally:
+            if self.acquired:
+                cache.delete(self.lock_key)
+
+    # --- نسخة غير متزامنة (AsyncAzureTranslator): نفس القفل ونفس مفتاح Redis ---
+    async def _atry_acquire(self):
+        try:
+            self.acquired = await cache.aadd(self.lock_key, 1, timeout=self.lock_seconds)
+        except Exception as e:
+            logger.warning(f"⚠️ Single-flight lock unavailable: {e}")
+            self.acquired = True
+        return self.acquired
+
+    async def _await(self):
+        deadline = time.monotonic() + self.wait_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.POLL_SECONDS)
+            result = await sync_to_async(self.repository._get_from_redis)(self.key)
+            if result is not None:
+                return result
+            if await cache.aget(self.lock_key) is None and await self._atry_acquire():
+                return None
+        logger.warning("⏳ Single-flight wait timed out, translating directly.")
+        return None
+
+    async def arun(self, fetch):
+        """fetch دالة async. الانتظار لا يحجب حلقة الأحداث."""
+        if not await self._atry_acquire():
+            shared = await self._await()
+            if shared is not None:
+                logger.info("🤝 Single-flight: reused in-flight translation")
+                self.repository._remember(self.key, shared, redis=False)
+                return shared
+        try:
+            return await fetch()
+        finally:
+            if self.acquired:
+                await cache.adelete(self.lock_key)
+
+
 # ==============================================================================
 # 2. Azure Client (مسؤول عن الاتصال الخارجي فقط)
 # ==============================================================================
+# حد Azure Translator v3 لمجموع الأحرف في الطلب الواحد
+AZURE_MAX_REQUEST_CHARS = 50000
+
 class AzureClient:
     def __init__(self):
         self.api_key = getattr(settings, 'AZURE_TRANSLATOR_KEY', None)
@@ -56,7 +434,7 @@ class AzureClient:
         if self.endpoint and not self.endpoint.endswith('/translate'):
             self.endpoint = f"{self.endpoint.rstrip('/')}/translate"
 
-    def fetch_translation(self, text, src, dest):
+    def _request(self, texts, src, dest):
         if not self.api_key or not self.endpoint:
             raise ValueError("Azure Credentials Missing")
 
@@ -71,27 +449,122 @@ class AzureClient:
             'Content-type': 'application/json',
             'X-ClientTraceId': str(uuid.uuid4())
         }
-        body = [{'text': text}]
+        body = [{'text': text} for text in texts]
+        return {'params': params, 'headers': headers, 'json': body, 'timeout': 5}
 
-        response = requests.post(self.endpoint, params=params, headers=headers, json=body, timeout=5)
-        
+    @staticmethod
+    def _handle(response):
         if response.status_code == 200:
-            data = response.json()
-            if data and len(data) > 0:
-                return data[0]['translations'][0]['text']
-            return None
+            return response.json() or []
         
         # نرفع الخطأ لكي تتعامل معه سياسة إعادة المحاولة
         response.raise_for_status()
 
+    @staticmethod
+    def _cost(texts, dest):
+        """Azure يحسب الأحرف لكل لغة هدف."""
+        targets = len(dest) if isinstance(dest, (list, tuple)) else 1
+        return sum(len(text) for text in texts) * targets
+
+    @staticmethod
+    def _is_outage(error):
+        """أخطاء الشبكة و 5xx تُحسب على قاطع الدائرة (وليس 4xx أو 429)."""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+
+    def _send(self, request):
+        # اتصال مشترك من المجمّع (بدون مصافحة TLS جديدة لكل طلب)
+        return get_http_client('azure-translator').post(self.endpoint, **request)
+
+    async def _asend(self, request):
+        return await get_async_http_client('azure-translator').post(self.endpoint, **request)
+
+    def _post(self, texts, src, dest):
+        request = self._request(texts, src, dest)
+        # أثناء الانقطاع نرفض فوراً (CircuitOpen) بدلاً من انتظار timeout
+        breaker = get_translator_breaker()
+        breaker.before_call()
+        # الحصة المشتركة أولاً: يرفع RateLimited بدلاً من إرسال طلب سيُرفض بـ 429
+        get_translator_limiter().acquire(self._cost(texts, dest))
+        try:
+            result = self._handle(self._send(request))
+        except Exception as e:
+            if self._is_outage(e):
+                breaker.record_failure()
+            raise
+        breaker.record_success()
+        return result
+
+    async def _apost(self, texts, src, dest):
+        request = self._request(texts, src, dest)
+        breaker = get_translator_breaker()
+        await sync_to_async(breaker.before_call)()
+        await sync_to_async(get_translator_limiter().acquire)(self._cost(texts, dest))
+        try:
+            result = self._handle(await self._asend(request))
+        except Exception as e:
+            if self._is_outage(e):
+                await sync_to_async(breaker.record_failure)()
+            raise
+        await sync_to_async(breaker.record_success)()
+        return result
+
+    async def afetch_translation(self, text, src, dest):
+        data = await self._apost([text], src, dest)
+        if data and len(data) > 0:
+            return data[0]['translations'][0]['text']
+        return None
+
+    def fetch_translation(self, text, src, dest):
+        data = self._post([text], src, dest)
+        if data and len(data) > 0:
+            return data[0]['translations'][0]['text']
+        return None
+
+    def fetch_multi(self, text, src, targets):
+        """
+        ترجمة نص واحد إلى عدة لغات في طلب واحد (Azure يقبل عدة قيم لـ to).
+        يعيد قاموساً {اللغة: الترجمة}.
+        """
+        data = self._post([text], src, list(targets)) or []
+        if not data:
+            return {}
+        return {item['to']: item['text'] for item in data[0].get('translations', [])}
+
+    @staticmethod
+    def _batch_results(data, texts):
+        results = [item['translations'][0]['text'] if item.get('translations') else None for item in data]
+        return results + [None] * (len(texts) - len(results))
+
+    def fetch_batch(self, texts, src, dest):
+        """
+        ترجمة عدة نصوص في طلب HTTP واحد (Azure يقبل مصفوفة نصوص).
+        النتائج بنفس ترتيب المدخلات، و None لأي عنصر لم يُترجم.
+        """
+        return self._batch_results(self._post(texts, src, dest) or [], texts)
+
+    async def afetch_batch(self, texts, src, dest):
+        return self._batch_results(await self._apost(texts, src, dest) or [], texts)
+
+
+def get_translation_backend():
+    """
+    الواجهة الخلفية للترجمة من TRANSLATION_BACKEND (مسار الكلاس).
+    أي كلاس يوفر fetch_translation / fetch_multi / fetch_batch / afetch_translation / afetch_batch،
+    مثل AzureClient أو OfflineTranslationBackend لاختبارات الحمل بدون شبكة.
+    """
+    return import_string(getattr(settings, 'TRANSLATION_BACKEND', 'apps.core.services.AzureClient'))()
+
 
 # ==============================================================================
 # 3. Retry Policy (مسؤول عن منطق الصبر وإعادة المحاولة)
 # ==============================================================================
 class RetryPolicy:
-    def __init__(self, max_retries=3, delay_factor=2):
+    def __init__(self, max_retries=3, delay_factor=2, limiter=None):
         self.max_retries = max_retries
         self.delay_factor = delay_factor
+        self.limiter = limiter
 
     def execute(self, func, *args, **kwargs):
         """ينفذ أي دالة ويمرر لها معاملاتها، ويعيد المحاولة عند الفشل"""
@@ -101,19 +574,23 @@ class RetryPolicy:
             try:
                 return func(*args, **kwargs)
             
-            except requests.exceptions.HTTPError as e:
-                # إذا كان الخطأ 429 (Too Many Requests) نعيد المحاولة
+            except httpx.HTTPStatusError as e:
+                # إذا كان الخطأ 429 (Too Many Requests) لا ننام داخل الـ Worker:
+                # نوقف كل العمليات عبر المحدد المشترك ونترك المستدعي يعيد الجدولة
                 if e.response.status_code == 429:
-                    wait_time = (attempt + 1) * self.delay_factor
-                    logger.warning(f"⏳ Rate limited (429). Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                    last_exception = e
-                    continue
+                    try:
+                        wait_time = float(e.response.headers.get('Retry-After', self.delay_factor))
+                    except ValueError:
+                        wait_time = self.delay_factor
+                    logger.warning(f"⏳ Rate limited (429). Rescheduling in {wait_time}s...")
+                    if self.limiter:
+                        self.limiter.block(wait_time)
+                    raise RateLimited(wait_time, "Azure returned 429") from e
                 # أخطاء أخرى (400, 500) لا نعيد المحاولة
                 logger.error(f"❌ HTTP Error: {e}")
                 raise e
 
-            except requests.exceptions.RequestException as e:
+            except httpx.TransportError as e:
                 # مشاكل في الشبكة
                 logger.warning(f"⚠️ Network error (Attempt {attempt+1}): {e}")
                 time.sleep(1)
@@ -127,13 +604,89 @@ class RetryPolicy:
 # ==============================================================================
 # 4. Azure Translator Service (المنسق / الواجهة الرئيسية)
 # ==============================================================================
+class TranslationUnavailable(Exception):
+    """الترجمة فشلت (انقطاع Azure أو دائرة مفتوحة). يُرفع فقط مع raise_on_failure=True."""
+
+
+def unavailable_text(text):
+    return f"{text} (Translation Unavailable)"
+
+
+# ==============================================================================
+# 4.1 ذاكرة الجُمل (Sentence-level Translation Memory)
+# ==============================================================================
+# رسالة تكرر جملة مترجمة سابقاً وتضيف جملة جديدة: نرسل الجملة الجديدة فقط لـ Azure.
+# نهايات الجمل: اللاتينية والعربية (؟) والأمهرية/التغرينية (። ፧) والأردية (۔)
+# يليها فراغ، أو الصينية (。！？) بدون فراغ، أو سطر جديد.
+SENTENCE_BREAK_RE = re.compile(r'((?<=[.!?…؟።፧۔])\s+|(?<=[。！？])\s*|\s*\n\s*)')
+# النقطة بعد اختصار ليست نهاية جملة: "Ring Dr. Hansen nå." جملة واحدة
+ABBREVIATION_RE = re.compile(
+    r'(?:^|[\s(])(?:dr|kl|ca|f\.eks|bl\.a|mr|mrs|ms|prof|nr|tlf|ref|jf|evt|dvs|osv|e\.g|i\.e|[a-z])\.$',
+    re.IGNORECASE
+)
+# لغات تُكتب بدون فراغ بين الجمل
+NO_SPACE_LANGUAGES = {'zh', 'ja'}
+
+
+def _continues_sentence(previous, separator, fragment):
+    """
+    هل الجزء التالي تكملة لنفس الجملة؟ بعد النقطة فقط (وليس سطراً جديداً):
+    اختصار معروف، أو جزء يبدأ بحرف صغير أو رقم ("kl. 14"، "f.eks. hodepine").
+    """
+    if '\n' in separator or not previous.endswith('.'):
+        return False
+    start = fragment.lstrip()[:1]
+    return bool(ABBREVIATION_RE.search(previous)) or start.islower() or start.isdigit()
+
+
+def split_sentences(text):
+    """يعيد (الجمل، الفواصل بينها) بحيث len(الفواصل) == len(الجمل) - 1."""
+    parts = SENTENCE_BREAK_RE.split(text)
+    sentences, separators = [], []
+    for index in range(0, len(parts), 2):
+        sentence = parts[index]
+        if not sentence.strip():
+            continue
+        if sentences:
+            separator = parts[index - 1]
+            if _continues_sentence(sentences[-1], separator, sentence):
+                sentences[-1] += separator + sentence
+                continue
+            separators.append(separator)
+        sentences.append(sentence)
+    return sentences, separators
+
+
+def segment(text):
+    """(الجمل، الفواصل) إذا كانت الرسالة تُترجم جملة جملة (ذاكرة الجمل)، وإلا None."""
+    sentences, separators = split_sentences(text)
+    if len(sentences) > 1 and getattr(settings, 'TRANSLATION_SEGMENTATION', True):
+        return sentences, separators
+    return None
+
+
+def join_sentences(sentences, separators, target_lang):
+    joined = [sentences[0]]
+    for separator, sentence in zip(separators, sentences[1:]):
+        if '\n' not in separator:
+            # "我头疼。我发烧。" -> "I have a headache. I have a fever."
+            separator = '' if target_lang in NO_SPACE_LANGUAGES else (separator or ' ')
+        joined.append(separator)
+        joined.append(sentence)
+    return ''.join(joined)
+
+
 class AzureTranslator:
     def __init__(self):
         self.cache = CacheRepository()
-        self.client = AzureClient()
-        self.retry_policy = RetryPolicy()
+        self.client = get_translation_backend()
+        self.retry_policy = RetryPolicy(limiter=get_translator_limiter())
 
-    def translate(self, text, source_lang, target_lang):
+    def translate(self, text, source_lang, target_lang, raise_on_failure=False):
+        """
+        raise_on_failure=True: عند الفشل نرفع TranslationUnavailable بدلاً من النص البديل،
+        ليسجل المستدعي الرسالة في طابور إعادة الترجمة.
+        """
         # 1. فحوصات سريعة
         if not text: return ""
         if source_lang == target_lang: return text
@@ -144,21 +697,214 @@ class AzureTranslator:
             return cached_result
 
         # 3. الاتصال بـ Azure (عبر سياسة إعادة المحاولة)
+        # طلب واحد فقط عبر كل العمليات لنفس النص (Single-flight)
         try:
-            # نمرر دالة العميل إلى سياسة الإعادة
-            translated_text = self.retry_policy.execute(
-                self.client.fetch_translation, 
-                text, source_lang, target_lang
+            translated_text = SingleFlight(self.cache, text, source_lang, target_lang).run(
+                lambda: self._fetch_and_save(text, source_lang, target_lang)
             )
-            
             if translated_text:
-                # 4. الحفظ في الكاش
-                self.cache.save(text, translated_text, source_lang, target_lang)
                 return translated_text
 
+        except RateLimited:
+            # الحصة مستنفدة: المستدعي (مهمة Celery) يعيد الجدولة بـ countdown
+            raise
         except Exception as e:
             # الفشل الآمن (Graceful Degradation)
             logger.error(f"💀 Translation failed completely: {e}")
-            return f"{text} (Translation Unavailable)"
+            if raise_on_failure:
+                raise TranslationUnavailable(str(e)) from e
+            return unavailable_text(text)
+
+        return text
+
+    def _fetch_and_save(self, text, source_lang, target_lang):
+        segments = segment(text)
+        if segments:
+            # كل جملة من ذاكرة الجمل، والناقصة فقط في طلب Azure واحد
+            sentences, separators = segments
+            translated_text = join_sentences(
+                self.translate_many(sentences, source_lang, target_lang, raise_on_failure=True),
+                separators, target_lang
+            )
+        else:
+            # نمرر دالة العميل إلى سياسة الإعادة
+            translated_text = self.retry_policy.execute(
+                self.client.fetch_translation, 
+                text, source_lang, target_lang
+            )
+        
+        if translated_text:
+            # 4. الحفظ في الكاش
+            self.cache.save(text, translated_text, source_lang, target_lang)
+        return translated_text
+
+    def translate_many(self, texts, source_lang, target_lang, raise_on_failure=False):
+        """
+        ترجمة مجموعة نصوص لنفس زوج اللغات: الكاش لكل نص، ثم طلب Azure واحد
+        لكل دفعة من النصوص الناقصة (بدون تكرار). النتائج بنفس ترتيب المدخلات.
+        """
+        results = [None] * len(texts)
+        pending = {}  # النص -> مواقعه في القائمة
+        for index, text in enumerate(texts):
+            if not text:
+                results[index] = ""
+            elif source_lang == target_lang:
+                results[index] = text
+            else:
+                cached_result = self.cache.get(text, source_lang, target_lang)
+                if cached_result:
+                    results[index] = cached_result
+                else:
+                    pending.setdefault(text, []).append(index)
+
+        try:
+            for chunk in self._chunks(list(pending)):
+                translations = self.retry_policy.execute(
+                    self.client.fetch_batch,
+                    chunk, source_lang, target_lang
+                )
+                self.cache.save_many([
+                    (text, translated_text, source_lang, target_lang)
+                    for text, translated_text in zip(chunk, translations) if translated_text
+                ])
+                for text, translated_text in zip(chunk, translations):
+                    for index in pending[text]:
+                        results[index] = translated_text or text
+
+        except RateLimited:
+            raise
+        except Exception as e:
+            # الفشل الآمن: ما لم يُترجم يبقى بنصه الأصلي مع تنبيه
+            logger.error(f"💀 Batch translation failed ({len(pending)} texts): {e}")
+            if raise_on_failure:
+                raise TranslationUnavailable(str(e)) from e
+            for text, indexes in pending.items():
+                for index in indexes:
+                    if results[index] is None:
+                        results[index] = unavailable_text(text)
+
+        return results
+
+    def translate_to_many(self, text, source_lang, target_langs):
+        """
+        ترجمة نص واحد لكل اللغات المطلوبة: الكاش لكل لغة، ثم طلب Azure واحد
+        (multi-to) لكل اللغات الناقصة. يعيد قاموساً {اللغة: الترجمة}.
+        """
+        results = {}
+        missing = []
+        for target_lang in dict.fromkeys(target_langs):
+            if not text:
+                results[target_lang] = ""
+            elif target_lang == source_lang:
+                results[target_lang] = text
+            else:
+                cached_result = self.cache.get(text, source_lang, target_lang)
+                if cached_result:
+                    results[target_lang] = cached_result
+                else:
+                    missing.append(target_lang)
+
+        if missing:
+            try:
+                translations = self.retry_policy.execute(
+                    self.client.fetch_multi,
+                    text, source_lang, missing
+                )
+                translations = {
+                    target_lang: translated_text
+                    for target_lang, translated_text in translations.items()
+                    if target_lang in missing and translated_text
+                }
+                self.cache.save_many([
+                    (text, translated_text, source_lang, target_lang)
+                    for target_lang, translated_text in translations.items()
+                ])
+                results.update(translations)
+            except RateLimited:
+                raise
+            except Exception as e:
+                logger.error(f"💀 Multi-target translation failed ({', '.join(missing)}): {e}")
+
+            for target_lang in missing:
+                results.setdefault(target_lang, unavailable_text(text))
+
+        return results
+
+    @staticmethod
+    def _chunks(texts):
+        """تقسيم النصوص حسب حدود Azure (عدد العناصر وعدد الأحرف في الطلب الواحد)."""
+        max_items = getattr(settings, 'AZURE_TRANSLATOR_BATCH_MAX_ITEMS', 25)
+        chunk, chunk_chars = [], 0
+        for text in texts:
+            if chunk and (len(chunk) >= max_items or chunk_chars + len(text) > AZURE_MAX_REQUEST_CHARS):
+                yield chunk
+                chunk, chunk_chars = [], 0
+            chunk.append(text)
+            chunk_chars += len(text)
+        if chunk:
+            yield chunk
+
+
+# ==============================================================================
+# 5. Async Azure Translator (للـ ChatConsumer: ترجمة في نفس الدورة بدون Celery)
+# ==============================================================================
+class AsyncAzureTranslator:
+    def __init__(self):
+        self.cache = CacheRepository()
+        self.client = get_translation_backend()
+
+    async def translate(self, text, source_lang, target_lang):
+        """
+        نفس منطق AzureTranslator.translate لكن بدون حجب حلقة الأحداث.
+        لا إعادة محاولة ولا نص بديل: عند أي فشل نعيد None ليكمل Celery المهمة.
+        """
+        if not text: return ""
+        if source_lang == target_lang: return text
+
+        cached_result = await self.cache.aget(text, source_lang, target_lang)
+        if cached_result:
+            return cached_result
+
+        # طلب واحد عبر كل العمليات لنفس النص (نفس قفل AzureTranslator)
+        try:
+            return await SingleFlight(self.cache, text, source_lang, target_lang).arun(
+                lambda: self._fetch_and_save(text, source_lang, target_lang)
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Async translation failed, falling back to Celery: {e}")
+            return None
+
+    async def _fetch_and_save(self, text, source_lang, target_lang):
+        segments = segment(text)
+        if segments:
+            # نفس ذاكرة الجمل في AzureTranslator: الجمل الناقصة فقط إلى Azure
+            sentences, separators = segments
+            translated_text = join_sentences(
+                await self.translate_many(sentences, source_lang, target_lang), separators, target_lang
+            )
+        else:
+            translated_text = await self.client.afetch_translation(text, source_lang, target_lang)
+        if translated_text:
+            await self.cache.asave(text, translated_text, source_lang, target_lang)
+        return translated_text
+
+    async def translate_many(self, texts, source_lang, target_lang):
+        """الكاش لكل نص، ثم طلب Azure واحد لكل دفعة من الناقصة. الفشل يُرفع للمستدعي."""
+        results = [None] * len(texts)
+        pending = {}
+        for index, text in enumerate(texts):
+            cached_result = await self.cache.aget(text, source_lang, target_lang) if text else ""
+            if cached_result is None:
+                pending.setdefault(text, []).append(index)
+            else:
+                results[index] = cached_result
+
+        for chunk in AzureTranslator._chunks(list(pending)):
+            translations = await self.client.afetch_batch(chunk, source_lang, target_lang)
+            for text, translated_text in zip(chunk, translations):
+                if translated_text:
+                    await self.cache.asave(text, translated_text, source_lang, target_lang)
+                for index in pending[text]:
+                    results[index] = translated_text or text
+        return results
 
-        return text
\ No newline at end of file
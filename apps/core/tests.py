@@ -1,3 +1,413 @@
-from django.test import TestCase
+import threading
+import time
+from unittest.mock import patch
+
+from django.test import TestCase, SimpleTestCase, override_settings
+
+import httpx
+from django.core.cache import cache
+
+from .circuit_breaker import CircuitOpen, get_translator_breaker
+from .http import get_client, get_http_client, reset_http_clients
+from .lru import BoundedLRU
+from .rate_limit import RateLimited, TokenBucketLimiter
+from .services import (
+    AzureClient, AzureTranslator, CacheRepository, SingleFlight,
+    get_translation_cache_stats, reset_translation_cache, split_sentences,
+)
 
 # Create your tests here.
+
+
+class BoundedLRUTest(SimpleTestCase):
+    def test_evicts_least_recently_used_when_over_budget(self):
+        lru = BoundedLRU(max_bytes=10)
+        lru.set('a', 'A', 4)
+        lru.set('b', 'B', 4)
+        lru.get('a')            # 'a' أصبح الأحدث استخداماً
+        lru.set('c', 'C', 4)    # يتجاوز الحد -> يُطرد 'b'
+
+        self.assertEqual(lru.get('a'), 'A')
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 'C')
+        self.assertEqual(lru.stats()['evictions'], 1)
+
+    def test_disabled_when_budget_is_zero(self):
+        lru = BoundedLRU(max_bytes=0)
+        lru.set('a', 'A', 1)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.stats()['misses'], 1)
+
+
+class TranslationCacheTiersTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_translation_cache()
+        self.repo = CacheRepository()
+
+    def test_repeat_lookups_skip_the_database(self):
+        self.repo.save("Hei", "مرحبا", "no", "ar")
+        reset_translation_cache()  # عملية جديدة: الطبقة المحلية فارغة
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.repo.get("Hei", "no", "ar"), "مرحبا")   # من Redis
+            self.assertEqual(self.repo.get("Hei", "no", "ar"), "مرحبا")   # من الذاكرة
+
+        stats = get_translation_cache_stats()
+        self.assertEqual(stats['redis']['hits'], 1)
+        self.assertEqual(stats['local']['hits'], 1)
+
+    def test_redis_value_is_encrypted(self):
+        self.repo.save("Hei", "مرحبا", "no", "ar")
+        key = (self.repo.model.make_hash("Hei"), "no", "ar")
+        self.assertNotIn("مرحبا".encode('utf-8'), cache.get(self.repo._redis_key(key)))
+
+    def test_database_hit_backfills_faster_tiers(self):
+        self.repo.save("Takk", "شكرا", "no", "ar")
+        cache.clear()
+        reset_translation_cache()
+
+        self.assertEqual(self.repo.get("Takk", "no", "ar"), "شكرا")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.repo.get("Takk", "no", "ar"), "شكرا")
+        self.assertEqual(get_translation_cache_stats()['db']['hits'], 1)
+
+    def test_legacy_keys_never_match_and_are_rehashed(self):
+        import hashlib
+        from io import StringIO
+        from django.core.management import call_command
+
+        # صف من النظام القديم (lower فقط): "US" كان يطابق "us"
+        legacy_hash = hashlib.sha256("US".strip().lower().encode('utf-8')).hexdigest()
+        self.repo.model.objects.create(
+            source_hash=legacy_hash, source_language="en", target_language="no",
+            source_text="US", translated_text="USA"
+        )
+        self.assertIsNone(self.repo.get("us", "en", "no"))
+        self.assertIsNone(self.repo.get("US", "en", "no"))
+
+        call_command('rehash_translation_cache', stdout=StringIO())
+        reset_translation_cache()
+        cache.clear()
+
+        self.assertEqual(self.repo.get("US", "en", "no"), "USA")
+        self.assertIsNone(self.repo.get("us", "en", "no"))
+
+
+class WriteBehindTest(TestCase):
+    def setUp(self):
+        import fakeredis
+        cache.clear()
+        reset_translation_cache()
+        patcher = patch('apps.core.services.get_redis', return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.repo = CacheRepository()
+
+    def test_save_skips_database_until_flush(self):
+        with self.assertNumQueries(0):
+            self.repo.save("Hei", "مرحبا", "no", "ar")
+            self.repo.save("Hei", "مرحبا", "no", "ar")  # مكرر: لا يكلف رحلة لقاعدة البيانات
+            self.assertEqual(self.repo.get("Hei", "no", "ar"), "مرحبا")
+
+        self.assertEqual(self.repo.flush_writes(), 2)
+        rows = self.repo.model.objects.all()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].source_text, "Hei")
+        self.assertEqual(rows[0].translated_text, "مرحبا")
+        self.assertIsNotNone(rows[0].last_used_at)
+        self.assertEqual(self.repo.flush_writes(), 0)
+
+    @override_settings(TRANSLATION_CACHE_WRITE_BATCH=2)
+    @patch('apps.chat.tasks.flush_translation_cache_writes.delay')
+    def test_size_threshold_schedules_one_flush(self, mock_delay):
+        self.repo.save_many([(t, t.upper(), "en", "no") for t in ("a", "b", "c")])
+        self.repo.save("d", "D", "en", "no")
+        mock_delay.assert_called_once()
+
+        self.assertEqual(self.repo.flush_writes(), 4)
+        self.assertEqual(self.repo.model.objects.count(), 4)
+
+    @override_settings(TRANSLATION_CACHE_WRITE_BEHIND=False)
+    def test_disabled_writes_directly(self):
+        self.repo.save("Hei", "مرحبا", "no", "ar")
+        self.assertEqual(self.repo.model.objects.count(), 1)
+
+
+class SingleFlightTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_translation_cache()
+
+    @patch('apps.core.services.AzureClient.fetch_translation')
+    def test_waiter_reuses_in_flight_translation(self, mock_fetch):
+        translator = AzureTranslator()
+        flight = SingleFlight(translator.cache, "Hvor er klinikken?", "no", "ar")
+        cache.add(flight.lock_key, 1)  # Worker آخر يترجم نفس النص الآن
+
+        def leader_finishes():
+            time.sleep(0.2)
+            translator.cache._remember(flight.key, "أين العيادة؟")
+            cache.delete(flight.lock_key)
+
+        leader = threading.Thread(target=leader_finishes)
+        leader.start()
+        result = translator.translate("Hvor er klinikken?", "no", "ar")
+        leader.join()
+
+        self.assertEqual(result, "أين العيادة؟")
+        mock_fetch.assert_not_called()
+
+    @patch('apps.core.services.AzureClient.afetch_translation')
+    def test_async_waiter_reuses_in_flight_translation(self, mock_afetch):
+        from asgiref.sync import async_to_sync
+        from .services import AsyncAzureTranslator
+
+        translator = AsyncAzureTranslator()
+        flight = SingleFlight(translator.cache, "Hvor er klinikken?", "no", "ar")
+        cache.add(flight.lock_key, 1)  # Worker آخر يترجم نفس النص الآن
+
+        def leader_finishes():
+            time.sleep(0.2)
+            translator.cache._remember(flight.key, "أين العيادة؟")
+            cache.delete(flight.lock_key)
+
+        leader = threading.Thread(target=leader_finishes)
+        leader.start()
+        result = async_to_sync(translator.translate)("Hvor er klinikken?", "no", "ar")
+        leader.join()
+
+        self.assertEqual(result, "أين العيادة؟")
+        mock_afetch.assert_not_called()
+
+    @patch('apps.core.services.AzureClient.fetch_translation', return_value="مرحبا")
+    def test_leader_releases_lock_after_fetch(self, mock_fetch):
+        AzureTranslator().translate("Hei", "no", "ar")
+        flight = SingleFlight(CacheRepository(), "Hei", "no", "ar")
+        self.assertIsNone(cache.get(flight.lock_key))
+        mock_fetch.assert_called_once()
+
+    def test_concurrent_saves_are_idempotent(self):
+        repo = CacheRepository()
+        repo.save("Hei", "مرحبا", "no", "ar")
+        repo.save("Hei", "مرحبا", "no", "ar")  # Worker ثانٍ خسر السباق
+        self.assertEqual(repo.model.objects.filter(source_language="no", target_language="ar").count(), 1)
+
+
+class CacheKeyNormalizationTest(SimpleTestCase):
+    def test_default_pipeline_is_case_preserving(self):
+        from .text_normalization import normalize_key
+        self.assertEqual(normalize_key("  Jeg  har\tvondt!!  "), "Jeg har vondt!")
+        self.assertEqual(normalize_key("ＨＥＬＰ？？"), "HELP?")  # NFKC: حروف كاملة العرض
+        self.assertNotEqual(normalize_key("US"), normalize_key("us"))
+
+    @override_settings(TRANSLATION_CACHE_KEY_NORMALIZERS=['emoji', 'strip', 'casefold'])
+    def test_pipeline_is_configurable(self):
+        from .text_normalization import normalize_key
+        self.assertEqual(normalize_key("Takk 🙏 "), "takk")
+
+
+class SentenceMemoryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_translation_cache()
+
+    def test_split_keeps_separators_across_scripts(self):
+        self.assertEqual(split_sentences("Hei. Jeg har feber!\nHjelp"), (["Hei.", "Jeg har feber!", "Hjelp"], [" ", "\n"]))
+        self.assertEqual(split_sentences("我头疼。我发烧。"), (["我头疼。", "我发烧。"], [""]))
+        self.assertEqual(split_sentences("عندي صداع؟ وحمى"), (["عندي صداع؟", "وحمى"], [" "]))
+        self.assertEqual(split_sentences("Pris 3.5 kr"), (["Pris 3.5 kr"], []))
+
+    def test_split_does_not_break_after_abbreviations(self):
+        self.assertEqual(split_sentences("Ring Dr. Hansen nå."), (["Ring Dr. Hansen nå."], []))
+        self.assertEqual(split_sentences("Kom kl. 14 i dag. Takk!"), (["Kom kl. 14 i dag.", "Takk!"], [" "]))
+        self.assertEqual(split_sentences("Jeg har f.eks. hodepine"), (["Jeg har f.eks. hodepine"], []))
+        self.assertEqual(split_sentences("Feber ca. 39 grader."), (["Feber ca. 39 grader."], []))
+        # نهاية جملة حقيقية قبل نص عربي ما زالت فاصلاً
+        self.assertEqual(split_sentences("Hei. مرحبا"), (["Hei.", "مرحبا"], [" "]))
+
+    @patch('apps.core.services.AzureClient.fetch_translation')
+    @patch('apps.core.services.AzureClient.fetch_batch')
+    def test_only_new_sentences_go_to_azure(self, mock_fetch_batch, mock_fetch_translation):
+        mock_fetch_batch.side_effect = lambda texts, src, dest: [f"<{t}>" for t in texts]
+        translator = AzureTranslator()
+        translator.cache.save("I have a fever.", "Jeg har feber.", "en", "no")
+
+        result = translator.translate("I have a fever. My child is sick!", "en", "no")
+
+        self.assertEqual(result, "Jeg har feber. <My child is sick!>")
+        mock_fetch_batch.assert_called_once_with(["My child is sick!"], "en", "no")
+        mock_fetch_translation.assert_not_called()
+        # الرسالة كاملة أيضاً في الكاش
+        self.assertEqual(translator.cache.get("I have a fever. My child is sick!", "en", "no"), result)
+
+    @patch('apps.core.services.AzureClient.afetch_translation')
+    @patch('apps.core.services.AzureClient.afetch_batch')
+    def test_async_translator_reuses_sentence_memory(self, mock_afetch_batch, mock_afetch_translation):
+        from asgiref.sync import async_to_sync
+        from .services import AsyncAzureTranslator
+
+        mock_afetch_batch.side_effect = lambda texts, src, dest: [f"<{t}>" for t in texts]
+        AzureTranslator().cache.save("I have a fever.", "Jeg har feber.", "en", "no")
+
+        result = async_to_sync(AsyncAzureTranslator().translate)("I have a fever. My child is sick!", "en", "no")
+
+        self.assertEqual(result, "Jeg har feber. <My child is sick!>")
+        mock_afetch_batch.assert_called_once_with(["My child is sick!"], "en", "no")
+        mock_afetch_translation.assert_not_called()
+
+    @override_settings(TRANSLATION_SEGMENTATION=False)
+    @patch('apps.core.services.AzureClient.fetch_translation', return_value="Hei. Ha det.")
+    def test_segmentation_can_be_disabled(self, mock_fetch):
+        self.assertEqual(AzureTranslator().translate("Hi. Bye.", "en", "no"), "Hei. Ha det.")
+        mock_fetch.assert_called_once()
+
+
+class TranslateManyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_translation_cache()
+
+    @override_settings(AZURE_TRANSLATOR_BATCH_MAX_ITEMS=2)
+    @patch('apps.core.services.AzureClient.fetch_batch')
+    def test_deduplicates_and_chunks_requests(self, mock_fetch_batch):
+        mock_fetch_batch.side_effect = lambda texts, src, dest: [t.upper() for t in texts]
+        translator = AzureTranslator()
+
+        result = translator.translate_many(["a", "b", "a", "", "c"], "en", "no")
+
+        self.assertEqual(result, ["A", "B", "A", "", "C"])
+        self.assertEqual([c.args[0] for c in mock_fetch_batch.call_args_list], [["a", "b"], ["c"]])
+
+        # المرة الثانية من الكاش بالكامل
+        mock_fetch_batch.reset_mock()
+        self.assertEqual(translator.translate_many(["a", "c"], "en", "no"), ["A", "C"])
+        mock_fetch_batch.assert_not_called()
+
+
+class HttpClientRegistryTest(SimpleTestCase):
+    def tearDown(self):
+        reset_http_clients()
+
+    @override_settings(HTTP_CLIENT_POOLS={'azure-translator': {'max_connections': 3, 'max_keepalive_connections': 2}})
+    def test_one_pooled_client_per_process(self):
+        client = get_http_client('azure-translator')
+        self.assertIs(get_http_client('azure-translator'), client)
+        self.assertIsNot(get_http_client('azure-openai'), client)
+
+        # مصنع يطلب عميلاً آخر (مثل AzureOpenAI فوق httpx) لا يسبب Deadlock
+        sdk = get_client('sdk', lambda: ('sdk', get_http_client('azure-openai')))
+        self.assertIs(sdk[1], get_http_client('azure-openai'))
+
+        reset_http_clients()
+        self.assertTrue(client.is_closed)
+        self.assertIsNot(get_http_client('azure-translator'), client)
+
+    @override_settings(AZURE_TRANSLATOR_KEY='key', AZURE_TRANSLATOR_ENDPOINT='https://translator.test')
+    def test_multi_target_request_uses_pooled_client(self):
+        def handler(request):
+            self.assertEqual(request.url.params.get_list('to'), ['ar', 'uk'])
+            return httpx.Response(200, json=[{'translations': [
+                {'to': 'ar', 'text': 'مرحبا'}, {'to': 'uk', 'text': 'Привіт'},
+            ]}])
+
+        pooled = httpx.Client(transport=httpx.MockTransport(handler))
+        with patch('apps.core.services.get_http_client', return_value=pooled):
+            result = AzureClient().fetch_multi("Hei", "no", ["ar", "uk"])
+        self.assertEqual(result, {'ar': 'مرحبا', 'uk': 'Привіт'})
+
+
+class TokenBucketLimiterTest(SimpleTestCase):
+    def setUp(self):
+        import fakeredis
+        patcher = patch('apps.core.rate_limit.get_redis', return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_shared_bucket_reschedules_instead_of_sleeping(self):
+        limiter = TokenBucketLimiter('test', rate_per_minute=120)
+        limiter.acquire(100)
+
+        # عملية أخرى (كائن جديد) ترى نفس الرصيد في Redis
+        with self.assertRaises(RateLimited) as ctx:
+            TokenBucketLimiter('test', rate_per_minute=120).acquire(100)
+        # ينقص 80 حرفاً بمعدل 2 حرف/ثانية
+        self.assertAlmostEqual(ctx.exception.retry_after, 40, delta=1)
+
+    def test_block_after_429_stops_every_caller(self):
+        limiter = TokenBucketLimiter('test-block', rate_per_minute=6000)
+        limiter.block(30)
+        with self.assertRaises(RateLimited) as ctx:
+            limiter.acquire(1)
+        self.assertGreaterEqual(ctx.exception.retry_after, 29)
+
+
+@override_settings(
+    AZURE_TRANSLATOR_KEY='key', AZURE_TRANSLATOR_ENDPOINT='https://translator.test',
+    AZURE_TRANSLATOR_CHARS_PER_MINUTE=0, AZURE_CIRCUIT_MIN_CALLS=3, AZURE_CIRCUIT_OPEN_SECONDS=30,
+)
+class CircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.requests = 0
+
+    def handler(self, request):
+        self.requests += 1
+        return httpx.Response(503)
+
+    def test_fails_fast_after_error_rate_threshold(self):
+        client = httpx.Client(transport=httpx.MockTransport(self.handler))
+        with patch('apps.core.services.get_http_client', return_value=client):
+            for _ in range(3):
+                with self.assertRaises(httpx.HTTPStatusError):
+                    AzureClient().fetch_translation("Hei", "no", "ar")
+            # الدائرة مفتوحة: لا طلب HTTP إضافي
+            with self.assertRaises(CircuitOpen):
+                AzureClient().fetch_translation("Hei", "no", "ar")
+        self.assertEqual(self.requests, 3)
+
+    def test_successful_probe_closes_the_circuit(self):
+        breaker = get_translator_breaker()
+        breaker.trip()
+        cache.delete(breaker._key('open'))  # انتهت مدة الفتح
+
+        breaker.before_call()               # الطلب التجريبي يمر
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()           # وغيره يُرفض حتى تظهر نتيجته
+        breaker.record_success()
+        breaker.before_call()
+
+
+@override_settings(
+    TRANSLATION_BACKEND='apps.core.translation_backends.OfflineTranslationBackend',
+    TRANSLATION_OFFLINE_LATENCY_MS=0, TRANSLATION_OFFLINE_JITTER_MS=0,
+    AZURE_TRANSLATOR_CHARS_PER_MINUTE=0, TRANSLATION_SEGMENTATION=False,
+)
+class OfflineTranslationBackendTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_translation_cache()
+
+    def test_deterministic_translation_without_network(self):
+        translator = AzureTranslator()
+        self.assertEqual(translator.translate("Hei", "no", "ar"), "[ar] Hei")
+        self.assertEqual(translator.translate_many(["a", "b"], "en", "no"), ["[no] a", "[no] b"])
+        self.assertEqual(translator.translate_to_many("Hi", "en", ["ar", "uk"]), {"ar": "[ar] Hi", "uk": "[uk] Hi"})
+
+    def test_async_translation(self):
+        from asgiref.sync import async_to_sync
+        from .services import AsyncAzureTranslator
+        self.assertEqual(async_to_sync(AsyncAzureTranslator().translate)("Hei", "no", "uk"), "[uk] Hei")
+
+    @override_settings(TRANSLATION_OFFLINE_429_RATE=1.0, TRANSLATION_OFFLINE_RETRY_AFTER=7)
+    def test_injected_429_reschedules(self):
+        with self.assertRaises(RateLimited) as ctx:
+            AzureTranslator().translate("Hei", "no", "ar")
+        self.assertEqual(ctx.exception.retry_after, 7)
+
+    @override_settings(TRANSLATION_OFFLINE_ERROR_RATE=1.0, AZURE_CIRCUIT_MIN_CALLS=2)
+    def test_injected_errors_trip_the_circuit(self):
+        translator = AzureTranslator()
+        for text in ("a", "b"):
+            self.assertEqual(translator.translate(text, "en", "no"), f"{text} (Translation Unavailable)")
+        self.assertTrue(get_translator_breaker().is_open())
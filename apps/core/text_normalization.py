@@ -0,0 +1,57 @@
+import re
+import unicodedata
+
+from django.conf import settings
+
+# ==============================================================================
+# تطبيع نص مفتاح الكاش (Cache Key Normalization)
+# ==============================================================================
+# المفتاح فقط يُطبَّع؛ النص الأصلي هو ما يُرسل لـ Azure ويُخزن ويُعرض.
+# الخطوات تُطبق بالترتيب المحدد في TRANSLATION_CACHE_KEY_NORMALIZERS.
+# الحالة (Case) محفوظة افتراضياً: "US" و "us" ترجمتان مختلفتان.
+WHITESPACE_RE = re.compile(r'\s+')
+# "!!!" -> "!" و "؟؟" -> "؟" (النقاط الثلاث تبقى كما هي)
+REPEATED_PUNCTUATION_RE = re.compile(r'([!?؟！？,،])\1+')
+EMOJI_RE = re.compile(
+    '[\U0001F000-\U0001FAFF\U00002600-\U000027BF\U0000FE0F\U0000200D\U0001F3FB-\U0001F3FF]+'
+)
+
+NORMALIZERS = {
+    'strip': str.strip,
+    'nfkc': lambda text: unicodedata.normalize('NFKC', text),
+    'whitespace': lambda text: WHITESPACE_RE.sub(' ', text),
+    'repeated_punctuation': lambda text: REPEATED_PUNCTUATION_RE.sub(r'\1', text),
+    'emoji': lambda text: EMOJI_RE.sub('', text),
+    'lower': str.lower,
+    'casefold': str.casefold,
+}
+
+DEFAULT_PIPELINE = ['nfkc', 'whitespace', 'repeated_punctuation', 'strip']
+
+# مجموعات للمقارنة في أمر translation_key_report
+PRESETS = {
+    'exact': [],
+    'legacy': ['strip', 'lower'],
+    'default': DEFAULT_PIPELINE,
+    'default+emoji': ['emoji'] + DEFAULT_PIPELINE,
+    'default+casefold': DEFAULT_PIPELINE + ['casefold'],
+}
+
+
+def get_pipeline():
+    return getattr(settings, 'TRANSLATION_CACHE_KEY_NORMALIZERS', DEFAULT_PIPELINE)
+
+
+def key_scheme(pipeline=None):
+    """
+    بادئة تدخل في بصمة المفتاح: صفوف النظام القديم (lower فقط، بلا بادئة) أو صفوف
+    خط تطبيع آخر لا يمكن أن تطابق مفتاحاً جديداً. rehash_translation_cache ينقلها.
+    """
+    return 'v2:' + ','.join(get_pipeline() if pipeline is None else pipeline)
+
+
+def normalize_key(text, pipeline=None):
+    """النص القانوني (Canonical) الذي يُحسب منه مفتاح الكاش."""
+    for step in (get_pipeline() if pipeline is None else pipeline):
+        text = NORMALIZERS[step](text)
+    return text
@@ -0,0 +1,96 @@
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from apps.core.services import AzureClient
+
+# ==============================================================================
+# واجهة ترجمة بدون شبكة (لاختبارات الحمل والـ Benchmarks)
+# ==============================================================================
+# TRANSLATION_BACKEND = 'apps.core.translation_backends.OfflineTranslationBackend'
+# نفس مسار AzureClient بالكامل (المحدد المشترك، قاطع الدائرة، تحليل الرد، RetryPolicy)،
+# فقط الطلب HTTP يُستبدل برد مُصنَّع بعد زمن مشابه لـ Azure:
+# - الترجمة حتمية: "[ar] النص" (نفس المدخل = نفس المخرج)
+# - زمن الرد: TRANSLATION_OFFLINE_LATENCY_MS ± TRANSLATION_OFFLINE_JITTER_MS
+# - TRANSLATION_OFFLINE_ERROR_RATE: نسبة الردود 503 (تُحسب على قاطع الدائرة)
+# - TRANSLATION_OFFLINE_429_RATE: نسبة الردود 429 مع Retry-After
+# TRANSLATION_OFFLINE_SEED يجعل تسلسل الأخطاء والزمن قابلاً للإعادة.
+OFFLINE_ENDPOINT = 'https://offline.translator.invalid/translate'
+
+_rng = None
+_rng_lock = threading.Lock()
+
+
+def _random():
+    global _rng
+    if _rng is None:
+        _rng = random.Random(getattr(settings, 'TRANSLATION_OFFLINE_SEED', None))
+    return _rng
+
+
+@receiver(setting_changed)
+def _on_setting_changed(setting, **kwargs):
+    global _rng
+    if setting.startswith('TRANSLATION_OFFLINE_'):
+        _rng = None
+
+
+class OfflineTranslationBackend(AzureClient):
+    def __init__(self):
+        super().__init__()
+        self.endpoint = OFFLINE_ENDPOINT
+
+    @staticmethod
+    def translate_text(text, dest):
+        return f"[{dest}] {text}"
+
+    def _request(self, texts, src, dest):
+        # بدون مفاتيح Azure: نفس شكل الطلب ليبقى _cost والتحليل كما هما
+        return {'json': [{'text': text} for text in texts], 'params': {'from': src, 'to': dest}}
+
+    def _plan(self):
+        """يعيد (زمن الانتظار بالثواني، رمز الحالة) لهذا الطلب."""
+        latency = getattr(settings, 'TRANSLATION_OFFLINE_LATENCY_MS', 120)
+        jitter = getattr(settings, 'TRANSLATION_OFFLINE_JITTER_MS', 40)
+        with _rng_lock:
+            rng = _random()
+            delay = max(0.0, latency + rng.uniform(-jitter, jitter)) / 1000
+            roll = rng.random()
+        rate_limited = getattr(settings, 'TRANSLATION_OFFLINE_429_RATE', 0.0)
+        if roll < rate_limited:
+            return delay, 429
+        if roll < rate_limited + getattr(settings, 'TRANSLATION_OFFLINE_ERROR_RATE', 0.0):
+            return delay, 503
+        return delay, 200
+
+    def _response(self, request, status):
+        http_request = httpx.Request('POST', self.endpoint, params=request['params'])
+        if status == 429:
+            retry_after = str(getattr(settings, 'TRANSLATION_OFFLINE_RETRY_AFTER', 1))
+            return httpx.Response(429, headers={'Retry-After': retry_after}, request=http_request)
+        if status != 200:
+            return httpx.Response(status, request=http_request)
+
+        targets = request['params']['to']
+        targets = targets if isinstance(targets, (list, tuple)) else [targets]
+        body = [
+            {'translations': [{'to': dest, 'text': self.translate_text(item['text'], dest)} for dest in targets]}
+            for item in request['json']
+        ]
+        return httpx.Response(200, json=body, request=http_request)
+
+    def _send(self, request):
+        delay, status = self._plan()
+        time.sleep(delay)
+        return self._response(request, status)
+
+    async def _asend(self, request):
+        delay, status = self._plan()
+        await asyncio.sleep(delay)
+        return self._response(request, status)
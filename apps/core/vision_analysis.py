@@ -5,6 +5,7 @@ import os
 from openai import AzureOpenAI
 from django.conf import settings
 from django.core.files import File as DjangoFile # ضروري لحفظ ملف الصورة
+from apps.core.http import get_client, get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -14,11 +15,13 @@ class MedicalImageAnalyzer:
         self.endpoint = getattr(settings, 'AZURE_OPENAI_ENDPOINT', None)
         
         if self.api_key and self.endpoint:
-            self.client = AzureOpenAI(
+            # عميل واحد لكل عملية فوق مجمّع اتصالات httpx المشترك
+            self.client = get_client('azure-openai-sdk', lambda: AzureOpenAI(
                 api_key=self.api_key,  
                 api_version="2024-02-15-preview", 
-                azure_endpoint=self.endpoint
-            )
+                azure_endpoint=self.endpoint,
+                http_client=get_http_client('azure-openai'),
+            ))
         else:
             self.client = None
             
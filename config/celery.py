@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 # ضبط متغيرات بيئة جانغو
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -10,4 +11,14 @@ app = Celery('config')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # اكتشاف المهام تلقائياً في التطبيقات (tasks.py)
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+# بعد fork لكل Worker (prefork) نبدأ بمجمّعات اتصالات جديدة بدلاً من مقابس الأب
+@worker_process_init.connect
+def reset_http_clients_after_fork(**kwargs):
+    from apps.core.http import reset_http_clients
+    from apps.chat.encryption import reset_decrypt_executor
+    reset_http_clients(close=False)
+    # مجمّع فك التشفير الموروث من الأب ميت في الابن
+    reset_decrypt_executor(shutdown=False)
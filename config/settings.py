@@ -24,6 +24,24 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DEBUG = env.bool('DJANGO_DEBUG', False)
 SECRET_KEY = env('DJANGO_SECRET_KEY')
 DB_ENCRYPTION_KEY = env('DB_ENCRYPTION_KEY')
+# مفاتيح سابقة مقبولة للقراءة فقط أثناء تدوير المفتاح (python manage.py rotate_encryption_key)
+DB_ENCRYPTION_OLD_KEYS = env.list('DB_ENCRYPTION_OLD_KEYS', default=[])
+# مفتاح HMAC للفهرس الأعمى: إلزامي ومستقل عن مفتاح Fernet (لا نعيد استخدام مفتاح التشفير لغرض آخر)
+# لا يُدوَّر مع DB_ENCRYPTION_KEY: تغييره يُبطل كل البصمات ويتطلب rebuild_search_index
+DB_BLIND_INDEX_KEY = env('DB_BLIND_INDEX_KEY')
+# فك تشفير الحقول عند أول قراءة فقط (بدلاً من فك كل الأعمدة عند التحميل)
+DB_ENCRYPTION_LAZY = env.bool('DB_ENCRYPTION_LAZY', True)
+# ضغط النصوص الطويلة (zlib) قبل التشفير: الحد بالبايت (0 = بدون ضغط)
+DB_ENCRYPTION_COMPRESS_THRESHOLD = env.int('DB_ENCRYPTION_COMPRESS_THRESHOLD', 512)
+DB_ENCRYPTION_COMPRESS_LEVEL = env.int('DB_ENCRYPTION_COMPRESS_LEVEL', 6)
+# فك التشفير الجماعي عبر QuerySet.decrypted() (عدد الخيوط/العمليات وحجم الدفعة)
+DB_DECRYPT_WORKERS = env.int('DB_DECRYPT_WORKERS', 4)
+DB_DECRYPT_CHUNK_SIZE = env.int('DB_DECRYPT_CHUNK_SIZE', 500)
+DB_DECRYPT_USE_PROCESSES = env.bool('DB_DECRYPT_USE_PROCESSES', False)
+# كاش LRU للنصوص المفكوكة داخل كل عملية، بالبايت (0 = معطل، الافتراضي)
+# تفعيله يبقي نصوصاً طبية صريحة في ذاكرة العملية حتى DB_DECRYPT_CACHE_TTL: اختيار صريح فقط
+DB_DECRYPT_CACHE_MAX_BYTES = env.int('DB_DECRYPT_CACHE_MAX_BYTES', 0)
+DB_DECRYPT_CACHE_TTL = env.int('DB_DECRYPT_CACHE_TTL', 300)
 
 # السماح بالدومينات (بما فيها IP الشبكة المحلية للهاتف)
 ALLOWED_HOSTS = env.list('DJANGO_ALLOWED_HOSTS', default=['localhost', '127.0.0.1', '*'])
@@ -148,14 +166,107 @@ AXES_CLIENT_IP_CALLABLE = 'apps.core.utils.get_client_ip'
 # ==============================================================================
 # 🧠 AI SERVICES
 # ==============================================================================
-AZURE_TRANSLATOR_KEY = env('AZURE_TRANSLATOR_KEY')
-AZURE_TRANSLATOR_ENDPOINT = env('AZURE_TRANSLATOR_ENDPOINT')
-AZURE_TRANSLATOR_REGION = env('AZURE_TRANSLATOR_REGION')
+# واجهة الترجمة (مسار الكلاس). لاختبارات الحمل بدون شبكة:
+# TRANSLATION_BACKEND=apps.core.translation_backends.OfflineTranslationBackend
+TRANSLATION_BACKEND = env('TRANSLATION_BACKEND', default='apps.core.services.AzureClient')
+
+# مفاتيح Azure إلزامية (يفشل التشغيل بدونها)، إلا مع واجهة غير Azure مثل Offline
+_AZURE_TRANSLATOR_DEFAULT = environ.Env.NOTSET if TRANSLATION_BACKEND == 'apps.core.services.AzureClient' else ''
+AZURE_TRANSLATOR_KEY = env('AZURE_TRANSLATOR_KEY', default=_AZURE_TRANSLATOR_DEFAULT)
+AZURE_TRANSLATOR_ENDPOINT = env('AZURE_TRANSLATOR_ENDPOINT', default=_AZURE_TRANSLATOR_DEFAULT)
+AZURE_TRANSLATOR_REGION = env('AZURE_TRANSLATOR_REGION', default=_AZURE_TRANSLATOR_DEFAULT)
+# الواجهة Offline: زمن الرد (ms) وتذبذبه، ونسبة أخطاء 503 و 429، والبذرة (للتكرار)
+TRANSLATION_OFFLINE_LATENCY_MS = env.int('TRANSLATION_OFFLINE_LATENCY_MS', 120)
+TRANSLATION_OFFLINE_JITTER_MS = env.int('TRANSLATION_OFFLINE_JITTER_MS', 40)
+TRANSLATION_OFFLINE_ERROR_RATE = env.float('TRANSLATION_OFFLINE_ERROR_RATE', 0.0)
+TRANSLATION_OFFLINE_429_RATE = env.float('TRANSLATION_OFFLINE_429_RATE', 0.0)
+TRANSLATION_OFFLINE_RETRY_AFTER = env.int('TRANSLATION_OFFLINE_RETRY_AFTER', 1)
+TRANSLATION_OFFLINE_SEED = env.int('TRANSLATION_OFFLINE_SEED', default=None)
+
+# كاش الترجمة متعدد الطبقات: ذاكرة العملية (LRU) ← Redis (مشفر) ← جدول TranslationCache
+TRANSLATION_CACHE_LOCAL_MAX_BYTES = env.int('TRANSLATION_CACHE_LOCAL_MAX_BYTES', 4 * 1024 * 1024)
+TRANSLATION_CACHE_LOCAL_TTL = env.int('TRANSLATION_CACHE_LOCAL_TTL', 300)
+TRANSLATION_CACHE_REDIS_TTL = env.int('TRANSLATION_CACHE_REDIS_TTL', 7 * 24 * 3600)
+
+# Single-flight: عملية واحدة تترجم النص المتكرر والبقية تنتظر نتيجتها (بالثواني)
+TRANSLATION_SINGLE_FLIGHT_LOCK_SECONDS = env.int('TRANSLATION_SINGLE_FLIGHT_LOCK_SECONDS', 15)
+TRANSLATION_SINGLE_FLIGHT_WAIT_SECONDS = env.float('TRANSLATION_SINGLE_FLIGHT_WAIT_SECONDS', 2.0)
+
+# خطوات تطبيع مفتاح الكاش بالترتيب (انظر apps/core/text_normalization.py)
+# الحالة محفوظة افتراضياً؛ قارن البدائل بـ: python manage.py translation_key_report
+# الخط جزء من بصمة المفتاح: بعد تغييره (أو الترقية من المفاتيح القديمة) شغّل python manage.py rehash_translation_cache
+TRANSLATION_CACHE_KEY_NORMALIZERS = env.list(
+    'TRANSLATION_CACHE_KEY_NORMALIZERS', default=['nfkc', 'whitespace', 'repeated_punctuation', 'strip']
+)
+
+# ذاكرة الجمل: تقسيم الرسالة وترجمة الجمل غير المخزنة فقط
+TRANSLATION_SEGMENTATION = env.bool('TRANSLATION_SEGMENTATION', True)
+
+# Write-behind: الترجمات الجديدة تُكتب في الجدول دفعة واحدة (كل دقيقة أو عند بلوغ الحجم)
+TRANSLATION_CACHE_WRITE_BEHIND = env.bool('TRANSLATION_CACHE_WRITE_BEHIND', True)
+TRANSLATION_CACHE_WRITE_BATCH = env.int('TRANSLATION_CACHE_WRITE_BATCH', 200)
+
+# حساب الإصابات: كل عملية تدفع عداداتها إلى Redis كل N ثانية (ثم مهمة Celery للجدول)
+TRANSLATION_HIT_PUSH_SECONDS = env.int('TRANSLATION_HIT_PUSH_SECONDS', 5)
+
+# إخلاء جدول TranslationCache (0 = بدون حد). السياسة: 'lru' أو 'lfu'
+TRANSLATION_CACHE_MAX_ROWS = env.int('TRANSLATION_CACHE_MAX_ROWS', 200000)
+TRANSLATION_CACHE_MAX_BYTES = env.int('TRANSLATION_CACHE_MAX_BYTES', 0)
+TRANSLATION_CACHE_EVICTION_POLICY = env('TRANSLATION_CACHE_EVICTION_POLICY', default='lru')
+# ننزل إلى 90% من الحد حتى لا يعمل الإخلاء مع كل تشغيل
+TRANSLATION_CACHE_EVICTION_TARGET = env.float('TRANSLATION_CACHE_EVICTION_TARGET', 0.9)
+
+# تسخين الكاش: عدد العبارات المتكررة المستخرجة من TranslationCache في كل تشغيل
+TRANSLATION_PREWARM_MINED_LIMIT = env.int('TRANSLATION_PREWARM_MINED_LIMIT', 200)
+
+# تجميع الترجمات (Micro-batching): رسائل نفس زوج اللغات خلال النافذة تُرسل في طلب Azure واحد
+# 0 = معطل (كل رسالة تُترجم فوراً في process_message_ai)
+AZURE_TRANSLATOR_BATCH_WINDOW_MS = env.int('AZURE_TRANSLATOR_BATCH_WINDOW_MS', 0)
+AZURE_TRANSLATOR_BATCH_MAX_ITEMS = env.int('AZURE_TRANSLATOR_BATCH_MAX_ITEMS', 25)
+
+# حصة Azure Translator (أحرف في الدقيقة) مشتركة بين كل العمليات عبر Redis (Token bucket)
+# العمل الزائد يُعاد جدولته في Celery بدلاً من النوم داخل الـ Worker. 0 = بدون تحديد
+AZURE_TRANSLATOR_CHARS_PER_MINUTE = env.int('AZURE_TRANSLATOR_CHARS_PER_MINUTE', 33000)
+AZURE_TRANSLATOR_BURST_CHARS = env.int('AZURE_TRANSLATOR_BURST_CHARS', 33000)
+AZURE_RATE_LIMIT_MAX_RETRIES = env.int('AZURE_RATE_LIMIT_MAX_RETRIES', 20)
+
+# قاطع الدائرة: إذا تجاوزت نسبة الأخطاء الحد (بعد عدد أدنى من الطلبات) نرفض فوراً لمدة OPEN_SECONDS
+# والرسائل الفاشلة تُسجل في PendingTranslation وتُعاد ترجمتها عند عودة الخدمة
+AZURE_CIRCUIT_ERROR_RATE = env.float('AZURE_CIRCUIT_ERROR_RATE', 0.5)
+AZURE_CIRCUIT_MIN_CALLS = env.int('AZURE_CIRCUIT_MIN_CALLS', 5)
+AZURE_CIRCUIT_WINDOW_SECONDS = env.int('AZURE_CIRCUIT_WINDOW_SECONDS', 60)
+AZURE_CIRCUIT_OPEN_SECONDS = env.int('AZURE_CIRCUIT_OPEN_SECONDS', 30)
+PENDING_TRANSLATION_REPLAY_BATCH = env.int('PENDING_TRANSLATION_REPLAY_BATCH', 200)
+
+# الترجمة المباشرة داخل ChatConsumer (async) للنصوص القصيرة؛ الأطول أو الفاشلة تذهب لـ Celery
+# 0 = معطل (كل الرسائل عبر Celery)
+ASYNC_TRANSLATION_MAX_CHARS = env.int('ASYNC_TRANSLATION_MAX_CHARS', 500)
+ASYNC_TRANSLATION_TIMEOUT = env.float('ASYNC_TRANSLATION_TIMEOUT', 3.0)
 
 AZURE_OPENAI_ENDPOINT = env('AZURE_OPENAI_ENDPOINT')
 AZURE_OPENAI_KEY = env('AZURE_OPENAI_KEY')
 AZURE_OPENAI_DEPLOYMENT_NAME = env('AZURE_OPENAI_DEPLOYMENT_NAME', default='gpt-4o')
 
+# مجمّعات اتصالات HTTP المشتركة (Keep-alive) لكل خدمة Azure داخل كل عملية
+HTTP_CLIENT_POOLS = {
+    'azure-translator': {
+        'max_connections': env.int('AZURE_TRANSLATOR_POOL_SIZE', 20),
+        'max_keepalive_connections': env.int('AZURE_TRANSLATOR_POOL_KEEPALIVE', 10),
+    },
+    'azure-openai': {
+        'max_connections': env.int('AZURE_OPENAI_POOL_SIZE', 10),
+        'max_keepalive_connections': env.int('AZURE_OPENAI_POOL_KEEPALIVE', 5),
+        'timeout': 30,
+    },
+}
+HTTP_POOL_KEEPALIVE_EXPIRY = env.int('HTTP_POOL_KEEPALIVE_EXPIRY', 30)
+
+# ==============================================================================
+# 🚑 TRIAGE
+# ==============================================================================
+# كل كم ثانية يتحقق الـ Worker من إصدار الكلمات الخطرة في Redis
+DANGER_KEYWORDS_VERSION_CHECK_SECONDS = env.int('DANGER_KEYWORDS_VERSION_CHECK_SECONDS', 5)
+
 # ==============================================================================
 # 🐇 CELERY
 # ==============================================================================
@@ -173,6 +284,26 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'apps.chat.tasks.check_epidemic_outbreak',
         'schedule': crontab(minute='*/15'), 
     },
+    'replay-pending-translations-every-minute': {
+        'task': 'apps.chat.tasks.replay_pending_translations',
+        'schedule': crontab(minute='*'),
+    },
+    'flush-translation-cache-writes-every-minute': {
+        'task': 'apps.chat.tasks.flush_translation_cache_writes',
+        'schedule': crontab(minute='*'),
+    },
+    'flush-translation-cache-hits-every-minute': {
+        'task': 'apps.chat.tasks.flush_translation_cache_hits',
+        'schedule': crontab(minute='*'),
+    },
+    'evict-translation-cache-hourly': {
+        'task': 'apps.chat.tasks.evict_translation_cache',
+        'schedule': crontab(minute=45),
+    },
+    'prewarm-translation-cache-nightly': {
+        'task': 'apps.chat.tasks.prewarm_translation_cache',
+        'schedule': crontab(hour=3, minute=30),
+    },
 }
 
 # ==============================================================================
@@ -251,6 +382,12 @@ UNFOLD = {
                         "link": reverse_lazy("admin:chat_chatsession_changelist"),
                         "permission": lambda request: request.user.is_staff,
                     },
+                    {
+                        "title": _("Broadcast"),
+                        "icon": "campaign",
+                        "link": reverse_lazy("admin:chat_broadcast"),
+                        "permission": lambda request: request.user.is_staff,
+                    },
                     {
                         "title": _("Epidemic Alerts"),
                         "icon": "coronavirus",